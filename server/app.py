@@ -4,23 +4,93 @@ Cookie Manager 开放式服务器
 简单的数据存储服务，支持Pass系统和加密数据存储
 """
 
-from flask import Flask, request, jsonify, render_template_string, render_template, session, redirect, url_for, make_response, Response
+from flask import Flask, request, jsonify, render_template_string, render_template, stream_template, session, redirect, url_for, make_response, Response
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from jinja2 import FileSystemBytecodeCache
 from flask_restx import Api, Resource, fields, Namespace
+from flask_restx.representations import output_json as restx_output_json
 import sqlite3
 import secrets
 import string
 import base64
+import binascii
 import json
 import os
 import hashlib
+import hmac
+import math
+import threading
 import time
-from datetime import datetime, timedelta
+import gzip
+import zlib
+import urllib.parse
+import struct
+from datetime import datetime, timedelta, timezone
+from collections import OrderedDict
 from contextlib import contextmanager
 
+try:
+    import brotli
+except ImportError:  # brotli为可选依赖，未安装时只协商gzip
+    brotli = None
+
+try:
+    import orjson
+except ImportError:  # orjson为可选依赖，未安装时使用标准库json
+    orjson = None
+
 app = Flask(__name__)
 CORS(app)
 
+# ==================== JSON序列化 ====================
+
+JSON_BACKEND = os.environ.get('JSON_BACKEND', 'auto').lower()  # auto：已安装orjson时使用；stdlib：始终使用标准库
+
+def fast_json_dumps(obj, sort_keys=False, default=None):
+    """用orjson序列化为紧凑的UTF-8字节；orjson不可用或无法处理该对象时返回None，由调用方回退到标准库"""
+    if orjson is None or JSON_BACKEND == 'stdlib':
+        return None
+    
+    # 非字符串键与标准库一样转为字符串；日期交给default，与标准库的输出保持一致
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+    if sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    try:
+        return orjson.dumps(obj, default=default, option=option)
+    except (orjson.JSONEncodeError, TypeError):
+        return None
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify / request.get_json 使用orjson，缩进输出（调试模式）等情况仍使用标准库"""
+    
+    def dumps(self, obj, **kwargs):
+        if not kwargs or kwargs == {'separators': (',', ':')}:
+            dumped = fast_json_dumps(obj, self.sort_keys, self.default)
+            if dumped is not None:
+                return dumped.decode('utf-8')
+        return super().dumps(obj, **kwargs)
+    
+    def loads(self, s, **kwargs):
+        if orjson is not None and JSON_BACKEND != 'stdlib' and not kwargs:
+            try:
+                return orjson.loads(s)
+            except orjson.JSONDecodeError:
+                pass  # NaN等orjson不接受的输入交给标准库处理（并产生相同的错误）
+        return super().loads(s, **kwargs)
+    
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        
+        obj = self._prepare_response_obj(args, kwargs)
+        dumped = fast_json_dumps(obj, self.sort_keys, self.default)
+        if dumped is None:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(dumped + b'\n', mimetype=self.mimetype)
+
+app.json = FastJSONProvider(app)
+
 # 初始化 Flask-RESTX API
 api = Api(
     app,
@@ -31,10 +101,68 @@ api = Api(
     prefix='/api'
 )
 
+@api.representation('application/json')
+def output_json(data, code, headers=None):
+    """RESTX的JSON输出：资源返回 (jsonify(...), 状态码) 时直接沿用该响应，其余优先用orjson序列化"""
+    if isinstance(data, Response):
+        data.status_code = code
+        data.headers.extend(headers or {})
+        return data
+    
+    # 调试模式的缩进输出和自定义的RESTX_JSON设置仍由RESTX处理
+    if not app.debug and not app.config.get('RESTX_JSON'):
+        dumped = fast_json_dumps(data)
+        if dumped is not None:
+            response = make_response(dumped + b'\n', code)
+            response.headers.extend(headers or {})
+            return response
+    return restx_output_json(data, code, headers)
+
 # 配置
 DATABASE_PATH = os.environ.get('DATABASE_PATH', 'database.db')
-MAX_DATA_SIZE = int(os.environ.get('MAX_DATA_SIZE', 1048576))  # 1MB
+MAX_DATA_SIZE = int(os.environ.get('MAX_DATA_SIZE', 1048576))  # 1MB，按JSON接口的Base64文本长度计
+MAX_PAYLOAD_BYTES = MAX_DATA_SIZE // 4 * 3  # 与MAX_DATA_SIZE对应的原始密文字节数上限
 MAX_VERSIONS = int(os.environ.get('MAX_VERSIONS', 10))
+MAX_BULK_PASSES = int(os.environ.get('MAX_BULK_PASSES', 100000))  # 单次批量创建/校验上限
+MAX_BATCH_DOMAINS = int(os.environ.get('MAX_BATCH_DOMAINS', 500))  # 批量读取单次指定的域名上限
+LATEST_CACHE_SIZE = int(os.environ.get('LATEST_CACHE_SIZE', 67108864))  # 64MB，最新版本缓存容量，0表示关闭
+BLOB_STREAM_THRESHOLD = int(os.environ.get('BLOB_STREAM_THRESHOLD', 262144))  # 256KB，超过此大小的BLOB分块流式读取
+BLOB_CHUNK_SIZE = 3 * 16384  # 3的倍数，分块Base64编码的结果可直接拼接
+HASH_BACKFILL_BATCH = 500  # 升级时补算内容哈希，每批读取的行数
+QUICK_CACHE_SIZE = int(os.environ.get('QUICK_CACHE_SIZE', 16777216))  # 16MB，快捷访问解密结果缓存容量，0表示关闭
+QUICK_CACHE_TTL = int(os.environ.get('QUICK_CACHE_TTL', 300))  # 秒，解密结果缓存的有效期
+
+# 成员过滤器配置（布隆过滤器）
+MEMBERSHIP_FILTER_ENABLED = os.environ.get('MEMBERSHIP_FILTER_ENABLED', 'true').lower() == 'true'
+BLOOM_FALSE_POSITIVE_RATE = float(os.environ.get('BLOOM_FALSE_POSITIVE_RATE', 0.01))
+BLOOM_REBUILD_INTERVAL = int(os.environ.get('BLOOM_REBUILD_INTERVAL', 3600))  # 秒
+
+# 变更通知（SSE / 变更列表）配置
+SSE_POLL_INTERVAL = float(os.environ.get('SSE_POLL_INTERVAL', 1))  # 秒，空闲连接检查其他进程提交的间隔
+SSE_HEARTBEAT_INTERVAL = int(os.environ.get('SSE_HEARTBEAT_INTERVAL', 15))  # 秒
+MAX_CHANGES_PAGE = int(os.environ.get('MAX_CHANGES_PAGE', 1000))  # 变更列表单页上限
+
+# 压缩配置
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))  # 小于此字节数的响应和数据不压缩
+COMPRESSION_LEVEL = int(os.environ.get('COMPRESSION_LEVEL', 6))
+STORAGE_COMPRESSION = os.environ.get('STORAGE_COMPRESSION', 'gzip').lower()  # 二进制密文落盘压缩：gzip / none
+
+# 分块上传配置
+MAX_UPLOAD_SIZE = int(os.environ.get('MAX_UPLOAD_SIZE', 16777216))  # 16MB，分块上传的数据总大小上限
+UPLOAD_DIR = os.environ.get('UPLOAD_DIR')  # 分块暂存目录，默认为数据库所在目录下的 uploads
+UPLOAD_SESSION_TTL = int(os.environ.get('UPLOAD_SESSION_TTL', 3600))  # 秒，上传会话无活动后过期
+
+# 模板配置
+TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR')  # Jinja字节码缓存目录，默认为系统临时目录，设为空字符串关闭
+QUICK_ACCESS_TEMPLATES = ('quick_decrypted.html', 'quick_encrypted.html', 'quick_encrypted_compact.html')
+QUICK_STREAM_THRESHOLD = int(os.environ.get('QUICK_STREAM_THRESHOLD', 262144))  # 256KB，超过此大小的数据流式输出解密页面
+HTML_STREAM_CHUNK_SIZE = 16384  # 流式输出时合并小片段，每次写出约此字符数
+
+# 模板编译结果保存到字节码缓存，多个worker和重启后无需重新解析；进程内由Jinja按名称缓存已加载的模板
+if TEMPLATE_CACHE_DIR != '':
+    if TEMPLATE_CACHE_DIR:
+        os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
 
 # 管理后台安全配置
 ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD', 'admin')
@@ -45,9 +173,38 @@ failed_attempts = {}  # {ip: {'count': int, 'last_attempt': datetime, 'blocked_u
 MAX_FAILED_ATTEMPTS = 5
 BLOCK_DURATION_MINUTES = 5
 
+def ensure_column(conn, table, column, definition):
+    """为已有数据库补充新增的列（SQLite 不支持 ADD COLUMN IF NOT EXISTS）"""
+    columns = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+    if column not in columns:
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+def backfill_content_hashes(conn):
+    """为升级前写入的数据补算内容哈希
+    
+    按ID分批读取并逐批提交，内存中最多保留一批数据，中断后重启可从剩余的行继续。
+    """
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            'SELECT id, data, codec FROM data_entries WHERE content_hash IS NULL AND id > ? ORDER BY id LIMIT ?',
+            (last_id, HASH_BACKFILL_BATCH)
+        ).fetchall()
+        if not rows:
+            return
+        conn.executemany(
+            'UPDATE data_entries SET content_hash = ? WHERE id = ?',
+            ((content_hash(stored_payload({'data': data, 'codec': codec})), entry_id) for entry_id, data, codec in rows)
+        )
+        conn.commit()
+        last_id = rows[-1][0]
+
 def init_database():
     """初始化数据库"""
     with sqlite3.connect(DATABASE_PATH) as conn:
+        # WAL模式下读不阻塞写，流式读取大数据期间其他请求仍可提交
+        conn.execute('PRAGMA journal_mode=WAL')
+        
         conn.execute('''
             CREATE TABLE IF NOT EXISTS passes (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -64,13 +221,72 @@ def init_database():
                 data TEXT NOT NULL,
                 size INTEGER NOT NULL,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                codec TEXT,
+                content_hash TEXT,
                 FOREIGN KEY (pass_id) REFERENCES passes(pass_id)
             )
         ''')
+        # data 列的落盘压缩方式，NULL 表示未压缩；size 为接口中 data 字段的文本长度，与是否压缩无关
+        ensure_column(conn, 'data_entries', 'codec', 'TEXT')
+        # 数据内容（即接口中 data 字段的文本）的SHA-256，客户端据此判断是否需要同步
+        ensure_column(conn, 'data_entries', 'content_hash', 'TEXT')
+        backfill_content_hashes(conn)
         
         conn.execute('CREATE INDEX IF NOT EXISTS idx_pass_domain ON data_entries(pass_id, domain)')
         conn.execute('CREATE INDEX IF NOT EXISTS idx_created_at ON data_entries(created_at DESC)')
+        # 按 (Pass, 域名) 定位某一时刻的版本（as_of 查询）和最新版本均为一次索引查找
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_pass_domain_created ON data_entries(pass_id, domain, created_at)')
+        
+        # 变更记录：每个 (Pass, 域名) 一行，seq 单调递增，作为变更列表和SSE的游标
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                pass_id TEXT NOT NULL,
+                domain TEXT NOT NULL,
+                action TEXT NOT NULL,
+                entry_id INTEGER,
+                size INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL,
+                UNIQUE (pass_id, domain)
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_changes_pass_seq ON changes(pass_id, seq)')
+        
+        # 分块上传会话：分块暂存在 UPLOAD_DIR，received 为从0开始连续收到的字节数
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS upload_sessions (
+                upload_id TEXT PRIMARY KEY,
+                pass_id TEXT NOT NULL,
+                domain TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                received INTEGER NOT NULL DEFAULT 0,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        # 每次创建、写入和提交前清理过期会话，按过期时间的范围查询
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_upload_expires ON upload_sessions(expires_at)')
+        
+        # 为已有数据补齐变更记录
+        conn.execute('''
+            INSERT INTO changes (pass_id, domain, action, entry_id, size, created_at)
+            SELECT d.pass_id, d.domain, 'save', d.id, d.size, ?
+            FROM data_entries d
+            WHERE d.id = (
+                SELECT id FROM data_entries
+                WHERE pass_id = d.pass_id AND domain = d.domain
+                ORDER BY created_at DESC, id DESC
+                LIMIT 1
+            )
+            AND NOT EXISTS (
+                SELECT 1 FROM changes c WHERE c.pass_id = d.pass_id AND c.domain = d.domain
+            )
+        ''', (datetime.utcnow().isoformat() + 'Z',))
         conn.commit()
+    
+    # 基于当前数据库重建成员过滤器，清空缓存
+    membership.rebuild()
+    latest_cache.clear()
+    coherence.reset()
 
 # ==================== API 文档配置 ====================
 
@@ -89,7 +305,7 @@ pass_model = api.model('Pass', {
 data_model = api.model('Data', {
     'domain': fields.String(required=True, description='域名'),
     'data': fields.String(required=True, description='加密的数据'),
-    'size': fields.Integer(description='数据大小'),
+    'size': fields.Integer(description='数据大小（data字段的文本长度）'),
     'created_at': fields.String(description='创建时间')
 })
 
@@ -168,15 +384,16 @@ def require_admin_auth():
             if is_ip_blocked(client_ip):
                 blocked_until = failed_attempts[client_ip]['blocked_until']
                 remaining_minutes = int((blocked_until - datetime.now()).total_seconds() / 60) + 1
-                return jsonify({
+                # 使用make_response，使Flask-RESTX资源也能直接返回该响应
+                return make_response(jsonify({
                     'error': f'IP地址已被暂时阻止，请在 {remaining_minutes} 分钟后重试',
                     'blocked_until': blocked_until.isoformat(),
                     'remaining_minutes': remaining_minutes
-                }), 429
+                }), 429)
             
             # 检查是否已登录
             if 'admin_authenticated' not in session or not session['admin_authenticated']:
-                return jsonify({'error': '需要管理员认证', 'require_auth': True}), 401
+                return make_response(jsonify({'error': '需要管理员认证', 'require_auth': True}), 401)
             
             return f(*args, **kwargs)
         wrapper.__name__ = f.__name__
@@ -193,47 +410,99 @@ def get_db():
     finally:
         conn.close()
 
+PASS_ALPHABET = string.ascii_letters + string.digits
+# 字节0-247映射到62个字符（248 = 62 * 4，无取模偏差），248-255丢弃
+_PASS_TRANSLATION = bytes(ord(PASS_ALPHABET[b % len(PASS_ALPHABET)]) for b in range(248)) + bytes(8)
+_PASS_REJECTED_BYTES = bytes(range(248, 256))
+
+def generate_passes(count, length=50):
+    """批量生成随机Pass ID：一次读取随机字节并整体映射为字符"""
+    needed = count * length
+    chars = b''
+    while len(chars) < needed:
+        # 约3%的字节会被丢弃，多取一些以免重复读取
+        raw = secrets.token_bytes((needed - len(chars)) * 33 // 32 + 16)
+        chars += raw.translate(_PASS_TRANSLATION, _PASS_REJECTED_BYTES)
+    
+    text = chars[:needed].decode('ascii')
+    return [text[i:i + length] for i in range(0, needed, length)]
+
 def generate_pass(length=50):
     """生成随机Pass ID"""
-    chars = string.ascii_letters + string.digits
-    return ''.join(secrets.choice(chars) for _ in range(length))
+    return generate_passes(1, length)[0]
+
+XOR_BLOCK_CHARS = 65536  # 异或解密每块的字符数（会取整为密钥长度的倍数）
+
+def xor_block(text, key_stream):
+    """text 与等长的 key_stream 逐码位异或
+    
+    把两段文本各看作一个大整数一次完成异或：码位都小于256时按latin-1每字符1字节，
+    否则按UTF-32每字符4字节。结果与逐字符 chr(ord(c) ^ ord(k)) 相同，码位超出
+    Unicode范围时同样抛出ValueError。
+    """
+    try:
+        text_bytes = text.encode('latin-1')
+        key_bytes = key_stream.encode('latin-1')
+        encoding = 'latin-1'
+    except UnicodeEncodeError:
+        text_bytes = text.encode('utf-32-le', 'surrogatepass')
+        key_bytes = key_stream.encode('utf-32-le', 'surrogatepass')
+        encoding = 'utf-32-le'
+    
+    mixed = int.from_bytes(text_bytes, 'little') ^ int.from_bytes(key_bytes, 'little')
+    return mixed.to_bytes(len(text_bytes), 'little').decode(encoding, 'surrogatepass')
+
+class XorDecryptor:
+    """与客户端一致的XOR解密，按块处理"""
+    
+    def __init__(self, key, block_chars=XOR_BLOCK_CHARS):
+        if not key:
+            raise ValueError('Empty decryption key')
+        # 块长为密钥长度的倍数，每块都从密钥开头对齐
+        self.block_chars = len(key) * max(1, block_chars // len(key))
+        self.key_block = key * (self.block_chars // len(key))
+    
+    def decrypt(self, text):
+        """一次解密完整文本"""
+        return ''.join(
+            xor_block(text[start:start + self.block_chars], self.key_block[:len(text) - start])
+            for start in range(0, len(text), self.block_chars)
+        )
+
+def decode_ciphertext(encrypted_data):
+    """密文 -> 待异或的文本
+    
+    encrypted_data 为Base64文本（兼容URL安全字符和缺少的padding），或已解码的密文字节
+    （存储层保存的二进制数据，省去一次Base64编码再解码）。
+    """
+    if isinstance(encrypted_data, bytes):
+        return encrypted_data.decode('utf-8', errors='ignore')
+    
+    s = encrypted_data
+    try:
+        # 处理URL安全的base64和padding
+        s = s.replace('-', '+').replace('_', '/')
+        # 添加必要的padding
+        s += '=' * (-len(s) % 4)
+        decoded_bytes = base64.b64decode(s)
+        return decoded_bytes.decode('utf-8', errors='ignore')
+    except Exception as e:
+        print(f"Base64解码失败: {e}")
+        # 尝试直接URL解码
+        try:
+            return urllib.parse.unquote(s)
+        except Exception:
+            return s
 
 def server_decrypt(encrypted_data, key):
     """服务端解密函数 - 与客户端保持一致的XOR + Base64解密"""
     try:
-        # 安全的Base64解码
-        def safe_base64_decode(s):
-            try:
-                # 处理URL安全的base64和padding
-                s = s.replace('-', '+').replace('_', '/')
-                # 添加必要的padding
-                while len(s) % 4:
-                    s += '='
-                decoded_bytes = base64.b64decode(s)
-                return decoded_bytes.decode('utf-8', errors='ignore')
-            except Exception as e:
-                print(f"Base64解码失败: {e}")
-                # 尝试直接URL解码
-                try:
-                    return urllib.parse.unquote(s)
-                except:
-                    return s
-        
-        # XOR解密
-        def xor_decrypt(encrypted_text, key):
-            result = ''
-            for i in range(len(encrypted_text)):
-                text_char = ord(encrypted_text[i])
-                key_char = ord(key[i % len(key)])
-                result += chr(text_char ^ key_char)
-            return result
-        
         # 执行解密流程
         # 1. Base64解码
-        encrypted = safe_base64_decode(encrypted_data)
+        encrypted = decode_ciphertext(encrypted_data)
         
         # 2. XOR解密
-        json_str = xor_decrypt(encrypted, key)
+        json_str = XorDecryptor(key).decrypt(encrypted)
         
         # 3. 解析JSON
         return json.loads(json_str)
@@ -242,100 +511,46 @@ def server_decrypt(encrypted_data, key):
         print(f"服务端解密失败: {e}")
         raise e
 
-def render_decrypted_html(domain, pass_id, timestamp, decrypted_data):
-    """渲染已解密数据的HTML页面"""
-    html_template = '''
-<!DOCTYPE html>
-<html>
-<head>
-    <title>Cookie Data for {{ domain }} (Decrypted)</title>
-    <meta charset="UTF-8">
-    <style>
-        body { font-family: Arial, sans-serif; margin: 20px; background: #f8f9fa; }
-        .container { max-width: 1000px; margin: 0 auto; background: white; padding: 20px; border-radius: 8px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }
-        .header { border-bottom: 2px solid #007bff; padding-bottom: 15px; margin-bottom: 20px; }
-        .info { color: #666; font-size: 14px; background: #f8f9fa; padding: 10px; border-radius: 5px; margin: 10px 0; }
-        .data-section { margin: 20px 0; }
-        .data-box { background: #e8f5e8; padding: 15px; border-radius: 5px; margin: 10px 0; border-left: 4px solid #28a745; }
-        .item { background: white; padding: 8px; margin: 5px 0; border-radius: 3px; border: 1px solid #ddd; }
-        .key { font-weight: bold; color: #007bff; }
-        .value { color: #333; word-break: break-all; }
-        .empty { color: #999; font-style: italic; }
-        .count { color: #28a745; font-weight: bold; }
-        .success-badge { background: #28a745; color: white; padding: 4px 8px; border-radius: 12px; font-size: 12px; }
-        details { margin: 15px 0; }
-        summary { cursor: pointer; font-weight: bold; padding: 10px; background: #f8f9fa; border-radius: 5px; }
-        pre { background: #f5f5f5; padding: 15px; border-radius: 5px; overflow-x: auto; font-size: 12px; }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>🍪 Cookie Data for {{ domain }} <span class="success-badge">DECRYPTED</span></h1>
-        </div>
-        
-        <div class="info">
-            <p><strong>Pass ID:</strong> {{ pass_id }}</p>
-            <p><strong>Domain:</strong> {{ domain }}</p>
-            <p><strong>Timestamp:</strong> {{ timestamp }}</p>
-            <p><strong>Status:</strong> ✅ Successfully decrypted on server</p>
-        </div>
-        
-        {% if cookies and cookies|length > 0 %}
-        <div class="data-section">
-            <div class="data-box">
-                <h3>🍪 Cookies <span class="count">({{ cookies|length }} items)</span></h3>
-                {% for name, value in cookies.items() %}
-                <div class="item">
-                    <div class="key">{{ name }}:</div>
-                    <div class="value">{{ value if value else '<span class="empty">(empty)</span>' }}</div>
-                </div>
-                {% endfor %}
-            </div>
-        </div>
-        {% endif %}
-        
-        {% if localStorage and localStorage|length > 0 %}
-        <div class="data-section">
-            <div class="data-box">
-                <h3>💾 LocalStorage <span class="count">({{ localStorage|length }} items)</span></h3>
-                {% for key, value in localStorage.items() %}
-                <div class="item">
-                    <div class="key">{{ key }}:</div>
-                    <div class="value">
-                        {% if value|length > 100 %}
-                            {{ value[:100] }}... <em>({{ value|length }} chars total)</em>
-                        {% else %}
-                            {{ value if value else '<span class="empty">(empty)</span>' }}
-                        {% endif %}
-                    </div>
-                </div>
-                {% endfor %}
-            </div>
-        </div>
-        {% endif %}
-        
-        {% if not cookies and not localStorage %}
-        <div class="data-section">
-            <div class="info">
-                <p>No cookies or localStorage data found.</p>
-            </div>
-        </div>
-        {% endif %}
-        
-        <details>
-            <summary>📄 Raw JSON Data</summary>
-            <pre>{{ raw_json }}</pre>
-        </details>
-        
-        <div class="info" style="margin-top: 30px; text-align: center; font-size: 12px;">
-            <p>🔒 Data was encrypted and decrypted successfully using your provided key</p>
-        </div>
-    </div>
-</body>
-</html>
-    '''
+def parse_projection(args):
+    """解析快捷访问的字段投影参数，未指定时返回None
     
+    fields=cookies,timestamp 选择顶层字段（逗号分隔）；cookie= 和 storage_key= 可重复，
+    只返回指定的cookie和localStorage键（localStorage键可能含逗号，因此不按逗号拆分）。
+    """
+    fields = tuple(field.strip() for value in args.getlist('fields') for field in value.split(',') if field.strip())
+    cookies = tuple(args.getlist('cookie'))
+    storage_keys = tuple(args.getlist('storage_key'))
+    if not (fields or cookies or storage_keys):
+        return None
+    return fields, cookies, storage_keys
+
+def project_decrypted(decrypted_data, projection):
+    """按 parse_projection 的结果构造新的字典，不修改（可能来自缓存的）原对象；不存在的字段和键忽略"""
+    fields, cookies, storage_keys = projection
+    result = {field: decrypted_data[field] for field in fields if field in decrypted_data}
+    for name, keys in (('cookies', cookies), ('localStorage', storage_keys)):
+        if keys:
+            source = decrypted_data.get(name)
+            source = source if isinstance(source, dict) else {}
+            result[name] = {key: source[key] for key in keys if key in source}
+    return result
+
+def buffered_text(chunks, size=HTML_STREAM_CHUNK_SIZE):
+    """把大量细碎的文本片段合并为约size个字符的块"""
+    buffer = []
+    buffered = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= size:
+            yield ''.join(buffer)
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield ''.join(buffer)
+
+def decrypted_html_context(decrypted_data):
+    """解密页面的模板变量；原始JSON由iterencode逐段生成，不在内存中构造完整副本"""
     # 确保decrypted_data是字典类型
     if not isinstance(decrypted_data, dict):
         print(f"render_decrypted_html: decrypted_data不是字典类型: {type(decrypted_data)}")
@@ -348,358 +563,43 @@ def render_decrypted_html(domain, pass_id, timestamp, decrypted_data):
         else:
             decrypted_data = {'error': 'Invalid data type'}
     
-    cookies = decrypted_data.get('cookies', {})
-    localStorage = decrypted_data.get('localStorage', {})
-    raw_json = json.dumps(decrypted_data, indent=2, ensure_ascii=False)
+    encoder = json.JSONEncoder(indent=2, ensure_ascii=False)
+    return {
+        'cookies': decrypted_data.get('cookies', {}),
+        'localStorage': decrypted_data.get('localStorage', {}),
+        'raw_json': buffered_text(encoder.iterencode(decrypted_data))
+    }
+
+def render_decrypted_html(domain, pass_id, timestamp, decrypted_data):
+    """渲染已解密数据的HTML页面（templates/quick_decrypted.html）"""
+    return render_template('quick_decrypted.html',
+        domain=domain,
+        pass_id=pass_id,
+        timestamp=timestamp,
+        **decrypted_html_context(decrypted_data)
+    )
+
+def stream_decrypted_html(domain, pass_id, timestamp, decrypted_data):
+    """流式渲染已解密数据的HTML页面，返回逐块产出UTF-8字节的迭代器
     
-    return render_template_string(html_template,
+    须在请求上下文中调用；stream_template 在调用时保存上下文，响应输出时仍可渲染。
+    """
+    chunks = stream_template('quick_decrypted.html',
         domain=domain,
         pass_id=pass_id,
         timestamp=timestamp,
-        cookies=cookies,
-        localStorage=localStorage,
-        raw_json=raw_json
+        **decrypted_html_context(decrypted_data)
     )
+    return (chunk.encode('utf-8') for chunk in buffered_text(chunks))
 
-def render_encrypted_html(domain, pass_id, timestamp, encrypted_data, decrypt_key):
-    """渲染加密数据的HTML页面（客户端解密）"""
-    html_template = '''
-<!DOCTYPE html>
-<html>
-<head>
-    <title>Cookie Data for {{ domain }} (Encrypted)</title>
-    <meta charset="UTF-8">
-    <style>
-        body { font-family: Arial, sans-serif; margin: 20px; background: #f8f9fa; }
-        .container { max-width: 800px; margin: 0 auto; background: white; padding: 20px; border-radius: 8px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }
-        .header { border-bottom: 2px solid #ffc107; padding-bottom: 15px; margin-bottom: 20px; }
-        .info { color: #666; font-size: 14px; background: #f8f9fa; padding: 10px; border-radius: 5px; margin: 10px 0; }
-        .data-box { background: #fff3cd; padding: 15px; border-radius: 5px; margin: 10px 0; border-left: 4px solid #ffc107; }
-        .decrypt-section { margin: 20px 0; background: #e8f5e8; padding: 15px; border-radius: 5px; border-left: 4px solid #28a745; }
-        textarea { width: 100%; height: 200px; font-family: monospace; border: 1px solid #ddd; border-radius: 4px; padding: 10px; }
-        .warning-badge { background: #ffc107; color: #212529; padding: 4px 8px; border-radius: 12px; font-size: 12px; }
-        .success-badge { background: #28a745; color: white; padding: 4px 8px; border-radius: 12px; font-size: 12px; }
-        #decrypted-data { min-height: 100px; }
-        .item { background: white; padding: 8px; margin: 5px 0; border-radius: 3px; border: 1px solid #ddd; }
-        .key { font-weight: bold; color: #007bff; }
-        .value { color: #333; word-break: break-all; }
-        .empty { color: #999; font-style: italic; }
-        .count { color: #28a745; font-weight: bold; }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>🍪 Cookie Data for {{ domain }} 
-                {% if decrypt_key %}
-                    <span class="success-badge">DECRYPTING</span>
-                {% else %}
-                    <span class="warning-badge">ENCRYPTED</span>
-                {% endif %}
-            </h1>
-        </div>
-        
-        <div class="info">
-            <p><strong>Pass ID:</strong> {{ pass_id }}</p>
-            <p><strong>Domain:</strong> {{ domain }}</p>
-            <p><strong>Timestamp:</strong> {{ timestamp }}</p>
-            <p><strong>Status:</strong> 
-                {% if decrypt_key %}
-                    🔓 Decrypting with provided key...
-                {% else %}
-                    🔒 Encrypted data (no decryption key provided)
-                {% endif %}
-            </p>
-            <p><strong>📊 JSON数据:</strong> <a href="{{ request.url.replace('&format=html', '').replace('?format=html', '') }}" target="_blank" style="color: #007bff; text-decoration: none;">🔗 查看JSON格式</a></p>
-        </div>
-        
-        <div class="data-box">
-            <h3>🔒 Encrypted Data:</h3>
-            <textarea readonly>{{ data }}</textarea>
-        </div>
-        
-        {% if decrypt_key %}
-        <div class="decrypt-section">
-            <h3>🔓 Decrypted Data:</h3>
-            <div id="decrypted-data">Decrypting...</div>
-        </div>
-        {% endif %}
-        
-        <script>
-            // 前端解密功能
-            function decryptWithKey() {
-                const key = document.getElementById('decrypt-key-input').value;
-                if (!key) {
-                    alert('请输入解密密钥');
-                    return;
-                }
-                
-                const encryptedData = '{{ data }}';
-                const decrypted = decrypt(encryptedData, key);
-                
-                if (decrypted) {
-                    let html = '<div style="background: #e8f5e8; padding: 15px; border-radius: 5px; border: 1px solid #28a745;">';
-                    html += '<h4 style="color: #28a745; margin-top: 0;">✅ 解密成功!</h4>';
-                    
-                    if (decrypted.cookies && Object.keys(decrypted.cookies).length > 0) {
-                        html += '<h5>🍪 Cookies (' + Object.keys(decrypted.cookies).length + ' items):</h5>';
-                        html += '<div style="background: white; padding: 10px; border-radius: 3px; margin: 5px 0; max-height: 200px; overflow-y: auto;">';
-                        for (const [name, value] of Object.entries(decrypted.cookies)) {
-                            html += '<div class="item"><span class="key">' + escapeHtml(name) + ':</span> <span class="value">' + escapeHtml(value) + '</span></div>';
-                        }
-                        html += '</div>';
-                    }
-                    
-                    if (decrypted.localStorage && Object.keys(decrypted.localStorage).length > 0) {
-                        html += '<h5>💾 LocalStorage (' + Object.keys(decrypted.localStorage).length + ' items):</h5>';
-                        html += '<div style="background: white; padding: 10px; border-radius: 3px; margin: 5px 0; max-height: 200px; overflow-y: auto;">';
-                        for (const [key, value] of Object.entries(decrypted.localStorage)) {
-                            const displayValue = value.length > 100 ? value.substring(0, 100) + '... (' + value.length + ' chars)' : value;
-                            html += '<div class="item"><span class="key">' + escapeHtml(key) + ':</span> <span class="value">' + escapeHtml(displayValue) + '</span></div>';
-                        }
-                        html += '</div>';
-                    }
-                    
-                    if (decrypted.timestamp) {
-                        html += '<div style="color: #666; font-size: 12px; margin-top: 10px;">📅 Data Timestamp: ' + new Date(decrypted.timestamp).toLocaleString() + '</div>';
-                    }
-                    
-                    html += '</div>';
-                    html += '<details style="margin-top: 15px;"><summary>📄 Raw JSON Data</summary>';
-                    html += '<pre style="background: #f5f5f5; padding: 10px; border-radius: 3px; overflow-x: auto; max-height: 300px; overflow-y: auto;">' + 
-                            JSON.stringify(decrypted, null, 2) + '</pre></details>';
-                    
-                    document.getElementById('manual-decrypted-data').innerHTML = html;
-                } else {
-                    document.getElementById('manual-decrypted-data').innerHTML = 
-                        '<div style="background: #f8d7da; padding: 15px; border-radius: 5px; border: 1px solid #f5c6cb;"><p style="color: #721c24; margin: 0;">❌ 解密失败: 密钥错误或数据损坏</p></div>';
-                }
-            }
-            
-            function copyDecryptionScript() {
-                const script = `// 解密脚本 - 可在其他地方使用
-function safeBase64Decode(str) {
-    try {
-        return decodeURIComponent(escape(atob(str)));
-    } catch (error) {
-        console.error('Base64解码失败:', error);
-        return str;
-    }
-}
-
-function xorDecrypt(encryptedText, key) {
-    let result = '';
-    for (let i = 0; i < encryptedText.length; i++) {
-        const textChar = encryptedText.charCodeAt(i);
-        const keyChar = key.charCodeAt(i % key.length);
-        result += String.fromCharCode(textChar ^ keyChar);
-    }
-    return result;
-}
-
-function decrypt(encryptedData, key) {
-    try {
-        const encrypted = safeBase64Decode(encryptedData);
-        const jsonStr = xorDecrypt(encrypted, key);
-        return JSON.parse(jsonStr);
-    } catch (error) {
-        console.error('解密失败:', error);
-        return null;
-    }
-}
-
-// 使用示例:
-const encryptedData = '{{ data }}';
-const key = 'YOUR_ENCRYPTION_KEY'; // 替换为你的密钥
-const decrypted = decrypt(encryptedData, key);
-if (decrypted) {
-    console.log('解密成功:', decrypted);
-} else {
-    console.log('解密失败');
-}`;
-                
-                // 创建临时文本区域来复制
-                const textarea = document.createElement('textarea');
-                textarea.value = script;
-                textarea.style.position = 'fixed';
-                textarea.style.opacity = '0';
-                document.body.appendChild(textarea);
-                textarea.select();
-                
-                try {
-                    document.execCommand('copy');
-                    document.body.removeChild(textarea);
-                    alert('解密脚本已复制到剪贴板！');
-                } catch (err) {
-                    document.body.removeChild(textarea);
-                    alert('复制失败，请手动复制以下内容:\\n\\n' + script);
-                }
-            }
-            
-            // 客户端解密实现（与客户端保持一致）
-            function safeBase64Decode(str) {
-                try {
-                    return decodeURIComponent(escape(atob(str)));
-                } catch (error) {
-                    console.error('Base64解码失败:', error);
-                    return str;
-                }
-            }
-            
-            function xorDecrypt(encryptedText, key) {
-                let result = '';
-                for (let i = 0; i < encryptedText.length; i++) {
-                    const textChar = encryptedText.charCodeAt(i);
-                    const keyChar = key.charCodeAt(i % key.length);
-                    result += String.fromCharCode(textChar ^ keyChar);
-                }
-                return result;
-            }
-            
-            function decrypt(encryptedData, key) {
-                try {
-                    const encrypted = safeBase64Decode(encryptedData);
-                    const jsonStr = xorDecrypt(encrypted, key);
-                    return JSON.parse(jsonStr);
-                } catch (error) {
-                    console.error('解密失败:', error);
-                    return null;
-                }
-            }
-            
-            function escapeHtml(text) {
-                const div = document.createElement('div');
-                div.textContent = text;
-                return div.innerHTML;
-            }
-            
-            // 执行客户端解密
-            try {
-                const encryptedData = '{{ data }}';
-                const key = '{{ decrypt_key }}';
-                
-                const decrypted = decrypt(encryptedData, key);
-                
-                if (decrypted) {
-                    let html = '<div style="background: #e8f5e8; padding: 15px; border-radius: 5px;">';
-                    
-                    if (decrypted.cookies && Object.keys(decrypted.cookies).length > 0) {
-                        html += '<h4>🍪 Cookies (' + Object.keys(decrypted.cookies).length + ' items):</h4>';
-                        html += '<div style="background: white; padding: 10px; border-radius: 3px; margin: 5px 0;">';
-                        for (const [name, value] of Object.entries(decrypted.cookies)) {
-                            html += '<div class="item"><span class="key">' + escapeHtml(name) + ':</span> <span class="value">' + escapeHtml(value) + '</span></div>';
-                        }
-                        html += '</div>';
-                    }
-                    
-                    if (decrypted.localStorage && Object.keys(decrypted.localStorage).length > 0) {
-                        html += '<h4>💾 LocalStorage (' + Object.keys(decrypted.localStorage).length + ' items):</h4>';
-                        html += '<div style="background: white; padding: 10px; border-radius: 3px; margin: 5px 0;">';
-                        for (const [key, value] of Object.entries(decrypted.localStorage)) {
-                            const displayValue = value.length > 100 ? value.substring(0, 100) + '... (' + value.length + ' chars)' : value;
-                            html += '<div class="item"><span class="key">' + escapeHtml(key) + ':</span> <span class="value">' + escapeHtml(displayValue) + '</span></div>';
-                        }
-                        html += '</div>';
-                    }
-                    
-                    if (decrypted.timestamp) {
-                        html += '<div style="color: #666; font-size: 12px; margin-top: 10px;">📅 Data Timestamp: ' + new Date(decrypted.timestamp).toLocaleString() + '</div>';
-                    }
-                    
-                    html += '</div>';
-                    html += '<details style="margin-top: 15px;"><summary>📄 Raw JSON Data</summary>';
-                    html += '<pre style="background: #f5f5f5; padding: 10px; border-radius: 3px; overflow-x: auto;">' + 
-                            JSON.stringify(decrypted, null, 2) + '</pre></details>';
-                    
-                    document.getElementById('decrypted-data').innerHTML = html;
-                } else {
-                    document.getElementById('decrypted-data').innerHTML = 
-                        '<p style="color: red;">❌ Decryption failed: Invalid key or corrupted data</p>';
-                }
-            } catch (e) {
-                document.getElementById('decrypted-data').innerHTML = 
-                    '<p style="color: red;">❌ Decryption error: ' + e.message + '</p>';
-            }
-            
-            // 如果有密钥，自动解密
-            {% if decrypt_key %}
-            try {
-                const encryptedData = '{{ data }}';
-                const key = '{{ decrypt_key }}';
-                
-                const decrypted = decrypt(encryptedData, key);
-                
-                if (decrypted) {
-                    let html = '<div style="background: #e8f5e8; padding: 15px; border-radius: 5px;">';
-                    
-                    if (decrypted.cookies && Object.keys(decrypted.cookies).length > 0) {
-                        html += '<h4>🍪 Cookies (' + Object.keys(decrypted.cookies).length + ' items):</h4>';
-                        html += '<div style="background: white; padding: 10px; border-radius: 3px; margin: 5px 0;">';
-                        for (const [name, value] of Object.entries(decrypted.cookies)) {
-                            html += '<div class="item"><span class="key">' + escapeHtml(name) + ':</span> <span class="value">' + escapeHtml(value) + '</span></div>';
-                        }
-                        html += '</div>';
-                    }
-                    
-                    if (decrypted.localStorage && Object.keys(decrypted.localStorage).length > 0) {
-                        html += '<h4>💾 LocalStorage (' + Object.keys(decrypted.localStorage).length + ' items):</h4>';
-                        html += '<div style="background: white; padding: 10px; border-radius: 3px; margin: 5px 0;">';
-                        for (const [key, value] of Object.entries(decrypted.localStorage)) {
-                            const displayValue = value.length > 100 ? value.substring(0, 100) + '... (' + value.length + ' chars)' : value;
-                            html += '<div class="item"><span class="key">' + escapeHtml(key) + ':</span> <span class="value">' + escapeHtml(displayValue) + '</span></div>';
-                        }
-                        html += '</div>';
-                    }
-                    
-                    if (decrypted.timestamp) {
-                        html += '<div style="color: #666; font-size: 12px; margin-top: 10px;">📅 Data Timestamp: ' + new Date(decrypted.timestamp).toLocaleString() + '</div>';
-                    }
-                    
-                    html += '</div>';
-                    html += '<details style="margin-top: 15px;"><summary>📄 Raw JSON Data</summary>';
-                    html += '<pre style="background: #f5f5f5; padding: 10px; border-radius: 3px; overflow-x: auto;">' + 
-                            JSON.stringify(decrypted, null, 2) + '</pre></details>';
-                    
-                    document.getElementById('decrypted-data').innerHTML = html;
-                } else {
-                    document.getElementById('decrypted-data').innerHTML = 
-                        '<p style="color: red;">❌ Decryption failed: Invalid key or corrupted data</p>';
-                }
-            } catch (e) {
-                document.getElementById('decrypted-data').innerHTML = 
-                    '<p style="color: red;">❌ Decryption error: ' + e.message + '</p>';
-            }
-            {% endif %}
-        </script>
-        
-        {% if not decrypt_key %}
-        <div class="decrypt-section">
-            <h3>🔓 前端解密工具</h3>
-            <div style="margin-bottom: 15px;">
-                <label for="decrypt-key-input" style="display: block; margin-bottom: 5px; font-weight: bold;">输入解密密钥:</label>
-                <input type="text" id="decrypt-key-input" placeholder="请输入解密密钥" style="width: 100%; padding: 8px; border: 1px solid #ddd; border-radius: 4px;">
-                <button onclick="decryptWithKey()" style="margin-top: 10px; padding: 8px 16px; background: #007bff; color: white; border: none; border-radius: 4px; cursor: pointer;">🔓 解密数据</button>
-                <button onclick="copyDecryptionScript()" style="margin-top: 10px; margin-left: 10px; padding: 8px 16px; background: #28a745; color: white; border: none; border-radius: 4px; cursor: pointer;">📋 复制解密脚本</button>
-            </div>
-            <div id="manual-decrypted-data" style="margin-top: 15px;"></div>
-        </div>
-        
-        <div class="info" style="background: #fff3cd; border-left: 4px solid #ffc107;">
-            <p><strong>🔒 Data is encrypted</strong></p>
-            <p>或者直接在URL中添加key参数:</p>
-            <p><code>{{ request.url }}&key=YOUR_ENCRYPTION_KEY</code></p>
-        </div>
-        {% endif %}
-        
-        <div class="info" style="margin-top: 30px; text-align: center; font-size: 12px;">
-            <p>🔐 This data is encrypted for security. Only users with the correct key can decrypt it.</p>
-        </div>
-    </div>
-</body>
-</html>
-    '''
+def render_encrypted_html(domain, pass_id, timestamp, encrypted_data, decrypt_key, compact=False):
+    """渲染加密数据的HTML页面（客户端解密，templates/quick_encrypted.html）
     
-    return render_template_string(html_template,
+    compact 为True时使用精简页面：密文只出现一次，解密脚本为可缓存的 static/quick_access.js，
+    页面大小接近密文本身。
+    """
+    template_name = 'quick_encrypted_compact.html' if compact else 'quick_encrypted.html'
+    return render_template(template_name,
         domain=domain,
         pass_id=pass_id,
         timestamp=timestamp,
@@ -708,52 +608,1529 @@ if (decrypted) {
         request=request
     )
 
-def cleanup_old_versions(pass_id, domain):
-    """清理旧版本，保留最新的MAX_VERSIONS个"""
-    with get_db() as conn:
-        # 获取该域名下的所有版本，按时间倒序
-        versions = conn.execute('''
-            SELECT id FROM data_entries 
-            WHERE pass_id = ? AND domain = ? 
-            ORDER BY created_at DESC
-        ''', (pass_id, domain)).fetchall()
-        
-        if len(versions) > MAX_VERSIONS:
-            # 删除超出限制的旧版本
-            old_versions = versions[MAX_VERSIONS:]
-            for version in old_versions:
-                conn.execute('DELETE FROM data_entries WHERE id = ?', (version['id'],))
-        
-        conn.commit()
+static_versions = {}
 
-# ==================== API端点 ====================
+def static_version(filename):
+    """静态文件内容哈希的前12位（按文件名缓存）"""
+    version = static_versions.get(filename)
+    if version is None:
+        with open(os.path.join(app.static_folder, filename), 'rb') as f:
+            version = hashlib.sha256(f.read()).hexdigest()[:12]
+        static_versions[filename] = version
+    return version
 
-@app.route('/health')
-def health():
-    """健康检查"""
-    return jsonify({
-        'status': 'ok',
-        'timestamp': datetime.utcnow().isoformat() + 'Z',
-        'version': '1.0.0'
-    })
+def static_url(filename):
+    """带内容哈希的静态文件URL，内容变化时URL随之变化，浏览器可长期缓存"""
+    return url_for('static', filename=filename, v=static_version(filename))
 
-@ns_pass.route('/create')
-class CreatePass(Resource):
-    @ns_pass.doc('create_pass')
-    @ns_pass.expect(create_pass_model)
-    @ns_pass.marshal_with(pass_model)
-    @ns_pass.response(201, 'Pass ID 创建成功')
-    @ns_pass.response(400, '请求参数错误')
-    @ns_pass.response(500, '服务器内部错误')
-    def post(self):
-        """创建新的Pass ID"""
-        try:
-            data = request.get_json() or {}
-            domain = data.get('domain', '')
-            
-            # 生成Pass ID
-            pass_id = generate_pass()
-            
+app.jinja_env.globals['static_url'] = static_url
+
+@app.after_request
+def cache_static_assets(response):
+    """带有当前内容哈希的静态文件请求返回长期缓存头"""
+    if (request.endpoint == 'static' and response.status_code == 200
+            and request.args.get('v') == static_version(request.view_args['filename'])):
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+# 启动时编译快捷访问模板，首个请求无需等待编译
+for template_name in QUICK_ACCESS_TEMPLATES:
+    app.jinja_env.get_template(template_name)
+
+def encode_payload_for_storage(encrypted_data):
+    """将JSON接口提交的密文转换为存储格式
+    
+    标准Base64文本解码为原始字节以BLOB存储，其余文本原样保存
+    """
+    try:
+        raw = base64.b64decode(encrypted_data, validate=True)
+    except (binascii.Error, ValueError):
+        return encrypted_data
+    
+    # 只有能无损还原的规范Base64才转为BLOB
+    if base64.b64encode(raw).decode('ascii') != encrypted_data:
+        return encrypted_data
+    return raw
+
+def payload_as_text(payload):
+    """存储格式 -> JSON接口使用的Base64文本"""
+    if isinstance(payload, bytes):
+        return base64.b64encode(payload).decode('ascii')
+    return payload
+
+def payload_as_bytes(payload):
+    """存储格式 -> 原始密文字节，非Base64文本会抛出ValueError"""
+    if isinstance(payload, bytes):
+        return payload
+    return base64.b64decode(payload, validate=True)
+
+def base64_length(byte_count):
+    """byte_count 字节Base64编码后的文本长度"""
+    return (byte_count + 2) // 3 * 4
+
+def payload_size(payload):
+    """版本的size：JSON接口返回的data文本的长度（二进制密文按Base64长度计）
+    
+    与改为BLOB存储前的口径一致，MAX_DATA_SIZE 也按此计算。
+    """
+    if isinstance(payload, bytes):
+        return base64_length(len(payload))
+    return len(payload.encode('utf-8'))
+
+def compress_for_storage(payload):
+    """按STORAGE_COMPRESSION压缩二进制密文，返回 (落盘内容, codec)
+    
+    只压缩BLOB，且至少节省10%才保留压缩结果；随机的密文字节通常保持原样。
+    超过BLOB_STREAM_THRESHOLD的数据不压缩，读取时可用blobopen分块流式输出，无需整体解压。
+    """
+    if (STORAGE_COMPRESSION != 'gzip' or not isinstance(payload, bytes)
+            or not COMPRESSION_MIN_SIZE <= len(payload)
+            or payload_size(payload) > BLOB_STREAM_THRESHOLD):
+        return payload, None
+    
+    compressed = gzip.compress(payload, COMPRESSION_LEVEL, mtime=0)
+    if len(compressed) > len(payload) * 0.9:
+        return payload, None
+    return compressed, 'gzip'
+
+def stored_payload(entry):
+    """落盘内容 -> 存储格式的载荷（bytes 或 str）"""
+    if entry['codec'] == 'gzip':
+        return gzip.decompress(entry['data'])
+    return entry['data']
+
+def decoded_entry(entry):
+    """data 为解压后载荷的版本字典（未压缩时原样返回）"""
+    if entry['codec'] is None:
+        return entry
+    return dict(entry, data=stored_payload(entry), codec=None)
+
+DELTA_COPY = 1    # 0x01 offset:u32 length:u32  从基础版本复制
+DELTA_INSERT = 2  # 0x02 length:u32 bytes      插入新字节
+
+def apply_delta(base, delta, max_size):
+    """按 复制/插入 指令由基础版本重建完整密文（整数均为大端u32），格式错误或超出max_size时抛出ValueError"""
+    base = memoryview(base)
+    delta = memoryview(delta)
+    output = bytearray()
+    pos = 0
+    
+    while pos < len(delta):
+        op = delta[pos]
+        if op == DELTA_COPY:
+            if pos + 9 > len(delta):
+                raise ValueError('Truncated copy instruction')
+            offset, length = struct.unpack_from('>II', delta, pos + 1)
+            if offset + length > len(base):
+                raise ValueError('Copy range outside base version')
+            chunk = base[offset:offset + length]
+            pos += 9
+        elif op == DELTA_INSERT:
+            if pos + 5 > len(delta):
+                raise ValueError('Truncated insert instruction')
+            length, = struct.unpack_from('>I', delta, pos + 1)
+            if pos + 5 + length > len(delta):
+                raise ValueError('Truncated insert data')
+            chunk = delta[pos + 5:pos + 5 + length]
+            pos += 5 + length
+        else:
+            raise ValueError(f'Unknown delta instruction: {op}')
+        
+        if len(output) + len(chunk) > max_size:
+            raise ValueError(f'Data too large. Max size: {max_size} bytes')
+        output += chunk
+    
+    return bytes(output)
+
+def content_hash(payload):
+    """内容哈希：data 字段文本（二进制密文为其Base64）的SHA-256十六进制"""
+    return hashlib.sha256(payload_as_text(payload).encode('utf-8')).hexdigest()
+
+def insert_data_entry(conn, pass_id, domain, payload):
+    """写入新版本（调用方负责提交事务），返回新版本 {id, data, codec, size, created_at, content_hash}"""
+    # 与SQLite的CURRENT_TIMESTAMP格式一致，写入缓存的版本无需回读
+    created_at = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+    data, codec = compress_for_storage(payload)
+    size = payload_size(payload)
+    digest = content_hash(payload)
+    
+    cursor = conn.execute('''
+        INSERT INTO data_entries (pass_id, domain, data, size, created_at, codec, content_hash)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (pass_id, domain, data, size, created_at, codec, digest))
+    return {'id': cursor.lastrowid, 'data': data, 'codec': codec, 'size': size, 'created_at': created_at,
+            'content_hash': digest}
+
+def entry_etag(entry_id, variant=''):
+    """基于版本ID的强ETag：版本一旦写入内容不再变化"""
+    return f'data_{entry_id}{variant}'
+
+def is_not_modified(etag):
+    """请求携带的If-None-Match是否与ETag匹配（弱比较，压缩后的响应使用弱ETag）"""
+    return request.if_none_match.contains_weak(etag)
+
+def not_modified_response(etag, cache_control='no-cache'):
+    """304响应，不带响应体"""
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+def etag_headers(etag):
+    """要求客户端每次用ETag重新验证的缓存头"""
+    return {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+
+def entry_meta_headers(entry):
+    """最新版本的元数据响应头，HEAD请求只返回这些头"""
+    return {
+        'X-Entry-Id': f'data_{entry["id"]}',
+        'X-Content-Hash': entry['content_hash'],
+        'X-Data-Size': str(entry['size']),
+        'X-Timestamp': entry['created_at']
+    }
+
+def entry_meta(domain, entry):
+    """版本元数据（不含数据）"""
+    return {
+        'domain': domain,
+        'id': f'data_{entry["id"]}',
+        'size': entry['size'],
+        'content_hash': entry['content_hash'],
+        'created_at': entry['created_at'],
+        'timestamp': entry['created_at']
+    }
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+def immutable_headers(etag):
+    """历史版本内容永不变化，允许客户端和反向代理无限期缓存"""
+    return {'ETag': f'"{etag}"', 'Cache-Control': IMMUTABLE_CACHE_CONTROL}
+
+def parse_version_id(version_id):
+    """'data_123' 或 '123' -> 123，格式不正确时返回None"""
+    version_id = version_id[len('data_'):] if version_id.startswith('data_') else version_id
+    if not version_id.isdigit():
+        return None
+    return int(version_id)
+
+def data_json_parts(domain, entry):
+    """GetData响应的JSON前缀和后缀（字节）
+    
+    Base64字符不需要JSON转义，数据部分直接拼接在前缀和后缀之间，无需整体序列化。
+    字段与顺序与原先的响应一致。
+    """
+    prefix = '{"domain": %s, "data": "' % json.dumps(domain)
+    suffix = '", "size": %d, "created_at": %s, "timestamp": %s, "id": "data_%d"}' % (
+        entry['size'], json.dumps(entry['created_at']), json.dumps(entry['created_at']), entry['id']
+    )
+    return prefix.encode('utf-8'), suffix.encode('utf-8')
+
+def data_json_body(payload):
+    """存储格式 -> JSON字符串内容（不含引号）"""
+    if isinstance(payload, bytes):
+        return base64.b64encode(payload)
+    # 非Base64文本仍需转义
+    return json.dumps(payload)[1:-1].encode('ascii')
+
+def data_json_length(domain, entry):
+    """GetData未压缩响应体的字节数，不读取数据；无法确定时返回None
+    
+    entry 为 load_latest_meta 的结果。BLOB的Base64长度即 size；未缓存的文本数据转义后的长度未知。
+    """
+    data = entry['data'] if 'data' in entry.keys() else None
+    if isinstance(data, str):
+        body_length = len(data_json_body(data))
+    elif data is not None or entry['is_blob']:
+        body_length = entry['size']
+    else:
+        return None
+    prefix, suffix = data_json_parts(domain, entry)
+    return len(prefix) + body_length + len(suffix)
+
+class BlobStream:
+    """分块读取 data_entries.data 的BLOB（Connection.blobopen），不把整个数据载入为字符串
+    
+    collect=True 时保留读到的原始字节，读完后可用于回填缓存。
+    """
+    
+    def __init__(self, entry_id, encode_base64=False, collect=False):
+        self.conn = sqlite3.connect(DATABASE_PATH)
+        try:
+            self.blob = self.conn.blobopen('data_entries', 'data', entry_id, readonly=True)
+        except Exception:
+            self.conn.close()
+            raise
+        self.length = len(self.blob)
+        self.encode_base64 = encode_base64
+        self.chunks = [] if collect else None
+        self.complete = False
+    
+    @property
+    def output_length(self):
+        if self.encode_base64:
+            return (self.length + 2) // 3 * 4
+        return self.length
+    
+    def __iter__(self):
+        while True:
+            chunk = self.blob.read(BLOB_CHUNK_SIZE)
+            if not chunk:
+                break
+            if self.chunks is not None:
+                self.chunks.append(chunk)
+            yield base64.b64encode(chunk) if self.encode_base64 else chunk
+        self.complete = True
+    
+    def data(self):
+        return b''.join(self.chunks)
+    
+    def close(self):
+        if self.conn is not None:
+            self.blob.close()
+            self.conn.close()
+            self.conn = None
+
+def cleanup_old_versions(pass_id, domain):
+    """清理旧版本，保留最新的MAX_VERSIONS个"""
+    with get_db() as conn:
+        # 获取该域名下的所有版本，按时间倒序
+        versions = conn.execute('''
+            SELECT id FROM data_entries 
+            WHERE pass_id = ? AND domain = ? 
+            ORDER BY created_at DESC, id DESC
+        ''', (pass_id, domain)).fetchall()
+        
+        if len(versions) > MAX_VERSIONS:
+            # 删除超出限制的旧版本
+            old_versions = versions[MAX_VERSIONS:]
+            for version in old_versions:
+                conn.execute('DELETE FROM data_entries WHERE id = ?', (version['id'],))
+        
+        conn.commit()
+
+# ==================== 成员过滤器 ====================
+
+class BloomFilter:
+    """布隆过滤器：只可能误报存在，不会漏报"""
+    
+    def __init__(self, capacity, error_rate=BLOOM_FALSE_POSITIVE_RATE):
+        self.capacity = max(int(capacity), 1024)
+        self.error_rate = error_rate
+        self.num_bits = max(64, int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+    
+    def _positions(self, key):
+        # 双重哈希：由一次blake2b摘要派生出k个位置
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+    
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+    
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+    
+    @property
+    def memory_bytes(self):
+        return len(self.bits)
+    
+    def estimated_false_positive_rate(self):
+        """按当前元素数估算的误报率"""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+    
+    def stats(self):
+        return {
+            'entries': self.count,
+            'capacity': self.capacity,
+            'memory_bytes': self.memory_bytes,
+            'num_hashes': self.num_hashes,
+            'estimated_false_positive_rate': round(self.estimated_false_positive_rate(), 6)
+        }
+
+def domain_key(pass_id, domain):
+    """(Pass, 域名) 组合键"""
+    return f'{pass_id}\x00{domain}'
+
+class MembershipIndex:
+    """Pass 和 (Pass, 域名) 的内存成员索引
+    
+    过滤器判定"不存在"时可直接拒绝请求，无需访问数据库。布隆过滤器不支持删除，
+    删除的条目由定期重建清除；到期后在后台线程重建，期间继续使用当前过滤器。
+    其他进程写入数据库后，首次判定不存在前会增量补齐新增的Pass和域名，
+    因此多进程部署下也不会漏报。
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rebuild_lock = threading.Lock()
+        self.rebuilding = False
+        self.rebuild_thread = None
+        self.rebuilds = 0
+        self.passes = BloomFilter(0)
+        self.domains = BloomFilter(0)
+        self.ready = False
+        self.built_at = 0
+        self.last_pass_rowid = 0
+        self.last_entry_rowid = 0
+        self.signature = None
+        self.rejected = 0
+    
+    def _database_signature(self):
+        # 数据库文件（含WAL）的修改时间和大小，变化说明有其他连接写入
+        signature = []
+        for path in (DATABASE_PATH, DATABASE_PATH + '-wal'):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+    
+    def rebuild(self):
+        """从数据库完整重建过滤器（清除已删除的条目）"""
+        with self.rebuild_lock:
+            self._rebuild()
+    
+    def _stale(self):
+        return not self.ready or time.time() - self.built_at > BLOOM_REBUILD_INTERVAL
+    
+    def _rebuild_if_stale(self):
+        with self.rebuild_lock:
+            # 等待期间其他线程可能已经重建完成
+            if self._stale():
+                self._rebuild()
+    
+    def _rebuild(self):
+        """（持有rebuild_lock）在锁外读取数据库并构建，完成后替换，构建期间查询仍使用旧过滤器
+        
+        构建期间新增的条目不在新过滤器中，但其rowid大于读取时的最大值，
+        且数据库签名已变化，下次判定不存在前的增量刷新会补齐。
+        """
+        self.rebuilds += 1
+        try:
+            signature = self._database_signature()
+            with get_db() as conn:
+                pass_rows = conn.execute('SELECT id, pass_id FROM passes').fetchall()
+                domain_rows = conn.execute('SELECT DISTINCT pass_id, domain FROM data_entries').fetchall()
+                last_entry = conn.execute('SELECT MAX(id) FROM data_entries').fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"成员过滤器重建失败: {e}")
+            with self.lock:
+                self.ready = False
+            return
+        
+        # 预留一倍容量给新增条目
+        passes = BloomFilter(len(pass_rows) * 2)
+        for row in pass_rows:
+            passes.add(row['pass_id'])
+        domains = BloomFilter(len(domain_rows) * 2)
+        for row in domain_rows:
+            domains.add(domain_key(row['pass_id'], row['domain']))
+        
+        with self.lock:
+            self.passes = passes
+            self.domains = domains
+            self.last_pass_rowid = max((row['id'] for row in pass_rows), default=0)
+            self.last_entry_rowid = last_entry or 0
+            self.signature = signature
+            self.built_at = time.time()
+            self.ready = True
+    
+    def _start_background_rebuild(self):
+        """启动后台重建线程，已有线程在运行时不重复启动"""
+        with self.lock:
+            if self.rebuilding:
+                return
+            self.rebuilding = True
+            self.rebuild_thread = threading.Thread(target=self._background_rebuild, daemon=True)
+            self.rebuild_thread.start()
+    
+    def _background_rebuild(self):
+        try:
+            self._rebuild_if_stale()
+        finally:
+            self.rebuilding = False
+    
+    def refresh(self):
+        """增量加入数据库中新增的Pass和域名（其他进程写入时）"""
+        with self.lock:
+            signature = self._database_signature()
+            if signature == self.signature:
+                return
+            try:
+                with get_db() as conn:
+                    pass_rows = conn.execute(
+                        'SELECT id, pass_id FROM passes WHERE id > ?',
+                        (self.last_pass_rowid,)
+                    ).fetchall()
+                    domain_rows = conn.execute(
+                        'SELECT id, pass_id, domain FROM data_entries WHERE id > ?',
+                        (self.last_entry_rowid,)
+                    ).fetchall()
+            except sqlite3.Error as e:
+                print(f"成员过滤器刷新失败: {e}")
+                self.ready = False
+                return
+            
+            for row in pass_rows:
+                self.passes.add(row['pass_id'])
+                self.last_pass_rowid = max(self.last_pass_rowid, row['id'])
+            for row in domain_rows:
+                self.domains.add(domain_key(row['pass_id'], row['domain']))
+                self.last_entry_rowid = max(self.last_entry_rowid, row['id'])
+            self.signature = signature
+    
+    def _check(self, bloom, key):
+        if not MEMBERSHIP_FILTER_ENABLED:
+            return True
+        
+        if not self.ready:
+            # 没有可用的过滤器，只能同步构建；并发请求只有一个执行
+            self._rebuild_if_stale()
+            if not self.ready:
+                return True
+        elif time.time() - self.built_at > BLOOM_REBUILD_INTERVAL:
+            self._start_background_rebuild()
+        
+        if key in bloom():
+            return True
+        
+        # 可能是其他进程新写入的数据，增量刷新后再确认
+        self.refresh()
+        if key in bloom():
+            return True
+        
+        self.rejected += 1
+        return False
+    
+    def might_have_pass(self, pass_id):
+        return self._check(lambda: self.passes, pass_id)
+    
+    def might_have_domain(self, pass_id, domain):
+        return self._check(lambda: self.domains, domain_key(pass_id, domain))
+    
+    def add_pass(self, pass_id):
+        self.add_passes([pass_id])
+    
+    def add_passes(self, pass_ids):
+        with self.lock:
+            for pass_id in pass_ids:
+                self.passes.add(pass_id)
+            self._schedule_rebuild_if_full(self.passes)
+    
+    def add_domain(self, pass_id, domain):
+        with self.lock:
+            self.domains.add(domain_key(pass_id, domain))
+            self._schedule_rebuild_if_full(self.domains)
+    
+    def _schedule_rebuild_if_full(self, bloom):
+        # 超出容量后误报率会上升，下次查询时在后台按新规模重建
+        if bloom.count > bloom.capacity:
+            self.built_at = 0
+    
+    def stats(self):
+        return {
+            'enabled': MEMBERSHIP_FILTER_ENABLED,
+            'ready': self.ready,
+            'built_at': datetime.utcfromtimestamp(self.built_at).isoformat() + 'Z' if self.ready else None,
+            'rebuild_interval_seconds': BLOOM_REBUILD_INTERVAL,
+            'rebuilds': self.rebuilds,
+            'rejected_requests': self.rejected,
+            'passes': self.passes.stats(),
+            'domains': self.domains.stats()
+        }
+
+membership = MembershipIndex()
+
+# ==================== 最新版本缓存 ====================
+
+class LatestEntryCache:
+    """(Pass, 域名) 最新版本的内存LRU缓存，按数据字节数限制容量
+    
+    保存时直接写入新版本，删除时失效。未命中时从数据库回填，回填前如有写入或
+    失效发生（epoch变化）则放弃回填，避免并发读把旧版本写回缓存。
+    缓存的是解压后的载荷（codec为None），命中时无需再解压。
+    """
+    
+    ENTRY_OVERHEAD = 256  # 每条缓存除数据外的估算开销（字节）
+    
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.dependents = []
+    
+    def add_dependent(self, cache):
+        """登记依赖最新版本的下游缓存（提供invalidate和clear），域名的最新版本变化时随之失效"""
+        self.dependents.append(cache)
+    
+    def _cost(self, entry):
+        return len(entry['data']) + self.ENTRY_OVERHEAD
+    
+    def admits(self, size):
+        """该大小的数据能否放入缓存"""
+        return size + self.ENTRY_OVERHEAD <= self.max_bytes
+    
+    def get(self, pass_id, domain):
+        key = (pass_id, domain)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+    
+    def fill(self, pass_id, domain, entry, epoch):
+        """用数据库读到的版本回填；读取期间缓存有变化时放弃"""
+        if epoch != self.epoch:
+            return
+        entry = decoded_entry(entry)
+        with self.lock:
+            if epoch == self.epoch:
+                self._store((pass_id, domain), entry)
+    
+    def put(self, pass_id, domain, entry):
+        """写入新保存的版本"""
+        with self.lock:
+            self.epoch += 1
+            self._store((pass_id, domain), entry)
+        self._notify(pass_id, domain)
+    
+    def invalidate(self, pass_id, domain):
+        with self.lock:
+            self.epoch += 1
+            self._discard((pass_id, domain))
+        self._notify(pass_id, domain)
+    
+    def invalidate_unless(self, pass_id, domain, entry_id):
+        """缓存的版本不是entry_id时失效，返回是否失效"""
+        with self.lock:
+            entry = self.entries.get((pass_id, domain))
+            if entry is not None and entry['id'] == entry_id:
+                return False
+            self.epoch += 1
+            self._discard((pass_id, domain))
+        self._notify(pass_id, domain)
+        return True
+    
+    def clear(self):
+        with self.lock:
+            self.epoch += 1
+            self.entries.clear()
+            self.bytes = 0
+        for dependent in self.dependents:
+            dependent.clear()
+    
+    def _notify(self, pass_id, domain):
+        for dependent in self.dependents:
+            dependent.invalidate(pass_id, domain)
+    
+    def _discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= self._cost(entry)
+    
+    def _store(self, key, entry):
+        self._discard(key)
+        cost = self._cost(entry)
+        if cost > self.max_bytes:
+            return
+        
+        self.entries[key] = entry
+        self.bytes += cost
+        while self.bytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.bytes -= self._cost(evicted)
+            self.evictions += 1
+    
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.max_bytes > 0,
+                'max_bytes': self.max_bytes,
+                'bytes': self.bytes,
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0
+            }
+
+latest_cache = LatestEntryCache(LATEST_CACHE_SIZE)
+
+def load_latest_entry(pass_id, domain, stream_threshold=None, meta=None, epoch=None):
+    """读取最新版本 {id, data, codec, size, created_at, content_hash}（优先命中缓存），不存在时返回None
+    
+    data 为落盘内容，需经 stored_payload 解压。
+    给出stream_threshold时，超过该大小的未压缩BLOB不读取数据（data为None），由调用方
+    用BlobStream流式读取后回填缓存。返回的字典由缓存共享，调用方不得修改。
+    
+    条件请求应先用 load_latest_meta 的结果比较ETag，确定返回200后再把该结果作为meta、
+    连同其之前读取的 latest_cache.epoch 传入，304响应不读取 data 列。
+    """
+    if meta is None:
+        epoch = latest_cache.epoch
+        meta = load_latest_meta(pass_id, domain)
+        if meta is None:
+            return None
+    
+    # 命中缓存时元数据就是完整条目
+    if 'data' in meta.keys():
+        return meta
+    
+    entry = load_entry_data(meta, stream_threshold)
+    if entry is not None and entry['data'] is not None:
+        latest_cache.fill(pass_id, domain, entry, epoch)
+    return entry
+
+def load_latest_meta(pass_id, domain):
+    """读取最新版本的元数据 {id, size, codec, created_at, content_hash, is_blob}，不读取 data 列，也不回填缓存
+    
+    命中缓存时返回缓存中的完整条目（含data）。
+    """
+    entry = latest_cache.get(pass_id, domain)
+    if entry is not None:
+        return entry
+    
+    with get_db() as conn:
+        return conn.execute('''
+            SELECT id, size, codec, created_at, content_hash, typeof(data) = 'blob' AS is_blob FROM data_entries
+            WHERE pass_id = ? AND domain = ?
+            ORDER BY created_at DESC, id DESC
+            LIMIT 1
+        ''', (pass_id, domain)).fetchone()
+
+def load_entry_data(meta, stream_threshold=None):
+    """按元数据读取版本数据，返回 {id, [domain,] data, codec, size, created_at, content_hash}，版本已被删除时返回None
+    
+    超过stream_threshold的未压缩BLOB不读取数据（data为None）。
+    """
+    entry = {'id': meta['id'], 'data': None, 'codec': meta['codec'], 'size': meta['size'],
+             'created_at': meta['created_at'], 'content_hash': meta['content_hash']}
+    if 'domain' in meta.keys():
+        entry['domain'] = meta['domain']
+    if stream_threshold is not None and meta['is_blob'] and meta['codec'] is None and meta['size'] > stream_threshold:
+        return entry
+    
+    with get_db() as conn:
+        row = conn.execute(
+            'SELECT data FROM data_entries WHERE id = ?',
+            (meta['id'],)
+        ).fetchone()
+    if row is None:
+        return None
+    entry['data'] = row['data']
+    return entry
+
+def load_version_meta(pass_id, entry_id):
+    """按主键读取指定版本的元数据 {id, domain, size, codec, created_at, content_hash, is_blob}，不属于该Pass时返回None"""
+    return load_meta_where('id = ? AND pass_id = ?', (entry_id, pass_id))
+
+def load_as_of_meta(pass_id, domain, as_of):
+    """读取某一时刻（数据库时间格式）该域名当前版本的元数据，格式同 load_version_meta"""
+    return load_meta_where('''
+        id = (
+            SELECT id FROM data_entries
+            WHERE pass_id = ? AND domain = ? AND created_at <= ?
+            ORDER BY created_at DESC, id DESC
+            LIMIT 1
+        )
+    ''', (pass_id, domain, as_of))
+
+def load_meta_where(condition, params):
+    with get_db() as conn:
+        return conn.execute(f'''
+            SELECT id, domain, size, codec, created_at, content_hash, typeof(data) = 'blob' AS is_blob FROM data_entries
+            WHERE {condition}
+        ''', params).fetchone()
+
+def load_version_entry(pass_id, entry_id, stream_threshold=None):
+    """按主键读取指定版本 {id, domain, data, codec, size, created_at, content_hash}，不属于该Pass时返回None
+    
+    历史版本不进入最新版本缓存。
+    """
+    meta = load_version_meta(pass_id, entry_id)
+    return load_entry_data(meta, stream_threshold) if meta else None
+
+def streamed_entry_response(pass_id, domain, entry, epoch, encode_base64, prefix=b'', suffix=b'', **kwargs):
+    """从SQLite分块流式输出未缓存的大数据，完整读取后回填缓存
+    
+    epoch 须在 load_latest_entry 之前读取，读取期间有写入时不回填；
+    pass_id 为None时（历史版本）不回填
+    """
+    collect = pass_id is not None and latest_cache.admits(entry['size'])
+    stream = BlobStream(entry['id'], encode_base64, collect=collect)
+    
+    def finish():
+        if stream.complete and stream.chunks is not None:
+            latest_cache.fill(pass_id, domain, dict(entry, data=stream.data()), epoch)
+        stream.close()
+    
+    def body():
+        yield prefix
+        yield from stream
+        yield suffix
+    
+    response = Response(body(), **kwargs)
+    response.content_length = len(prefix) + stream.output_length + len(suffix)
+    response.call_on_close(finish)
+    return response
+
+def entry_json_response(domain, entry, headers, pass_id=None, epoch=None):
+    """GetData格式的JSON响应：直接拼接JSON前缀、数据和后缀，不经过整体序列化
+    
+    data 为None的大数据分块流式输出；给出pass_id时（最新版本）读完后回填缓存。
+    """
+    prefix, suffix = data_json_parts(domain, entry)
+    if entry['data'] is None:
+        return streamed_entry_response(pass_id, domain, entry, epoch, True, prefix, suffix,
+                                       mimetype='application/json', headers=headers)
+    
+    body = data_json_body(stored_payload(entry))
+    response = Response([prefix, body, suffix], mimetype='application/json', headers=headers)
+    response.content_length = len(prefix) + len(body) + len(suffix)
+    return response
+
+# ==================== 解密结果缓存 ====================
+
+class DecryptedResponseCache:
+    """快捷访问解密结果的内存缓存，按TTL过期、按字节数LRU淘汰
+    
+    保存可直接发送的响应 (响应体, mimetype)，以及解密后的对象（按需投影字段，调用方不得修改）。
+    键为 (记录ID, 密钥指纹, 变体)，变体为输出格式或 'object'。密钥指纹是以进程内随机盐计算的HMAC-SHA256，
+    缓存中不保存原始密钥，也无法据此离线猜测密钥。记录ID随每次保存变化，
+    另外按 (Pass, 域名) 建立索引，最新版本变化时立即丢弃该域名的所有条目。
+    """
+    
+    ENTRY_OVERHEAD = 256  # 每条缓存除数据外的估算开销（字节）
+    
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.salt = secrets.token_bytes(32)
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.domains = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+    
+    @property
+    def enabled(self):
+        return self.max_bytes > 0 and self.ttl > 0
+    
+    def make_key(self, entry_id, decrypt_key, variant):
+        fingerprint = hmac.new(self.salt, decrypt_key.encode('utf-8', 'surrogatepass'), hashlib.sha256).digest()
+        return (entry_id, fingerprint, variant)
+    
+    def get(self, key):
+        """命中时返回缓存的值，否则返回None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry['expires_at'] <= time.monotonic():
+                self._discard(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry['value']
+    
+    def put(self, key, pass_id, domain, value, size):
+        """写入缓存，size 为值占用内存的估算字节数"""
+        if not self.enabled:
+            return
+        
+        entry = {
+            'pass_id': pass_id,
+            'domain': domain,
+            'value': value,
+            'size': size,
+            'expires_at': time.monotonic() + self.ttl
+        }
+        cost = self._cost(entry)
+        with self.lock:
+            self._discard(key)
+            if cost > self.max_bytes:
+                return
+            
+            self.entries[key] = entry
+            self.domains.setdefault((pass_id, domain), set()).add(key)
+            self.bytes += cost
+            while self.bytes > self.max_bytes:
+                self._discard(next(iter(self.entries)))
+                self.evictions += 1
+    
+    def collect(self, key, pass_id, domain, chunks, mimetype):
+        """原样产出流式响应的各块，完整输出且未超出容量时写入缓存"""
+        collected = [] if self.enabled else None
+        collected_bytes = 0
+        for chunk in chunks:
+            yield chunk
+            if collected is not None:
+                collected.append(chunk)
+                collected_bytes += len(chunk)
+                if collected_bytes + self.ENTRY_OVERHEAD > self.max_bytes:
+                    collected = None
+        if collected is not None:
+            self.put(key, pass_id, domain, (b''.join(collected), mimetype), collected_bytes)
+    
+    def invalidate(self, pass_id, domain):
+        with self.lock:
+            keys = self.domains.get((pass_id, domain))
+            if not keys:
+                return
+            for key in list(keys):
+                self._discard(key)
+                self.invalidations += 1
+    
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.domains.clear()
+            self.bytes = 0
+    
+    def _cost(self, entry):
+        return entry['size'] + self.ENTRY_OVERHEAD
+    
+    def _discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self.bytes -= self._cost(entry)
+        domain_key = (entry['pass_id'], entry['domain'])
+        keys = self.domains[domain_key]
+        keys.discard(key)
+        if not keys:
+            del self.domains[domain_key]
+    
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'bytes': self.bytes,
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'expirations': self.expirations,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0
+            }
+
+DECRYPTED_OBJECT_SIZE_FACTOR = 3  # 缓存解密对象时，按密文字节数的此倍数估算内存占用
+
+quick_cache = DecryptedResponseCache(QUICK_CACHE_SIZE, QUICK_CACHE_TTL)
+latest_cache.add_dependent(quick_cache)
+
+# ==================== 多进程一致性 ====================
+
+class CoherenceWatcher:
+    """检测其他进程（如gunicorn的其他worker）对数据库的写入，失效本进程的缓存
+    
+    每个线程用自己的常驻连接查询 PRAGMA data_version：只有其他连接提交后该值才会变化，
+    读取数据的请求前检查一次即可，未变化时不加锁。变化时在锁内按序号扫描 changes 表，
+    只失效最新版本已变化的 (Pass, 域名)，把新域名加入成员过滤器，并唤醒该Pass的SSE连接。
+    """
+    
+    MAX_SCAN = 10000  # 单次积压的变更过多时直接清空缓存
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.generation = 0
+        self.path = None
+        self.last_seq = None
+        self.checks = 0
+        self.remote_changes = 0
+    
+    def reset(self):
+        """丢弃所有常驻连接和扫描位置，下次检查时重新建立（数据库重新初始化后调用）"""
+        with self.lock:
+            self.generation += 1
+            self.last_seq = None
+        self._close()
+    
+    def _close(self):
+        """关闭当前线程的连接"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+        self.local.conn = None
+    
+    def _connect(self):
+        """为当前线程建立连接，记录data_version的初始值"""
+        self._close()
+        self.local.conn = sqlite3.connect(DATABASE_PATH)
+        self.local.generation = self.generation
+        self.local.path = DATABASE_PATH
+        self.local.data_version = self.local.conn.execute('PRAGMA data_version').fetchone()[0]
+    
+    def check(self):
+        """数据库有其他连接提交时，失效受影响的缓存条目"""
+        # 统计值，不加锁
+        self.checks += 1
+        local = self.local
+        try:
+            if (getattr(local, 'conn', None) is None or local.generation != self.generation
+                    or local.path != DATABASE_PATH):
+                # 新连接的初始值之前可能已有其他进程提交，扫描一次
+                self._connect()
+            else:
+                data_version = local.conn.execute('PRAGMA data_version').fetchone()[0]
+                if data_version == local.data_version:
+                    return
+                local.data_version = data_version
+            
+            with self.lock:
+                self._scan(local.conn)
+        except sqlite3.Error as e:
+            print(f"一致性检查失败: {e}")
+            self._close()
+            with self.lock:
+                latest_cache.clear()
+                self.last_seq = None
+    
+    def _scan(self, conn):
+        """（持有锁）处理 last_seq 之后的变更"""
+        if self.last_seq is None or self.path != DATABASE_PATH:
+            # 建立扫描位置之前缓存的内容无法确认，全部丢弃
+            self.last_seq = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM changes').fetchone()[0]
+            self.path = DATABASE_PATH
+            latest_cache.clear()
+            change_hub.notify_all()
+            return
+        
+        rows = conn.execute('''
+            SELECT seq, pass_id, domain, entry_id FROM changes
+            WHERE seq > ?
+            ORDER BY seq
+            LIMIT ?
+        ''', (self.last_seq, self.MAX_SCAN + 1)).fetchall()
+        
+        if len(rows) > self.MAX_SCAN:
+            latest_cache.clear()
+            change_hub.notify_all()
+            # 清空后从当前最新序号继续
+            self.last_seq = None
+            return
+        
+        for seq, pass_id, domain, entry_id in rows:
+            # 本进程写入的版本已在缓存中，ID一致时保留
+            if latest_cache.invalidate_unless(pass_id, domain, entry_id):
+                self.remote_changes += 1
+            if entry_id is not None:
+                membership.add_domain(pass_id, domain)
+            # 其他进程提交的变更只在数据库中，唤醒本进程的SSE连接去读取
+            change_hub.notify(pass_id)
+            self.last_seq = seq
+    
+    def stats(self):
+        return {
+            'checks': self.checks,
+            'remote_changes': self.remote_changes,
+            'last_seq': self.last_seq or 0
+        }
+
+coherence = CoherenceWatcher()
+
+# 读取最新版本缓存或成员过滤器的接口；静态文件、健康检查、管理页面等无需检查
+COHERENT_PATH_PREFIXES = ('/api/data/', '/api/quick/')
+
+@app.before_request
+def check_coherence():
+    """读取数据的请求前确认本进程的缓存没有落后于数据库"""
+    path = request.path
+    if path.startswith(COHERENT_PATH_PREFIXES) or (path.startswith('/api/pass/') and path.endswith('/manifest')):
+        coherence.check()
+
+# ==================== 变更通知 ====================
+
+def record_change(conn, pass_id, domain, action):
+    """在当前事务中记录域名变更（调用方负责提交），返回变更事件
+    
+    每个 (Pass, 域名) 只保留最新一条变更记录，替换时分配新的递增序号，
+    因此按序号范围扫描即可得到每个变化域名的最新状态。
+    """
+    latest = conn.execute('''
+        SELECT id, size FROM data_entries
+        WHERE pass_id = ? AND domain = ?
+        ORDER BY created_at DESC, id DESC
+        LIMIT 1
+    ''', (pass_id, domain)).fetchone()
+    
+    entry_id = latest['id'] if latest else None
+    size = latest['size'] if latest else 0
+    timestamp = datetime.utcnow().isoformat() + 'Z'
+    
+    cursor = conn.execute('''
+        INSERT OR REPLACE INTO changes (pass_id, domain, action, entry_id, size, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (pass_id, domain, action, entry_id, size, timestamp))
+    
+    return change_event({
+        'seq': cursor.lastrowid,
+        'action': action,
+        'domain': domain,
+        'entry_id': entry_id,
+        'size': size,
+        'created_at': timestamp
+    })
+
+def change_event(row):
+    """changes记录 -> 变更事件"""
+    return {
+        'seq': row['seq'],
+        'action': row['action'],
+        'domain': row['domain'],
+        'entry_id': f'data_{row["entry_id"]}' if row['entry_id'] is not None else None,
+        'size': row['size'],
+        'timestamp': row['created_at']
+    }
+
+def load_changes(conn, pass_id, since, limit=None):
+    """按序号读取since之后的变更（走 (pass_id, seq) 索引的范围扫描）"""
+    query = '''
+        SELECT seq, action, domain, entry_id, size, created_at FROM changes
+        WHERE pass_id = ? AND seq > ?
+        ORDER BY seq
+    '''
+    params = [pass_id, since]
+    if limit is not None:
+        query += ' LIMIT ?'
+        params.append(limit)
+    return [change_event(row) for row in conn.execute(query, params)]
+
+class ChangeSubscriber:
+    """单个SSE连接：记录已推送到的序号，有新变更时被唤醒"""
+    
+    def __init__(self, pass_id, last_seq=0):
+        self.pass_id = pass_id
+        self.last_seq = last_seq
+        self.signal = threading.Event()
+    
+    def notify(self):
+        self.signal.set()
+    
+    def wait(self, timeout):
+        """等待唤醒，超时返回False"""
+        if not self.signal.wait(timeout):
+            return False
+        self.signal.clear()
+        return True
+
+class ChangeHub:
+    """进程内的变更唤醒中心
+    
+    按Pass维护订阅者集合，提交后只唤醒该Pass的订阅者，事件内容由连接自己从 changes 表读取：
+    事件ID即changes表的序号，SQLite的写入串行执行，按序号读取即按提交顺序推送，
+    其他worker进程的提交同样在表中，由一致性检查发现后唤醒本进程的订阅者。
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.commit_lock = threading.Lock()
+        self.subscribers = {}
+        self.published = 0
+    
+    def subscribe(self, pass_id, last_seq=0):
+        """注册订阅者，从last_seq之后开始推送"""
+        subscriber = ChangeSubscriber(pass_id, last_seq)
+        # 首次唤醒时补发last_seq之后已提交的变更
+        subscriber.notify()
+        with self.lock:
+            self.subscribers.setdefault(pass_id, set()).add(subscriber)
+        return subscriber
+    
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            subscribers = self.subscribers.get(subscriber.pass_id)
+            if subscribers is None:
+                return
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self.subscribers[subscriber.pass_id]
+    
+    def commit(self, conn, pass_id, events, after_commit=None):
+        """提交事务并唤醒订阅者
+        
+        after_commit 在唤醒前、锁内执行，用于按提交顺序更新缓存
+        """
+        with self.commit_lock:
+            conn.commit()
+            if after_commit:
+                after_commit()
+        with self.lock:
+            self.published += len(events)
+        self.notify(pass_id)
+    
+    def notify(self, pass_id):
+        """唤醒该Pass的所有订阅者"""
+        with self.lock:
+            for subscriber in self.subscribers.get(pass_id, ()):
+                subscriber.notify()
+    
+    def notify_all(self):
+        """唤醒所有订阅者（无法确定哪些Pass有变更时）"""
+        with self.lock:
+            for subscribers in self.subscribers.values():
+                for subscriber in subscribers:
+                    subscriber.notify()
+    
+    def stats(self):
+        with self.lock:
+            return {
+                'subscribers': sum(len(subscribers) for subscribers in self.subscribers.values()),
+                'subscribed_passes': len(self.subscribers),
+                'published_events': self.published,
+                'poll_interval_seconds': SSE_POLL_INTERVAL,
+                'heartbeat_interval_seconds': SSE_HEARTBEAT_INTERVAL
+            }
+
+change_hub = ChangeHub()
+
+def format_sse(event):
+    """编码一条SSE消息"""
+    return f'id: {event["seq"]}\nevent: change\ndata: {json.dumps(event)}\n\n'
+
+def change_event_stream(subscriber):
+    """SSE响应体：被唤醒时推送last_seq之后的变更，空闲时发送心跳注释保持连接"""
+    # 断线后浏览器EventSource按此间隔（毫秒）自动重连
+    yield 'retry: 3000\n\n'
+    heartbeat_at = time.monotonic() + SSE_HEARTBEAT_INTERVAL
+    while True:
+        if subscriber.wait(max(0, min(SSE_POLL_INTERVAL, heartbeat_at - time.monotonic()))):
+            # 分页读取，积压再多也不会一次载入内存
+            while True:
+                with get_db() as conn:
+                    events = load_changes(conn, subscriber.pass_id, subscriber.last_seq, MAX_CHANGES_PAGE)
+                for event in events:
+                    subscriber.last_seq = event['seq']
+                    yield format_sse(event)
+                if events:
+                    heartbeat_at = time.monotonic() + SSE_HEARTBEAT_INTERVAL
+                if len(events) < MAX_CHANGES_PAGE:
+                    break
+            continue
+        
+        # 其他worker进程的提交只写入数据库：一致性检查发现后唤醒相关订阅者
+        coherence.check()
+        if time.monotonic() >= heartbeat_at:
+            yield ': heartbeat\n\n'
+            heartbeat_at = time.monotonic() + SSE_HEARTBEAT_INTERVAL
+
+def save_data_entry(conn, pass_id, domain, payload):
+    """写入新版本并记录变更，提交后更新成员过滤器、清理旧版本并通知订阅者，返回新记录ID"""
+    entry = insert_data_entry(conn, pass_id, domain, payload)
+    event = record_change(conn, pass_id, domain, 'save')
+    # 缓存保存未压缩的载荷
+    cached = dict(entry, data=payload, codec=None)
+    change_hub.commit(conn, pass_id, [event], lambda: latest_cache.put(pass_id, domain, cached))
+    membership.add_domain(pass_id, domain)
+    
+    # 清理旧版本
+    cleanup_old_versions(pass_id, domain)
+    return entry['id']
+
+def restore_data_entry(conn, pass_id, domain, entry_id):
+    """把该域名的某个历史版本复制为新的最新版本，返回新版本 {id, size, created_at}，版本不存在时返回None
+    
+    INSERT ... SELECT 在SQLite内部完成复制，密文（包括已压缩的落盘内容）不经过Python。
+    """
+    created_at = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+    cursor = conn.execute('''
+        INSERT INTO data_entries (pass_id, domain, data, size, created_at, codec, content_hash)
+        SELECT pass_id, domain, data, size, ?, codec, content_hash FROM data_entries
+        WHERE id = ? AND pass_id = ? AND domain = ?
+    ''', (created_at, entry_id, pass_id, domain))
+    
+    if not cursor.rowcount:
+        conn.commit()
+        return None
+    
+    entry = conn.execute(
+        'SELECT id, size, created_at FROM data_entries WHERE id = ?',
+        (cursor.lastrowid,)
+    ).fetchone()
+    event = record_change(conn, pass_id, domain, 'save')
+    # 不读取数据回填缓存，下次读取时再加载
+    change_hub.commit(conn, pass_id, [event], lambda: latest_cache.invalidate(pass_id, domain))
+    
+    cleanup_old_versions(pass_id, domain)
+    return dict(entry)
+
+def delete_data_entries(conn, pass_id, domain, version_id=None):
+    """删除指定版本或该域名的所有版本并记录变更，返回删除的记录数"""
+    if version_id:
+        result = conn.execute('''
+            DELETE FROM data_entries 
+            WHERE pass_id = ? AND domain = ? AND id = ?
+        ''', (pass_id, domain, version_id.replace('data_', '')))
+    else:
+        result = conn.execute('''
+            DELETE FROM data_entries 
+            WHERE pass_id = ? AND domain = ?
+        ''', (pass_id, domain))
+    
+    if not result.rowcount:
+        conn.commit()
+        return 0
+    
+    event = record_change(conn, pass_id, domain, 'delete')
+    change_hub.commit(conn, pass_id, [event], lambda: latest_cache.invalidate(pass_id, domain))
+    return result.rowcount
+
+# ==================== 分块上传 ====================
+
+def upload_path(upload_id):
+    """上传会话的暂存文件路径"""
+    directory = UPLOAD_DIR or os.path.join(os.path.dirname(os.path.abspath(DATABASE_PATH)), 'uploads')
+    return os.path.join(directory, f'{upload_id}.part')
+
+def remove_upload_file(upload_id):
+    try:
+        os.unlink(upload_path(upload_id))
+    except FileNotFoundError:
+        pass
+
+def purge_expired_uploads(conn):
+    """删除过期的上传会话及其暂存文件"""
+    expired = conn.execute(
+        'SELECT upload_id FROM upload_sessions WHERE expires_at < ?',
+        (time.time(),)
+    ).fetchall()
+    for row in expired:
+        conn.execute('DELETE FROM upload_sessions WHERE upload_id = ?', (row['upload_id'],))
+        remove_upload_file(row['upload_id'])
+    conn.commit()
+    return len(expired)
+
+def create_upload_session(conn, pass_id, domain, size):
+    """创建上传会话和空的暂存文件"""
+    purge_expired_uploads(conn)
+    
+    upload_id = secrets.token_hex(16)
+    path = upload_path(upload_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+    
+    expires_at = time.time() + UPLOAD_SESSION_TTL
+    conn.execute('''
+        INSERT INTO upload_sessions (upload_id, pass_id, domain, size, received, expires_at)
+        VALUES (?, ?, ?, ?, 0, ?)
+    ''', (upload_id, pass_id, domain, size, expires_at))
+    conn.commit()
+    return {'upload_id': upload_id, 'pass_id': pass_id, 'domain': domain, 'size': size,
+            'received': 0, 'expires_at': expires_at}
+
+def load_upload_session(conn, pass_id, upload_id):
+    """读取未过期的上传会话，不存在时返回None"""
+    return conn.execute('''
+        SELECT * FROM upload_sessions
+        WHERE upload_id = ? AND pass_id = ? AND expires_at >= ?
+    ''', (upload_id, pass_id, time.time())).fetchone()
+
+def upload_session_info(session):
+    return {
+        'upload_id': session['upload_id'],
+        'domain': session['domain'],
+        'size': session['size'],
+        'received': session['received'],
+        'expires_at': datetime.utcfromtimestamp(session['expires_at']).isoformat() + 'Z'
+    }
+
+def write_upload_chunk(conn, session, offset, stream, length):
+    """把请求体分块写入暂存文件的offset处，返回更新后的received
+    
+    offset 不得超过已连续收到的字节数（允许与已收到部分重叠，便于重试）；
+    连接中断时（读取请求体抛出 ClientDisconnected）已写入的部分仍然计入，异常继续抛出。
+    """
+    written = 0
+    try:
+        with open(upload_path(session['upload_id']), 'r+b') as f:
+            f.seek(offset)
+            while written < length:
+                chunk = stream.read(min(BLOB_CHUNK_SIZE, length - written))
+                if not chunk:
+                    break
+                f.write(chunk)
+                written += len(chunk)
+    finally:
+        # 文件已关闭，写入的内容已落盘
+        conn.execute('''
+            UPDATE upload_sessions SET received = MAX(received, ?), expires_at = ?
+            WHERE upload_id = ?
+        ''', (offset + written, time.time() + UPLOAD_SESSION_TTL, session['upload_id']))
+        conn.commit()
+    return max(session['received'], offset + written)
+
+def commit_upload_session(conn, session, expected_hash=None):
+    """把暂存文件作为新版本写入（分块写入BLOB，不整体载入内存），返回 (新版本ID, 错误信息)
+    
+    删除会话、写入版本和记录变更在同一事务中完成；会话已被并发提交或哈希不一致时回滚。
+    """
+    upload_id, pass_id, domain, size = session['upload_id'], session['pass_id'], session['domain'], session['size']
+    created_at = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+    
+    # 先删除会话：同一会话的并发提交只有一个能成功
+    if not conn.execute('DELETE FROM upload_sessions WHERE upload_id = ?', (upload_id,)).rowcount:
+        conn.rollback()
+        return None, 'Upload not found'
+    
+    cursor = conn.execute('''
+        INSERT INTO data_entries (pass_id, domain, data, size, created_at)
+        VALUES (?, ?, zeroblob(?), ?, ?)
+    ''', (pass_id, domain, size, base64_length(size), created_at))
+    entry_id = cursor.lastrowid
+    
+    # 哈希按 data 字段的Base64文本计算；BLOB_CHUNK_SIZE 为3的倍数，分块编码可直接拼接
+    digest = hashlib.sha256()
+    with open(upload_path(upload_id), 'rb') as f, conn.blobopen('data_entries', 'data', entry_id) as blob:
+        while True:
+            chunk = f.read(BLOB_CHUNK_SIZE)
+            if not chunk:
+                break
+            blob.write(chunk)
+            digest.update(base64.b64encode(chunk))
+    
+    digest = digest.hexdigest()
+    if expected_hash and digest != expected_hash:
+        conn.rollback()
+        return None, 'Content hash mismatch'
+    
+    conn.execute('UPDATE data_entries SET content_hash = ? WHERE id = ?', (digest, entry_id))
+    event = record_change(conn, pass_id, domain, 'save')
+    change_hub.commit(conn, pass_id, [event], lambda: latest_cache.invalidate(pass_id, domain))
+    membership.add_domain(pass_id, domain)
+    remove_upload_file(upload_id)
+    
+    cleanup_old_versions(pass_id, domain)
+    return entry_id, None
+
+# ==================== 响应压缩 ====================
+
+COMPRESSIBLE_MIMETYPES = {'text/html', 'text/plain', 'text/css', 'application/json', 'application/javascript'}
+
+def preferred_encoding():
+    """按Accept-Encoding选择响应编码：优先br（已安装brotli时），其次gzip"""
+    accept = request.accept_encodings
+    if brotli is not None and accept['br']:
+        return 'br'
+    if accept['gzip']:
+        return 'gzip'
+    return None
+
+def compress_bytes(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=COMPRESSION_LEVEL)
+    return gzip.compress(data, COMPRESSION_LEVEL, mtime=0)
+
+def compress_stream(chunks, encoding):
+    """逐块压缩流式响应体"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=COMPRESSION_LEVEL)
+        compress, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, 31)
+        compress, finish = compressor.compress, compressor.flush
+    
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compress(chunk)
+            if data:
+                yield data
+        yield finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+@app.after_request
+def compress_response(response):
+    """按Accept-Encoding压缩HTML/JSON响应；已编码、过小或不可压缩的响应原样返回"""
+    if (request.method == 'HEAD' or response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    
+    if response.content_length is not None and response.content_length < COMPRESSION_MIN_SIZE:
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    encoding = preferred_encoding()
+    if encoding is None:
+        return response
+    
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < COMPRESSION_MIN_SIZE:
+            return response
+        response.set_data(compress_bytes(body, encoding))
+    
+    response.headers['Content-Encoding'] = encoding
+    
+    # 压缩后的字节与原表示不同，强ETag降为弱ETag（If-None-Match按弱比较）
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+# ==================== API端点 ====================
+
+@app.route('/health')
+def health():
+    """健康检查"""
+    return jsonify({
+        'status': 'ok',
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'version': '1.0.0'
+    })
+
+@ns_pass.route('/create')
+class CreatePass(Resource):
+    @ns_pass.doc('create_pass')
+    @ns_pass.expect(create_pass_model)
+    @ns_pass.marshal_with(pass_model)
+    @ns_pass.response(201, 'Pass ID 创建成功')
+    @ns_pass.response(400, '请求参数错误')
+    @ns_pass.response(500, '服务器内部错误')
+    def post(self):
+        """创建新的Pass ID"""
+        try:
+            data = request.get_json() or {}
+            domain = data.get('domain', '')
+            
+            # 生成Pass ID
+            pass_id = generate_pass()
+            
             # 存储到数据库
             with get_db() as conn:
                 conn.execute(
@@ -761,6 +2138,7 @@ class CreatePass(Resource):
                     (pass_id,)
                 )
                 conn.commit()
+            membership.add_pass(pass_id)
             
             return {
                 'pass_id': pass_id,
@@ -788,6 +2166,7 @@ def create_pass_legacy():
                 (pass_id,)
             )
             conn.commit()
+        membership.add_pass(pass_id)
         
         return jsonify({
             'pass': pass_id,
@@ -807,87 +2186,797 @@ class CheckPass(Resource):
     def get(self, pass_id):
         """验证Pass是否存在"""
         try:
+            if not membership.might_have_pass(pass_id):
+                return {'exists': False}, 404
+            
+            with get_db() as conn:
+                # 检查Pass是否存在
+                pass_info = conn.execute(
+                    'SELECT created_at FROM passes WHERE pass_id = ?',
+                    (pass_id,)
+                ).fetchone()
+                
+                if not pass_info:
+                    return {'exists': False}, 404
+                
+                # 获取该Pass下的所有域名
+                domains = conn.execute('''
+                    SELECT DISTINCT domain FROM data_entries WHERE pass_id = ?
+                ''', (pass_id,)).fetchall()
+                
+                return {
+                    'pass_id': pass_id,
+                    'exists': True,
+                    'created_at': pass_info['created_at'],
+                    'domains': [row['domain'] for row in domains]
+                }
+        
+        except Exception as e:
+            return {'error': str(e)}, 500
+
+
+@app.route('/api/pass/<pass_id>/check')
+def check_pass_legacy(pass_id):
+    """验证Pass是否存在（兼容旧接口）"""
+    try:
+        if not membership.might_have_pass(pass_id):
+            return jsonify({'exists': False})
+        
+        with get_db() as conn:
+            # 检查Pass是否存在
+            pass_info = conn.execute(
+                'SELECT created_at FROM passes WHERE pass_id = ?',
+                (pass_id,)
+            ).fetchone()
+            
+            if not pass_info:
+                return jsonify({'exists': False})
+            
+            # 获取该Pass下的所有域名
+            domains = conn.execute('''
+                SELECT DISTINCT domain FROM data_entries WHERE pass_id = ?
+            ''', (pass_id,)).fetchall()
+            
+            return jsonify({
+                'exists': True,
+                'created_at': pass_info['created_at'],
+                'domains': [row['domain'] for row in domains]
+            })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@ns_pass.route('/<string:pass_id>/events')
+class PassEvents(Resource):
+    @ns_pass.doc('pass_events')
+    @ns_pass.param('last_event_id', '断线重连时最后收到的事件ID（也可用Last-Event-ID请求头）')
+    @ns_pass.response(200, 'text/event-stream 变更事件流')
+    @ns_pass.response(404, 'Pass ID 不存在')
+    @ns_pass.response(500, '服务器内部错误')
+    def get(self, pass_id):
+        """订阅Pass的数据变更（Server-Sent Events）"""
+        try:
+            if not membership.might_have_pass(pass_id):
+                return {'error': 'Invalid pass ID'}, 404
+            
+            # EventSource重连时自动携带Last-Event-ID头，首次连接可通过参数指定
+            last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+            if last_event_id is not None:
+                try:
+                    last_event_id = int(last_event_id)
+                except ValueError:
+                    # 无法识别的ID从头补发，客户端得到每个域名的最新状态
+                    last_event_id = 0
+            
+            with get_db() as conn:
+                pass_exists = conn.execute(
+                    'SELECT 1 FROM passes WHERE pass_id = ?',
+                    (pass_id,)
+                ).fetchone()
+                # 首次连接从当前最新序号开始，之后提交的变更都会推送
+                if pass_exists and last_event_id is None:
+                    last_event_id = conn.execute(
+                        'SELECT COALESCE(MAX(seq), 0) FROM changes WHERE pass_id = ?',
+                        (pass_id,)
+                    ).fetchone()[0]
+            
+            if not pass_exists:
+                return {'error': 'Invalid pass ID'}, 404
+            
+            # 连接关闭时取消订阅
+            subscriber = change_hub.subscribe(pass_id, last_event_id)
+            response = Response(change_event_stream(subscriber), mimetype='text/event-stream', headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no'
+            })
+            response.call_on_close(lambda: change_hub.unsubscribe(subscriber))
+            return response
+        
+        except Exception as e:
+            return {'error': str(e)}, 500
+
+@ns_pass.route('/<string:pass_id>/changes')
+class PassChanges(Resource):
+    @ns_pass.doc('pass_changes')
+    @ns_pass.param('since', '上次同步到的序号，返回其后的变更（默认0）')
+    @ns_pass.param('limit', f'返回条数（默认100，最大{MAX_CHANGES_PAGE}）')
+    @ns_pass.response(200, '成功获取变更列表')
+    @ns_pass.response(400, '请求参数错误')
+    @ns_pass.response(404, 'Pass ID 不存在')
+    @ns_pass.response(500, '服务器内部错误')
+    def get(self, pass_id):
+        """获取Pass自某序号以来变化的域名及其最新版本"""
+        try:
+            try:
+                since = int(request.args.get('since', 0))
+                limit = int(request.args.get('limit', 100))
+            except ValueError:
+                return {'error': 'since and limit must be integers'}, 400
+            
+            if since < 0 or not 1 <= limit <= MAX_CHANGES_PAGE:
+                return {'error': f'since must be >= 0 and limit between 1 and {MAX_CHANGES_PAGE}'}, 400
+            
+            if not membership.might_have_pass(pass_id):
+                return {'error': 'Invalid pass ID'}, 404
+            
+            with get_db() as conn:
+                pass_exists = conn.execute(
+                    'SELECT 1 FROM passes WHERE pass_id = ?',
+                    (pass_id,)
+                ).fetchone()
+                
+                if not pass_exists:
+                    return {'error': 'Invalid pass ID'}, 404
+                
+                # 多取一条判断是否还有下一页
+                changes = load_changes(conn, pass_id, since, limit + 1)
+            
+            has_more = len(changes) > limit
+            changes = changes[:limit]
+            
+            return {
+                'pass_id': pass_id,
+                'changes': changes,
+                'next_since': changes[-1]['seq'] if changes else since,
+                'has_more': has_more
+            }
+        
+        except Exception as e:
+            return {'error': str(e)}, 500
+
+def parse_sync_time(value):
+    """ISO 8601 时间（可带 Z 或时区）或数据库时间 -> 不带时区的UTC时间"""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def parse_as_of(value):
+    """as_of 参数 -> 与 created_at 相同的数据库时间格式（秒精度，UTC）"""
+    return parse_sync_time(value).strftime('%Y-%m-%d %H:%M:%S')
+
+def sync_action(client, server_entry):
+    """与扩展的 decideSyncDirection 相同的判断顺序：upload / download / none
+    
+    与扩展一致，没有上次同步时间（首次同步）时先于哈希比较直接下载，即使内容相同。
+    """
+    if server_entry is None:
+        return 'upload' if client.get('hash') else 'none'
+    if not client.get('hash'):
+        return 'download'
+    if not client.get('last_sync'):
+        return 'download'
+    if client['hash'] == server_entry['content_hash']:
+        return 'none'
+    # 服务器版本晚于上次同步则以服务器为准
+    if parse_sync_time(server_entry['created_at']) > parse_sync_time(client['last_sync']):
+        return 'download'
+    return 'upload'
+
+@ns_pass.route('/<string:pass_id>/manifest')
+class PassManifest(Resource):
+    @ns_pass.doc('pass_manifest')
+    @ns_pass.response(200, '各域名的同步方向')
+    @ns_pass.response(400, '请求参数错误')
+    @ns_pass.response(404, 'Pass ID 不存在')
+    @ns_pass.response(500, '服务器内部错误')
+    def post(self, pass_id):
+        """提交本地各域名的 {hash, last_sync}，一次返回每个域名应上传、下载还是无需同步"""
+        try:
+            manifest = request.get_json(silent=True)
+            if not isinstance(manifest, dict) or not manifest:
+                return {'error': 'Request body must be a map of {domain: {hash, last_sync}}'}, 400
+            if len(manifest) > MAX_BATCH_DOMAINS:
+                return {'error': f'Too many domains. Max: {MAX_BATCH_DOMAINS}'}, 400
+            
+            for domain, client in manifest.items():
+                if client is None:
+                    manifest[domain] = client = {}
+                if not isinstance(client, dict):
+                    return {'error': f'Invalid entry for domain: {domain}'}, 400
+                if client.get('last_sync'):
+                    try:
+                        parse_sync_time(client['last_sync'])
+                    except (TypeError, ValueError):
+                        return {'error': f'Invalid last_sync for domain: {domain}'}, 400
+            
+            if not membership.might_have_pass(pass_id):
+                return {'error': 'Invalid pass ID'}, 404
+            
+            # 过滤器判定不存在的域名无需查询
+            candidates = [domain for domain in manifest if membership.might_have_domain(pass_id, domain)]
+            
+            with get_db() as conn:
+                pass_exists = conn.execute(
+                    'SELECT 1 FROM passes WHERE pass_id = ?',
+                    (pass_id,)
+                ).fetchone()
+                
+                if not pass_exists:
+                    return {'error': 'Invalid pass ID'}, 404
+                
+                # changes 表记录了每个域名的最新版本ID，一次关联查询取出全部元数据
+                rows = conn.execute('''
+                    SELECT c.domain, d.id, d.size, d.created_at, d.content_hash
+                    FROM changes c
+                    JOIN data_entries d ON d.id = c.entry_id
+                    WHERE c.pass_id = ? AND c.domain IN (SELECT value FROM json_each(?))
+                ''', (pass_id, json.dumps(candidates))).fetchall() if candidates else []
+            
+            server_entries = {row['domain']: row for row in rows}
+            result = {}
+            for domain, client in manifest.items():
+                server_entry = server_entries.get(domain)
+                result[domain] = {
+                    'action': sync_action(client, server_entry),
+                    'server': entry_meta(domain, server_entry) if server_entry else None
+                }
+            
+            return {'pass_id': pass_id, 'domains': result}
+        
+        except Exception as e:
+            return {'error': str(e)}, 500
+
+@ns_data.route('/<string:pass_id>')
+class SaveData(Resource):
+    @ns_data.doc('save_data')
+    @ns_data.expect(store_data_model)
+    @ns_data.response(201, '数据保存成功')
+    @ns_data.response(400, '请求参数错误')
+    @ns_data.response(404, 'Pass ID 不存在')
+    @ns_data.response(500, '服务器内部错误')
+    def post(self, pass_id):
+        """保存数据"""
+        try:
+            domain = request.args.get('domain')
+            if not domain:
+                return {'error': 'Missing domain parameter'}, 400
+                
+            data = request.get_json()
+            if not data or 'data' not in data:
+                return {'error': 'Missing data field'}, 400
+            
+            encrypted_data = data['data']
+            
+            # 检查数据大小
+            data_size = len(encrypted_data.encode('utf-8'))
+            if data_size > MAX_DATA_SIZE:
+                return {'error': f'Data too large. Max size: {MAX_DATA_SIZE} bytes'}, 400
+            
+            # 验证Pass是否存在
+            if not membership.might_have_pass(pass_id):
+                return {'error': 'Invalid pass ID'}, 404
+            
             with get_db() as conn:
-                # 检查Pass是否存在
-                pass_info = conn.execute(
-                    'SELECT created_at FROM passes WHERE pass_id = ?',
+                pass_exists = conn.execute(
+                    'SELECT 1 FROM passes WHERE pass_id = ?',
                     (pass_id,)
                 ).fetchone()
                 
-                if not pass_info:
-                    return {'exists': False}, 404
+                if not pass_exists:
+                    return {'error': 'Invalid pass ID'}, 404
                 
-                # 获取该Pass下的所有域名
-                domains = conn.execute('''
-                    SELECT DISTINCT domain FROM data_entries WHERE pass_id = ?
-                ''', (pass_id,)).fetchall()
+                # 保存数据并清理旧版本
+                entry_id = save_data_entry(conn, pass_id, domain, encode_payload_for_storage(encrypted_data))
                 
                 return {
-                    'pass_id': pass_id,
-                    'exists': True,
-                    'created_at': pass_info['created_at'],
-                    'domains': [row['domain'] for row in domains]
-                }
+                    'success': True,
+                    'id': f'data_{entry_id}',
+                    'timestamp': datetime.utcnow().isoformat() + 'Z'
+                }, 201
         
         except Exception as e:
             return {'error': str(e)}, 500
 
 
-@app.route('/api/pass/<pass_id>/check')
-def check_pass_legacy(pass_id):
-    """验证Pass是否存在（兼容旧接口）"""
+@app.route('/api/data/<pass_id>', methods=['POST'])
+def save_data_legacy(pass_id):
+    """保存数据（兼容旧接口）"""
     try:
+        domain = request.args.get('domain')
+        if not domain:
+            return jsonify({'error': 'Missing domain parameter'}), 400
+            
+        data = request.get_json()
+        if not data or 'data' not in data:
+            return jsonify({'error': 'Missing data field'}), 400
+        
+        encrypted_data = data['data']
+        
+        # 检查数据大小
+        data_size = len(encrypted_data.encode('utf-8'))
+        if data_size > MAX_DATA_SIZE:
+            return jsonify({'error': f'Data too large. Max size: {MAX_DATA_SIZE} bytes'}), 400
+        
+        # 验证Pass是否存在
+        if not membership.might_have_pass(pass_id):
+            return jsonify({'error': 'Invalid pass ID'}), 404
+        
         with get_db() as conn:
-            # 检查Pass是否存在
-            pass_info = conn.execute(
-                'SELECT created_at FROM passes WHERE pass_id = ?',
+            pass_exists = conn.execute(
+                'SELECT 1 FROM passes WHERE pass_id = ?',
                 (pass_id,)
             ).fetchone()
             
-            if not pass_info:
-                return jsonify({'exists': False})
+            if not pass_exists:
+                return jsonify({'error': 'Invalid pass ID'}), 404
             
-            # 获取该Pass下的所有域名
-            domains = conn.execute('''
-                SELECT DISTINCT domain FROM data_entries WHERE pass_id = ?
-            ''', (pass_id,)).fetchall()
+            # 保存数据并清理旧版本
+            entry_id = save_data_entry(conn, pass_id, domain, encode_payload_for_storage(encrypted_data))
             
             return jsonify({
-                'exists': True,
-                'created_at': pass_info['created_at'],
-                'domains': [row['domain'] for row in domains]
+                'success': True,
+                'id': f'data_{entry_id}',
+                'timestamp': datetime.utcnow().isoformat() + 'Z'
             })
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @ns_data.route('/<string:pass_id>')
-class SaveData(Resource):
-    @ns_data.doc('save_data')
-    @ns_data.expect(store_data_model)
+class GetData(Resource):
+    @ns_data.doc('get_data')
+    @ns_data.param('domain', '域名', required=True)
+    @ns_data.param('as_of', '可选，ISO 8601 时间，返回该时刻的版本')
+    @ns_data.response(200, '数据获取成功', data_model)
+    @ns_data.response(304, '数据未变化（If-None-Match 命中）')
+    @ns_data.response(400, '请求参数错误')
+    @ns_data.response(404, '数据未找到')
+    @ns_data.response(500, '服务器内部错误')
+    def get(self, pass_id):
+        """获取最新数据（给出as_of时获取该时刻的版本）"""
+        try:
+            domain = request.args.get('domain')
+            if not domain:
+                return {'error': 'Missing domain parameter'}, 400
+            
+            as_of = request.args.get('as_of')
+            if as_of:
+                try:
+                    as_of = parse_as_of(as_of)
+                except ValueError:
+                    return {'error': 'Invalid as_of timestamp'}, 400
+            
+            if not membership.might_have_domain(pass_id, domain):
+                return {'error': 'No data found'}, 404
+            if as_of:
+                return self.get_as_of(pass_id, domain, as_of)
+            
+            # 先用元数据判断条件请求，304不读取数据
+            epoch = latest_cache.epoch
+            meta = load_latest_meta(pass_id, domain)
+            if not meta:
+                return {'error': 'No data found'}, 404
+            
+            etag = entry_etag(meta['id'])
+            if is_not_modified(etag):
+                return not_modified_response(etag)
+            
+            entry = load_latest_entry(pass_id, domain, BLOB_STREAM_THRESHOLD, meta, epoch)
+            if not entry:
+                return {'error': 'No data found'}, 404
+            
+            headers = dict(etag_headers(etag), **entry_meta_headers(entry))
+            return entry_json_response(domain, entry, headers, pass_id, epoch)
+        
+        except Exception as e:
+            return {'error': str(e)}, 500
+    
+    def get_as_of(self, pass_id, domain, as_of):
+        """某一时刻的版本：不经过最新版本缓存"""
+        meta = load_as_of_meta(pass_id, domain, as_of)
+        if not meta:
+            return {'error': 'No data found'}, 404
+        
+        etag = entry_etag(meta['id'])
+        if is_not_modified(etag):
+            return not_modified_response(etag)
+        
+        entry = load_entry_data(meta, BLOB_STREAM_THRESHOLD)
+        if not entry:
+            return {'error': 'No data found'}, 404
+        return entry_json_response(domain, entry, dict(etag_headers(etag), **entry_meta_headers(entry)))
+    
+    @ns_data.doc('head_data')
+    @ns_data.param('domain', '域名', required=True)
+    @ns_data.response(200, '最新版本的元数据（X-Entry-Id / X-Content-Hash / X-Data-Size / X-Timestamp）')
+    @ns_data.response(404, '数据未找到')
+    def head(self, pass_id):
+        """只获取最新数据的元数据响应头，不读取数据"""
+        domain = request.args.get('domain')
+        if not domain:
+            return Response(status=400)
+        
+        entry = load_latest_meta(pass_id, domain) if membership.might_have_domain(pass_id, domain) else None
+        if not entry:
+            return Response(status=404)
+        
+        etag = entry_etag(entry['id'])
+        if is_not_modified(etag):
+            return not_modified_response(etag)
+        
+        # 空的迭代器作为响应体，Werkzeug不会自动补上 Content-Length: 0
+        response = Response(iter(()), mimetype='application/json',
+                            headers=dict(etag_headers(etag), **entry_meta_headers(entry)))
+        response.vary.add('Accept-Encoding')
+        # Content-Length 与同样请求的GET一致；GET会被压缩或长度未知时不声明
+        length = data_json_length(domain, entry)
+        if length is not None and (length < COMPRESSION_MIN_SIZE or preferred_encoding() is None):
+            response.content_length = length
+        return response
+
+
+@app.route('/api/data/<pass_id>')
+def get_data_legacy(pass_id):
+    """获取最新数据（兼容旧接口）"""
+    if request.method == 'HEAD':
+        return GetData().head(pass_id)
+    return GetData().get(pass_id)
+
+@ns_data.route('/<string:pass_id>/meta')
+class DataMeta(Resource):
+    @ns_data.doc('get_data_meta')
+    @ns_data.param('domain', '域名', required=True)
+    @ns_data.response(200, '元数据获取成功')
+    @ns_data.response(304, '数据未变化（If-None-Match 命中）')
+    @ns_data.response(400, '请求参数错误')
+    @ns_data.response(404, '数据未找到')
+    @ns_data.response(500, '服务器内部错误')
+    def get(self, pass_id):
+        """获取最新数据的元数据（版本ID、大小、内容哈希、时间），不读取数据"""
+        try:
+            domain = request.args.get('domain')
+            if not domain:
+                return {'error': 'Missing domain parameter'}, 400
+            if not membership.might_have_domain(pass_id, domain):
+                return {'error': 'No data found'}, 404
+            
+            entry = load_latest_meta(pass_id, domain)
+            if not entry:
+                return {'error': 'No data found'}, 404
+            
+            etag = entry_etag(entry['id'], '_meta')
+            if is_not_modified(etag):
+                return not_modified_response(etag)
+            
+            return entry_meta(domain, entry), 200, etag_headers(etag)
+        
+        except Exception as e:
+            return {'error': str(e)}, 500
+
+def batch_data_stream(pass_id, domains, as_of=None):
+    """逐条输出批量读取结果，避免把所有密文同时放在内存中
+    
+    changes 表中记录了每个域名的最新版本ID，一次关联查询即可取出全部最新数据；
+    给出as_of时改为按 (pass_id, domain, created_at) 索引逐个域名查找该时刻的版本。
+    """
+    if as_of is None:
+        query = '''
+            SELECT c.domain, d.id, d.data, d.codec, d.size, d.created_at
+            FROM changes c
+            JOIN data_entries d ON d.id = c.entry_id
+            WHERE c.pass_id = ?
+        '''
+        params = [pass_id]
+    else:
+        query = '''
+            SELECT c.domain, d.id, d.data, d.codec, d.size, d.created_at
+            FROM changes c
+            JOIN data_entries d ON d.id = (
+                SELECT id FROM data_entries
+                WHERE pass_id = c.pass_id AND domain = c.domain AND created_at <= ?
+                ORDER BY created_at DESC, id DESC
+                LIMIT 1
+            )
+            WHERE c.pass_id = ?
+        '''
+        params = [as_of, pass_id]
+    
+    if domains is not None:
+        # 过滤器判定不存在的域名无需查询
+        candidates = [domain for domain in domains if membership.might_have_domain(pass_id, domain)]
+        query += ' AND c.domain IN (SELECT value FROM json_each(?))'
+        params.append(json.dumps(candidates))
+    query += ' ORDER BY c.domain'
+    
+    yield ('{"pass_id": %s, "entries": [' % json.dumps(pass_id)).encode('utf-8')
+    
+    found = set()
+    if domains is None or candidates:
+        with get_db() as conn:
+            for index, row in enumerate(conn.execute(query, params)):
+                found.add(row['domain'])
+                prefix, suffix = data_json_parts(row['domain'], row)
+                if index:
+                    yield b', '
+                yield prefix
+                yield data_json_body(stored_payload(row))
+                yield suffix
+    
+    missing = [domain for domain in domains if domain not in found] if domains is not None else []
+    yield ('], "missing": %s}' % json.dumps(missing)).encode('utf-8')
+
+@ns_data.route('/<string:pass_id>/batch')
+class BatchData(Resource):
+    @ns_data.doc('batch_get_data')
+    @ns_data.param('domains', f'逗号分隔的域名列表（最多{MAX_BATCH_DOMAINS}个），或 all 表示全部域名', required=True)
+    @ns_data.param('as_of', '可选，ISO 8601 时间，返回各域名在该时刻的版本')
+    @ns_data.response(200, '数据获取成功')
+    @ns_data.response(400, '请求参数错误')
+    @ns_data.response(404, 'Pass ID 不存在')
+    @ns_data.response(500, '服务器内部错误')
+    def get(self, pass_id):
+        """一次获取多个域名的最新数据"""
+        try:
+            domains_param = request.args.get('domains')
+            if not domains_param:
+                return {'error': 'Missing domains parameter'}, 400
+            
+            if domains_param == 'all':
+                domains = None
+            else:
+                domains = list(dict.fromkeys(domain for domain in domains_param.split(',') if domain))
+                if not domains:
+                    return {'error': 'Missing domains parameter'}, 400
+                if len(domains) > MAX_BATCH_DOMAINS:
+                    return {'error': f'Too many domains. Max: {MAX_BATCH_DOMAINS}'}, 400
+            
+            as_of = request.args.get('as_of')
+            if as_of:
+                try:
+                    as_of = parse_as_of(as_of)
+                except ValueError:
+                    return {'error': 'Invalid as_of timestamp'}, 400
+            
+            if not membership.might_have_pass(pass_id):
+                return {'error': 'Invalid pass ID'}, 404
+            
+            with get_db() as conn:
+                pass_exists = conn.execute(
+                    'SELECT 1 FROM passes WHERE pass_id = ?',
+                    (pass_id,)
+                ).fetchone()
+            
+            if not pass_exists:
+                return {'error': 'Invalid pass ID'}, 404
+            
+            return Response(batch_data_stream(pass_id, domains, as_of), mimetype='application/json')
+        
+        except Exception as e:
+            return {'error': str(e)}, 500
+
+@ns_data.route('/<string:pass_id>/raw')
+class RawData(Resource):
+    @ns_data.doc('save_raw_data')
+    @ns_data.param('domain', '域名', required=True)
+    @ns_data.response(201, '数据保存成功')
+    @ns_data.response(400, '请求参数错误')
+    @ns_data.response(404, 'Pass ID 不存在')
+    @ns_data.response(415, '请求体必须为 application/octet-stream')
+    @ns_data.response(500, '服务器内部错误')
+    def post(self, pass_id):
+        """保存原始密文字节（无Base64/JSON包装）"""
+        try:
+            domain = request.args.get('domain')
+            if not domain:
+                return {'error': 'Missing domain parameter'}, 400
+
+            if request.mimetype != 'application/octet-stream':
+                return {'error': 'Content-Type must be application/octet-stream'}, 415
+
+            # 与JSON接口同一口径：Base64长度不超过MAX_DATA_SIZE
+            # 先根据Content-Length拒绝过大的请求，避免读入内存
+            if request.content_length and request.content_length > MAX_PAYLOAD_BYTES:
+                return {'error': f'Data too large. Max size: {MAX_PAYLOAD_BYTES} bytes'}, 400
+
+            raw_data = request.get_data(cache=False)
+            if not raw_data:
+                return {'error': 'Missing data body'}, 400
+            if len(raw_data) > MAX_PAYLOAD_BYTES:
+                return {'error': f'Data too large. Max size: {MAX_PAYLOAD_BYTES} bytes'}, 400
+
+            if not membership.might_have_pass(pass_id):
+                return {'error': 'Invalid pass ID'}, 404
+
+            with get_db() as conn:
+                pass_exists = conn.execute(
+                    'SELECT 1 FROM passes WHERE pass_id = ?',
+                    (pass_id,)
+                ).fetchone()
+
+                if not pass_exists:
+                    return {'error': 'Invalid pass ID'}, 404
+
+                entry_id = save_data_entry(conn, pass_id, domain, raw_data)
+
+                return {
+                    'success': True,
+                    'id': f'data_{entry_id}',
+                    'size': payload_size(raw_data),
+                    'timestamp': datetime.utcnow().isoformat() + 'Z'
+                }, 201
+
+        except Exception as e:
+            return {'error': str(e)}, 500
+
+    @ns_data.doc('get_raw_data')
+    @ns_data.param('domain', '域名', required=True)
+    @ns_data.response(200, '返回原始密文字节')
+    @ns_data.response(400, '请求参数错误')
+    @ns_data.response(404, '数据未找到')
+    @ns_data.response(406, '该版本不是Base64密文，无法以二进制返回')
+    @ns_data.response(500, '服务器内部错误')
+    def get(self, pass_id):
+        """获取最新数据的原始密文字节"""
+        try:
+            domain = request.args.get('domain')
+            if not domain:
+                return {'error': 'Missing domain parameter'}, 400
+
+            if not membership.might_have_domain(pass_id, domain):
+                return {'error': 'No data found'}, 404
+
+            epoch = latest_cache.epoch
+            data_entry = load_latest_entry(pass_id, domain, BLOB_STREAM_THRESHOLD)
+            if not data_entry:
+                return {'error': 'No data found'}, 404
+
+            headers = {
+                'X-Entry-Id': f'data_{data_entry["id"]}',
+                'X-Timestamp': data_entry['created_at']
+            }
+            if data_entry['data'] is None:
+                return streamed_entry_response(pass_id, domain, data_entry, epoch, False,
+                                               mimetype='application/octet-stream', headers=headers)
+
+            # 落盘的gzip字节就是客户端可接受的编码，直接作为响应体，无需解压再压缩
+            if data_entry['codec'] == 'gzip' and request.accept_encodings['gzip']:
+                response = Response(data_entry['data'], status=200, mimetype='application/octet-stream', headers=headers)
+                response.headers['Content-Encoding'] = 'gzip'
+                response.vary.add('Accept-Encoding')
+                return response
+
+            try:
+                raw_data = payload_as_bytes(stored_payload(data_entry))
+            except ValueError:
+                return {'error': 'Entry is not binary encodable'}, 406
+
+            return Response(raw_data, status=200, mimetype='application/octet-stream', headers=headers)
+
+        except Exception as e:
+            return {'error': str(e)}, 500
+
+def load_delta_base(pass_id, domain, entry_id):
+    """读取增量上传的基础版本，通常就是缓存中的最新版本；不存在或不属于该域名时返回None"""
+    entry = latest_cache.get(pass_id, domain)
+    if entry is None or entry['id'] != entry_id:
+        entry = load_version_entry(pass_id, entry_id)
+    if entry is None or entry.get('domain', domain) != domain:
+        return None
+    return entry
+
+@ns_data.route('/<string:pass_id>/delta')
+class DeltaData(Resource):
+    @ns_data.doc('save_delta_data')
+    @ns_data.param('domain', '域名', required=True)
+    @ns_data.param('base_version_id', '增量所基于的版本ID', required=True)
+    @ns_data.param('hash', '重建后数据的内容哈希（与 /meta 中的 content_hash 相同）', required=True)
     @ns_data.response(201, '数据保存成功')
+    @ns_data.response(400, '请求参数错误或增量格式错误')
+    @ns_data.response(404, 'Pass ID 不存在')
+    @ns_data.response(409, '基础版本不存在或哈希不一致，需要完整上传')
+    @ns_data.response(415, '请求体必须为 application/octet-stream')
+    @ns_data.response(500, '服务器内部错误')
+    def post(self, pass_id):
+        """基于已有版本的二进制增量上传（复制/插入指令），服务器重建完整数据后保存为新版本"""
+        try:
+            domain = request.args.get('domain')
+            base_version_id = request.args.get('base_version_id')
+            expected_hash = request.args.get('hash')
+            if not domain or not base_version_id or not expected_hash:
+                return {'error': 'Missing domain, base_version_id or hash parameter'}, 400
+            
+            if request.mimetype != 'application/octet-stream':
+                return {'error': 'Content-Type must be application/octet-stream'}, 415
+            
+            if request.content_length and request.content_length > MAX_DATA_SIZE:
+                return {'error': f'Data too large. Max size: {MAX_DATA_SIZE} bytes'}, 400
+            
+            delta = request.get_data(cache=False)
+            if not delta:
+                return {'error': 'Missing delta body'}, 400
+            
+            if not membership.might_have_pass(pass_id):
+                return {'error': 'Invalid pass ID'}, 404
+            
+            # 基础版本已被清理或删除时，客户端改为完整上传
+            entry_id = parse_version_id(base_version_id)
+            base = None
+            if entry_id is not None and membership.might_have_domain(pass_id, domain):
+                base = load_delta_base(pass_id, domain, entry_id)
+            if base is None:
+                return {'error': 'Base version not found', 'full_upload_required': True}, 409
+            
+            try:
+                base_bytes = payload_as_bytes(stored_payload(base))
+            except ValueError:
+                return {'error': 'Base version is not binary', 'full_upload_required': True}, 409
+            
+            try:
+                payload = apply_delta(base_bytes, delta, MAX_PAYLOAD_BYTES)
+            except ValueError as e:
+                return {'error': str(e)}, 400
+            
+            if content_hash(payload) != expected_hash:
+                return {'error': 'Content hash mismatch', 'full_upload_required': True}, 409
+            
+            with get_db() as conn:
+                pass_exists = conn.execute(
+                    'SELECT 1 FROM passes WHERE pass_id = ?',
+                    (pass_id,)
+                ).fetchone()
+                
+                if not pass_exists:
+                    return {'error': 'Invalid pass ID'}, 404
+                
+                new_id = save_data_entry(conn, pass_id, domain, payload)
+                
+                return {
+                    'success': True,
+                    'id': f'data_{new_id}',
+                    'size': payload_size(payload),
+                    'content_hash': expected_hash,
+                    'timestamp': datetime.utcnow().isoformat() + 'Z'
+                }, 201
+        
+        except Exception as e:
+            return {'error': str(e)}, 500
+
+@ns_data.route('/<string:pass_id>/uploads')
+class UploadSessions(Resource):
+    @ns_data.doc('create_upload')
+    @ns_data.param('domain', '域名', required=True)
+    @ns_data.param('size', '数据总字节数', required=True)
+    @ns_data.response(201, '上传会话创建成功')
     @ns_data.response(400, '请求参数错误')
     @ns_data.response(404, 'Pass ID 不存在')
     @ns_data.response(500, '服务器内部错误')
     def post(self, pass_id):
-        """保存数据"""
+        """创建分块上传会话"""
         try:
             domain = request.args.get('domain')
             if not domain:
                 return {'error': 'Missing domain parameter'}, 400
-                
-            data = request.get_json()
-            if not data or 'data' not in data:
-                return {'error': 'Missing data field'}, 400
             
-            encrypted_data = data['data']
+            size = request.args.get('size', type=int)
+            if not size or size <= 0:
+                return {'error': 'Missing or invalid size parameter'}, 400
+            if size > MAX_UPLOAD_SIZE:
+                return {'error': f'Data too large. Max size: {MAX_UPLOAD_SIZE} bytes'}, 400
             
-            # 检查数据大小
-            data_size = len(encrypted_data.encode('utf-8'))
-            if data_size > MAX_DATA_SIZE:
-                return {'error': f'Data too large. Max size: {MAX_DATA_SIZE} bytes'}, 400
+            if not membership.might_have_pass(pass_id):
+                return {'error': 'Invalid pass ID'}, 404
             
-            # 验证Pass是否存在
             with get_db() as conn:
                 pass_exists = conn.execute(
                     'SELECT 1 FROM passes WHERE pass_id = ?',
@@ -897,144 +2986,130 @@ class SaveData(Resource):
                 if not pass_exists:
                     return {'error': 'Invalid pass ID'}, 404
                 
-                # 保存数据
-                cursor = conn.execute('''
-                    INSERT INTO data_entries (pass_id, domain, data, size)
-                    VALUES (?, ?, ?, ?)
-                ''', (pass_id, domain, encrypted_data, data_size))
-                
-                conn.commit()
-                
-                # 清理旧版本
-                cleanup_old_versions(pass_id, domain)
-                
-                return {
-                    'success': True,
-                    'id': f'data_{cursor.lastrowid}',
-                    'timestamp': datetime.utcnow().isoformat() + 'Z'
-                }, 201
+                session = create_upload_session(conn, pass_id, domain, size)
+            
+            return dict(upload_session_info(session), chunk_size=MAX_DATA_SIZE), 201
         
         except Exception as e:
             return {'error': str(e)}, 500
 
-
-@app.route('/api/data/<pass_id>', methods=['POST'])
-def save_data_legacy(pass_id):
-    """保存数据（兼容旧接口）"""
-    try:
-        domain = request.args.get('domain')
-        if not domain:
-            return jsonify({'error': 'Missing domain parameter'}), 400
-            
-        data = request.get_json()
-        if not data or 'data' not in data:
-            return jsonify({'error': 'Missing data field'}), 400
-        
-        encrypted_data = data['data']
-        
-        # 检查数据大小
-        data_size = len(encrypted_data.encode('utf-8'))
-        if data_size > MAX_DATA_SIZE:
-            return jsonify({'error': f'Data too large. Max size: {MAX_DATA_SIZE} bytes'}), 400
+@ns_data.route('/<string:pass_id>/uploads/<string:upload_id>')
+class UploadSession(Resource):
+    @ns_data.doc('get_upload')
+    @ns_data.response(200, '上传进度（received 为已连续收到的字节数，断线后从此处续传）')
+    @ns_data.response(404, '上传会话不存在或已过期')
+    @ns_data.response(500, '服务器内部错误')
+    def get(self, pass_id, upload_id):
+        """查询上传进度"""
+        try:
+            with get_db() as conn:
+                session = load_upload_session(conn, pass_id, upload_id)
+            if not session:
+                return {'error': 'Upload not found'}, 404
+            return upload_session_info(session)
         
-        # 验证Pass是否存在
-        with get_db() as conn:
-            pass_exists = conn.execute(
-                'SELECT 1 FROM passes WHERE pass_id = ?',
-                (pass_id,)
-            ).fetchone()
-            
-            if not pass_exists:
-                return jsonify({'error': 'Invalid pass ID'}), 404
+        except Exception as e:
+            return {'error': str(e)}, 500
+    
+    @ns_data.doc('put_upload_chunk')
+    @ns_data.param('offset', '分块在数据中的起始位置', required=True)
+    @ns_data.response(200, '分块写入成功')
+    @ns_data.response(400, '请求参数错误')
+    @ns_data.response(404, '上传会话不存在或已过期')
+    @ns_data.response(409, 'offset 超过已收到的字节数')
+    @ns_data.response(411, '缺少 Content-Length')
+    @ns_data.response(415, '请求体必须为 application/octet-stream')
+    @ns_data.response(500, '服务器内部错误')
+    def put(self, pass_id, upload_id):
+        """上传一个分块"""
+        try:
+            if request.mimetype != 'application/octet-stream':
+                return {'error': 'Content-Type must be application/octet-stream'}, 415
             
-            # 保存数据
-            cursor = conn.execute('''
-                INSERT INTO data_entries (pass_id, domain, data, size)
-                VALUES (?, ?, ?, ?)
-            ''', (pass_id, domain, encrypted_data, data_size))
+            offset = request.args.get('offset', type=int)
+            if offset is None or offset < 0:
+                return {'error': 'Missing or invalid offset parameter'}, 400
             
-            conn.commit()
+            length = request.content_length
+            if length is None:
+                return {'error': 'Content-Length required'}, 411
+            if length > MAX_DATA_SIZE:
+                return {'error': f'Chunk too large. Max size: {MAX_DATA_SIZE} bytes'}, 400
             
-            # 清理旧版本
-            cleanup_old_versions(pass_id, domain)
+            with get_db() as conn:
+                purge_expired_uploads(conn)
+                session = load_upload_session(conn, pass_id, upload_id)
+                if not session:
+                    return {'error': 'Upload not found'}, 404
+                if offset > session['received']:
+                    return {'error': 'Offset beyond received bytes', 'received': session['received']}, 409
+                if offset + length > session['size']:
+                    return {'error': 'Chunk exceeds declared size'}, 400
+                
+                received = write_upload_chunk(conn, session, offset, request.stream, length)
             
-            return jsonify({
-                'success': True,
-                'id': f'data_{cursor.lastrowid}',
-                'timestamp': datetime.utcnow().isoformat() + 'Z'
-            })
+            return {'upload_id': upload_id, 'received': received, 'size': session['size']}
+        
+        except Exception as e:
+            return {'error': str(e)}, 500
     
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    @ns_data.doc('abort_upload')
+    @ns_data.response(200, '上传会话已取消')
+    @ns_data.response(404, '上传会话不存在或已过期')
+    @ns_data.response(500, '服务器内部错误')
+    def delete(self, pass_id, upload_id):
+        """取消上传并删除暂存的分块"""
+        try:
+            with get_db() as conn:
+                session = load_upload_session(conn, pass_id, upload_id)
+                if not session:
+                    return {'error': 'Upload not found'}, 404
+                conn.execute('DELETE FROM upload_sessions WHERE upload_id = ?', (upload_id,))
+                conn.commit()
+            remove_upload_file(upload_id)
+            return {'success': True}
+        
+        except Exception as e:
+            return {'error': str(e)}, 500
 
-@ns_data.route('/<string:pass_id>')
-class GetData(Resource):
-    @ns_data.doc('get_data')
-    @ns_data.marshal_with(data_model)
-    @ns_data.response(200, '数据获取成功')
-    @ns_data.response(400, '请求参数错误')
-    @ns_data.response(404, '数据未找到')
+@ns_data.route('/<string:pass_id>/uploads/<string:upload_id>/commit')
+class CommitUpload(Resource):
+    @ns_data.doc('commit_upload')
+    @ns_data.param('hash', '可选，数据的内容哈希（与 /meta 中的 content_hash 相同）')
+    @ns_data.response(201, '数据保存成功')
+    @ns_data.response(404, '上传会话不存在或已过期')
+    @ns_data.response(409, '数据未上传完整或哈希不一致')
     @ns_data.response(500, '服务器内部错误')
-    def get(self, pass_id):
-        """获取最新数据"""
+    def post(self, pass_id, upload_id):
+        """提交上传，原子地创建新版本"""
         try:
-            domain = request.args.get('domain')
-            if not domain:
-                return {'error': 'Missing domain parameter'}, 400
             with get_db() as conn:
-                # 获取最新数据
-                data_entry = conn.execute('''
-                    SELECT id, data, created_at FROM data_entries
-                    WHERE pass_id = ? AND domain = ?
-                    ORDER BY created_at DESC
-                    LIMIT 1
-                ''', (pass_id, domain)).fetchone()
+                purge_expired_uploads(conn)
+                session = load_upload_session(conn, pass_id, upload_id)
+                if not session:
+                    return {'error': 'Upload not found'}, 404
+                if session['received'] < session['size']:
+                    return {'error': 'Upload incomplete', 'received': session['received'], 'size': session['size']}, 409
                 
-                if not data_entry:
-                    return {'error': 'No data found'}, 404
+                entry_id, error = commit_upload_session(conn, session, request.args.get('hash'))
+                if error:
+                    return {'error': error}, 409
                 
                 return {
-                    'data': data_entry['data'],
-                    'timestamp': data_entry['created_at'],
-                    'id': f'data_{data_entry["id"]}'
-                }
+                    'success': True,
+                    'id': f'data_{entry_id}',
+                    'size': base64_length(session['size']),
+                    'timestamp': datetime.utcnow().isoformat() + 'Z'
+                }, 201
         
         except Exception as e:
             return {'error': str(e)}, 500
 
-
-@app.route('/api/data/<pass_id>')
-def get_data_legacy(pass_id):
-    """获取最新数据（兼容旧接口）"""
-    try:
-        domain = request.args.get('domain')
-        if not domain:
-            return jsonify({'error': 'Missing domain parameter'}), 400
-        with get_db() as conn:
-            # 获取最新数据
-            data_entry = conn.execute('''
-                SELECT id, data, created_at FROM data_entries
-                WHERE pass_id = ? AND domain = ?
-                ORDER BY created_at DESC
-                LIMIT 1
-            ''', (pass_id, domain)).fetchone()
-            
-            if not data_entry:
-                return jsonify({'error': 'No data found'}), 404
-            
-            return jsonify({
-                'data': data_entry['data'],
-                'timestamp': data_entry['created_at'],
-                'id': f'data_{data_entry["id"]}'
-            })
-    
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
 @ns_data.route('/<string:pass_id>/versions')
 class GetVersions(Resource):
     @ns_data.doc('get_versions')
     @ns_data.response(200, '版本列表获取成功')
+    @ns_data.response(304, '版本列表未变化（If-None-Match 命中）')
     @ns_data.response(400, '请求参数错误')
     @ns_data.response(500, '服务器内部错误')
     def get(self, pass_id):
@@ -1047,24 +3122,32 @@ class GetVersions(Resource):
             limit = request.args.get('limit', 5, type=int)
             limit = min(limit, MAX_VERSIONS)  # 限制最大返回数量
             
-            with get_db() as conn:
-                versions = conn.execute('''
-                    SELECT id, created_at, size FROM data_entries
-                    WHERE pass_id = ? AND domain = ?
-                    ORDER BY created_at DESC
-                    LIMIT ?
-                ''', (pass_id, domain, limit)).fetchall()
-                
-                return {
-                    'versions': [
-                        {
-                            'id': f'data_{row["id"]}',
-                            'timestamp': row['created_at'],
-                            'size': row['size']
-                        }
-                        for row in versions
-                    ]
-                }
+            versions = []
+            if membership.might_have_domain(pass_id, domain):
+                with get_db() as conn:
+                    versions = conn.execute('''
+                        SELECT id, created_at, size FROM data_entries
+                        WHERE pass_id = ? AND domain = ?
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT ?
+                    ''', (pass_id, domain, limit)).fetchall()
+            
+            # 版本列表由版本ID唯一确定
+            id_list = ','.join(str(row['id']) for row in versions)
+            etag = 'versions_' + hashlib.sha256(id_list.encode('ascii')).hexdigest()[:32]
+            if is_not_modified(etag):
+                return not_modified_response(etag)
+            
+            return {
+                'versions': [
+                    {
+                        'id': f'data_{row["id"]}',
+                        'timestamp': row['created_at'],
+                        'size': row['size']
+                    }
+                    for row in versions
+                ]
+            }, 200, etag_headers(etag)
         
         except Exception as e:
             return {'error': str(e)}, 500
@@ -1073,35 +3156,77 @@ class GetVersions(Resource):
 @app.route('/api/data/<pass_id>/versions')
 def get_versions_legacy(pass_id):
     """获取历史版本（兼容旧接口）"""
-    try:
-        domain = request.args.get('domain')
-        if not domain:
-            return jsonify({'error': 'Missing domain parameter'}), 400
+    return GetVersions().get(pass_id)
+
+@ns_data.route('/<string:pass_id>/restore')
+class RestoreData(Resource):
+    @ns_data.doc('restore_data')
+    @ns_data.param('domain', '域名', required=True)
+    @ns_data.param('version_id', '要恢复的版本ID', required=True)
+    @ns_data.response(201, '版本恢复成功')
+    @ns_data.response(400, '请求参数错误')
+    @ns_data.response(404, 'Pass ID 或版本不存在')
+    @ns_data.response(500, '服务器内部错误')
+    def post(self, pass_id):
+        """把历史版本恢复为最新版本（在服务器端复制，无需重新上传）"""
+        try:
+            domain = request.args.get('domain')
+            version_id = request.args.get('version_id')
+            if not domain or not version_id:
+                return {'error': 'Missing domain or version_id parameter'}, 400
+            
+            entry_id = parse_version_id(version_id)
+            if entry_id is None or not membership.might_have_domain(pass_id, domain):
+                return {'error': 'Version not found'}, 404
             
-        limit = request.args.get('limit', 5, type=int)
-        limit = min(limit, MAX_VERSIONS)  # 限制最大返回数量
+            with get_db() as conn:
+                entry = restore_data_entry(conn, pass_id, domain, entry_id)
+                if entry is None:
+                    return {'error': 'Version not found'}, 404
+                
+                return {
+                    'success': True,
+                    'id': f'data_{entry["id"]}',
+                    'restored_from': f'data_{entry_id}',
+                    'size': entry['size'],
+                    'timestamp': datetime.utcnow().isoformat() + 'Z'
+                }, 201
         
-        with get_db() as conn:
-            versions = conn.execute('''
-                SELECT id, created_at, size FROM data_entries
-                WHERE pass_id = ? AND domain = ?
-                ORDER BY created_at DESC
-                LIMIT ?
-            ''', (pass_id, domain, limit)).fetchall()
+        except Exception as e:
+            return {'error': str(e)}, 500
+
+@ns_data.route('/<string:pass_id>/versions/<string:version_id>')
+class GetVersion(Resource):
+    @ns_data.doc('get_version')
+    @ns_data.response(200, '版本数据获取成功', data_model)
+    @ns_data.response(304, '版本未变化（If-None-Match 命中）')
+    @ns_data.response(404, '版本未找到')
+    @ns_data.response(500, '服务器内部错误')
+    def get(self, pass_id, version_id):
+        """获取指定历史版本的数据（内容不变，可永久缓存）"""
+        try:
+            entry_id = parse_version_id(version_id)
+            if entry_id is None or not membership.might_have_pass(pass_id):
+                return {'error': 'Version not found'}, 404
             
-            return jsonify({
-                'versions': [
-                    {
-                        'id': f'data_{row["id"]}',
-                        'timestamp': row['created_at'],
-                        'size': row['size']
-                    }
-                    for row in versions
-                ]
-            })
-    
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+            # 先按主键确认版本存在且属于该Pass（不读取数据），再响应条件请求
+            meta = load_version_meta(pass_id, entry_id)
+            if not meta:
+                return {'error': 'Version not found'}, 404
+            
+            # 版本ID对应的内容永不变化，ETag匹配即可返回304
+            etag = entry_etag(entry_id)
+            if is_not_modified(etag):
+                return not_modified_response(etag, IMMUTABLE_CACHE_CONTROL)
+            
+            entry = load_entry_data(meta, BLOB_STREAM_THRESHOLD)
+            if not entry:
+                return {'error': 'Version not found'}, 404
+            
+            return entry_json_response(entry['domain'], entry, immutable_headers(etag))
+        
+        except Exception as e:
+            return {'error': str(e)}, 500
 
 @ns_data.route('/<string:pass_id>')
 class DeleteData(Resource):
@@ -1119,24 +3244,11 @@ class DeleteData(Resource):
             version_id = request.args.get('version_id')
             
             with get_db() as conn:
-                if version_id:
-                    # 删除特定版本
-                    result = conn.execute('''
-                        DELETE FROM data_entries 
-                        WHERE pass_id = ? AND domain = ? AND id = ?
-                    ''', (pass_id, domain, version_id.replace('data_', '')))
-                else:
-                    # 删除所有版本
-                    result = conn.execute('''
-                        DELETE FROM data_entries 
-                        WHERE pass_id = ? AND domain = ?
-                    ''', (pass_id, domain))
-                
-                conn.commit()
+                deleted_count = delete_data_entries(conn, pass_id, domain, version_id)
                 
                 return {
                     'success': True,
-                    'deleted_count': result.rowcount
+                    'deleted_count': deleted_count
                 }
         
         except Exception as e:
@@ -1146,36 +3258,7 @@ class DeleteData(Resource):
 @app.route('/api/data/<pass_id>', methods=['DELETE'])
 def delete_data_legacy(pass_id):
     """删除数据（兼容旧接口）"""
-    try:
-        domain = request.args.get('domain')
-        if not domain:
-            return jsonify({'error': 'Missing domain parameter'}), 400
-            
-        version_id = request.args.get('version_id')
-        
-        with get_db() as conn:
-            if version_id:
-                # 删除特定版本
-                result = conn.execute('''
-                    DELETE FROM data_entries 
-                    WHERE pass_id = ? AND domain = ? AND id = ?
-                ''', (pass_id, domain, version_id.replace('data_', '')))
-            else:
-                # 删除所有版本
-                result = conn.execute('''
-                    DELETE FROM data_entries 
-                    WHERE pass_id = ? AND domain = ?
-                ''', (pass_id, domain))
-            
-            conn.commit()
-            
-            return jsonify({
-                'success': True,
-                'deleted_count': result.rowcount
-            })
-    
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    return DeleteData().delete(pass_id)
 
 # 快速同步相关的命名空间
 ns_quick = api.namespace('quick', description='快速同步操作')
@@ -1186,6 +3269,10 @@ class QuickAccess(Resource):
     @ns_quick.param('domain', '域名', required=True)
     @ns_quick.param('format', '返回格式 (json/html)', default='json')
     @ns_quick.param('key', '解密密钥（可选）')
+    @ns_quick.param('compact', 'HTML格式未解密时使用精简页面（1/true），密文只嵌入一次', default='false')
+    @ns_quick.param('fields', 'JSON格式只返回解密结果的这些顶层字段（逗号分隔）')
+    @ns_quick.param('cookie', 'JSON格式只返回指定名称的cookie（可重复）')
+    @ns_quick.param('storage_key', 'JSON格式只返回指定的localStorage键（可重复）')
     @ns_quick.response(200, '成功获取数据')
     @ns_quick.response(400, '请求参数错误')
     @ns_quick.response(404, '未找到数据')
@@ -1196,81 +3283,127 @@ class QuickAccess(Resource):
             domain = request.args.get('domain')
             if not domain:
                 return jsonify({'error': 'Missing domain parameter'}), 400
+            
+            if not membership.might_have_domain(pass_id, domain):
+                if request.args.get('format', 'json') == 'html':
+                    return Response('<h1>No data found</h1>', status=404, mimetype='text/html')
+                return jsonify({'error': 'No data found'}), 404
                 
             format_type = request.args.get('format', 'json')
             decrypt_key = request.args.get('key', '')
+            compact = format_type == 'html' and request.args.get('compact', '').lower() in ('1', 'true')
+            projection = parse_projection(request.args) if format_type == 'json' else None
             
-            with get_db() as conn:
-                data_entry = conn.execute('''
-                    SELECT data, created_at FROM data_entries
-                    WHERE pass_id = ? AND domain = ?
-                    ORDER BY created_at DESC
-                    LIMIT 1
-                ''', (pass_id, domain)).fetchone()
-                
+            epoch = latest_cache.epoch
+            meta = load_latest_meta(pass_id, domain)
+            if not meta:
+                if format_type == 'html':
+                    return Response('<h1>No data found</h1>', status=404, mimetype='text/html')
+                return jsonify({'error': 'No data found'}), 404
+            
+            # 同一URL对同一版本的输出不变；先用元数据判断条件请求，304不读取数据
+            etag = entry_etag(meta['id'], f'_quick_{format_type}' + ('_compact' if compact else ''))
+            if is_not_modified(etag):
+                return not_modified_response(etag)
+            
+            # 同一版本、同一密钥（和同一投影）的响应直接复用
+            cache_key = None
+            if decrypt_key:
+                cache_key = quick_cache.make_key(meta['id'], decrypt_key,
+                                                 ('json', projection) if format_type == 'json' else 'html')
+                cached = quick_cache.get(cache_key)
+                if cached is not None:
+                    body, mimetype = cached
+                    response = Response(body, status=200, mimetype=mimetype)
+                    response.headers.update(etag_headers(etag))
+                    return response
+            
+            timestamp = meta['created_at']
+            encrypted_data = None
+            
+            # 如果提供了解密密钥，在服务端解密（二进制密文直接解密，无需先编码为Base64）
+            # 解密后的对象同样缓存，不同投影的请求无需重复解密；日志中不输出密钥和数据内容
+            decrypted_data = None
+            if decrypt_key:
+                object_key = quick_cache.make_key(meta['id'], decrypt_key, 'object')
+                decrypted_data = quick_cache.get(object_key)
+            
+            if decrypted_data is None:
+                # 缓存都未命中时才读取数据
+                data_entry = load_latest_entry(pass_id, domain, meta=meta, epoch=epoch)
                 if not data_entry:
                     if format_type == 'html':
                         return Response('<h1>No data found</h1>', status=404, mimetype='text/html')
                     return jsonify({'error': 'No data found'}), 404
-                
-                encrypted_data = data_entry['data']
-                timestamp = data_entry['created_at']
-                
-                # 如果提供了解密密钥，在服务端解密
-                decrypted_data = None
+                payload = stored_payload(data_entry)
+                encrypted_data = payload_as_text(payload)
                 if decrypt_key:
                     try:
-                        decrypted_data = server_decrypt(encrypted_data, decrypt_key)
-                        print(f"解密成功，数据类型: {type(decrypted_data)}")
+                        decrypted_data = server_decrypt(payload, decrypt_key)
                         
                         # 确保解密后的数据是字典类型
                         if isinstance(decrypted_data, str):
-                            print(f"解密结果是字符串，尝试解析JSON: {decrypted_data[:100]}...")
                             decrypted_data = json.loads(decrypted_data)
                         elif not isinstance(decrypted_data, dict):
                             print(f"解密结果不是字典类型: {type(decrypted_data)}")
                             decrypted_data = None
                             
                     except Exception as e:
-                        print(f"服务端解密失败: {e}")
-                        print(f"加密数据预览: {encrypted_data[:100]}...")
-                        print(f"解密密钥: {decrypt_key}")
+                        print(f"服务端解密失败: {type(e).__name__}")
                         decrypted_data = None
                 
-                # 根据格式返回不同响应
-                if format_type == 'json':
-                    if decrypted_data:
-                        # 返回解密后的JSON数据
-                        return jsonify({
-                            'success': True,
-                            'domain': domain,
-                            'pass_id': pass_id,
-                            'timestamp': timestamp,
-                            'decrypted': True,
-                            'data': decrypted_data
-                        })
-                    else:
-                        # 返回加密数据
-                        return jsonify({
-                            'success': True,
-                            'domain': domain,
-                            'pass_id': pass_id,
-                            'timestamp': timestamp,
-                            'decrypted': False,
-                            'encrypted_data': encrypted_data,
-                            'message': 'No decryption key provided or decryption failed'
-                        })
+                if decrypted_data:
+                    # Python对象占用的内存按密文大小的若干倍估算
+                    quick_cache.put(object_key, pass_id, domain, decrypted_data,
+                                    len(payload) * DECRYPTED_OBJECT_SIZE_FACTOR)
+            
+            # 根据格式返回不同响应
+            if format_type == 'json':
+                if decrypted_data:
+                    # 返回解密后的JSON数据（指定了投影时只返回所选字段）
+                    response = jsonify({
+                        'success': True,
+                        'domain': domain,
+                        'pass_id': pass_id,
+                        'timestamp': timestamp,
+                        'decrypted': True,
+                        'data': project_decrypted(decrypted_data, projection) if projection else decrypted_data
+                    })
                 else:
-                    # HTML格式 - 如果有解密数据，直接显示；否则显示加密数据和客户端解密界面
-                    if decrypted_data:
-                        html_content = render_decrypted_html(domain, pass_id, timestamp, decrypted_data)
-                        # 使用Flask-RESTX兼容的方式返回HTML
-                        return Response(html_content, status=200, mimetype='text/html')
-                    else:
-                        html_content = render_encrypted_html(domain, pass_id, timestamp, encrypted_data, decrypt_key)
-                        # 使用Flask-RESTX兼容的方式返回HTML
-                        return Response(html_content, status=200, mimetype='text/html')
-        
+                    # 返回加密数据
+                    response = jsonify({
+                        'success': True,
+                        'domain': domain,
+                        'pass_id': pass_id,
+                        'timestamp': timestamp,
+                        'decrypted': False,
+                        'encrypted_data': encrypted_data,
+                        'message': 'No decryption key provided or decryption failed'
+                    })
+            else:
+                # HTML格式 - 如果有解密数据，直接显示；否则显示加密数据和客户端解密界面
+                if decrypted_data and meta['size'] > QUICK_STREAM_THRESHOLD:
+                    # 大数据边渲染边输出，输出完成后再写入缓存
+                    chunks = stream_decrypted_html(domain, pass_id, timestamp, decrypted_data)
+                    response = Response(quick_cache.collect(cache_key, pass_id, domain, chunks, 'text/html'),
+                                        status=200, mimetype='text/html')
+                elif decrypted_data:
+                    html_content = render_decrypted_html(domain, pass_id, timestamp, decrypted_data)
+                    # 使用Flask-RESTX兼容的方式返回HTML
+                    response = Response(html_content, status=200, mimetype='text/html')
+                else:
+                    html_content = render_encrypted_html(domain, pass_id, timestamp, encrypted_data, decrypt_key, compact)
+                    # 使用Flask-RESTX兼容的方式返回HTML
+                    response = Response(html_content, status=200, mimetype='text/html')
+            
+            # 只缓存解密成功的结果；失败页面中带有原始密钥，不缓存
+            if decrypted_data and not response.is_streamed:
+                body = response.get_data()
+                quick_cache.put(cache_key, pass_id, domain, (body, response.mimetype), len(body))
+            
+            response.headers.update(etag_headers(etag))
+            return response
+    
         except Exception as e:
             if format_type == 'html':
                 return Response(f'<h1>Error: {str(e)}</h1>', status=500, mimetype='text/html')
@@ -1301,6 +3434,9 @@ class GetPassStats(Resource):
     def get(self, pass_id):
         """获取Pass统计信息"""
         try:
+            if not membership.might_have_pass(pass_id):
+                return jsonify({'error': 'Pass not found'}), 404
+            
             with get_db() as conn:
                 # 检查Pass是否存在
                 pass_info = conn.execute(
@@ -1380,7 +3516,12 @@ class GetServerStats(Resource):
                     'total_size_bytes': stats['total_size'] or 0,
                     'total_size_mb': round((stats['total_size'] or 0) / 1024 / 1024, 2),
                     'max_data_size_mb': round(MAX_DATA_SIZE / 1024 / 1024, 2),
-                    'max_versions_per_domain': MAX_VERSIONS
+                    'max_versions_per_domain': MAX_VERSIONS,
+                    'membership_filter': membership.stats(),
+                    'change_events': change_hub.stats(),
+                    'latest_cache': latest_cache.stats(),
+                    'quick_cache': quick_cache.stats(),
+                    'coherence': coherence.stats()
                 })
         
         except Exception as e:
@@ -1844,6 +3985,11 @@ class DeletePassAdmin(Resource):
                 if not pass_exists:
                     return jsonify({'error': 'Pass not found'}), 404
                 
+                domains = [row['domain'] for row in conn.execute(
+                    'SELECT DISTINCT domain FROM data_entries WHERE pass_id = ?',
+                    (pass_id,)
+                )]
+                
                 # 删除所有相关数据
                 data_result = conn.execute(
                     'DELETE FROM data_entries WHERE pass_id = ?',
@@ -1856,7 +4002,13 @@ class DeletePassAdmin(Resource):
                     (pass_id,)
                 )
                 
-                conn.commit()
+                # 为每个域名记录删除，订阅者和变更列表都能感知
+                def invalidate_domains():
+                    for domain in domains:
+                        latest_cache.invalidate(pass_id, domain)
+                
+                events = [record_change(conn, pass_id, domain, 'delete') for domain in domains]
+                change_hub.commit(conn, pass_id, events, invalidate_domains)
                 
                 return jsonify({
                     'success': True,
@@ -1874,6 +4026,87 @@ def delete_pass_admin_legacy(pass_id):
     """删除Pass及其所有数据（管理后台用）（向后兼容）"""
     return DeletePassAdmin().delete(pass_id)
 
+@ns_admin.route('/passes/bulk')
+class BulkCreatePasses(Resource):
+    @ns_admin.doc('bulk_create_passes')
+    @ns_admin.response(201, '批量创建成功')
+    @ns_admin.response(400, '请求参数错误')
+    @ns_admin.response(401, '未授权访问')
+    @ns_admin.response(500, '服务器内部错误')
+    @require_admin_auth()
+    def post(self):
+        """在一个事务中批量创建Pass（管理后台用）"""
+        try:
+            data = request.get_json(silent=True) or {}
+            count = data.get('count')
+            if not isinstance(count, int) or isinstance(count, bool) or not 1 <= count <= MAX_BULK_PASSES:
+                return {'error': f'count must be an integer between 1 and {MAX_BULK_PASSES}'}, 400
+            
+            with get_db() as conn:
+                for _ in range(3):
+                    created = generate_passes(count)
+                    try:
+                        conn.executemany(
+                            'INSERT INTO passes (pass_id) VALUES (?)',
+                            ((pass_id,) for pass_id in created)
+                        )
+                        conn.commit()
+                        break
+                    except sqlite3.IntegrityError:
+                        # 与已有Pass重复（概率可忽略），整批重新生成
+                        conn.rollback()
+                else:
+                    return {'error': 'Failed to generate unique pass IDs'}, 500
+            membership.add_passes(created)
+            
+            return {
+                'success': True,
+                'count': len(created),
+                'pass_ids': created,
+                'created_at': datetime.utcnow().isoformat() + 'Z'
+            }, 201
+        
+        except Exception as e:
+            return {'error': str(e)}, 500
+
+@ns_admin.route('/passes/validate')
+class BulkValidatePasses(Resource):
+    @ns_admin.doc('bulk_validate_passes')
+    @ns_admin.response(200, '校验完成')
+    @ns_admin.response(400, '请求参数错误')
+    @ns_admin.response(401, '未授权访问')
+    @ns_admin.response(500, '服务器内部错误')
+    @require_admin_auth()
+    def post(self):
+        """用一次查询批量校验Pass是否存在（管理后台用）"""
+        try:
+            data = request.get_json(silent=True) or {}
+            pass_ids = data.get('pass_ids')
+            if not isinstance(pass_ids, list) or not all(isinstance(p, str) for p in pass_ids):
+                return {'error': 'pass_ids must be a list of strings'}, 400
+            if len(pass_ids) > MAX_BULK_PASSES:
+                return {'error': f'At most {MAX_BULK_PASSES} pass IDs per request'}, 400
+            
+            # 过滤器可确定不存在的ID无需进入查询
+            candidates = [pass_id for pass_id in pass_ids if membership.might_have_pass(pass_id)]
+            
+            existing = set()
+            if candidates:
+                with get_db() as conn:
+                    rows = conn.execute(
+                        'SELECT pass_id FROM passes WHERE pass_id IN (SELECT value FROM json_each(?))',
+                        (json.dumps(candidates),)
+                    ).fetchall()
+                existing = {row['pass_id'] for row in rows}
+            
+            return {
+                'existing': [pass_id for pass_id in pass_ids if pass_id in existing],
+                'missing': [pass_id for pass_id in pass_ids if pass_id not in existing]
+            }
+        
+        except Exception as e:
+            return {'error': str(e)}, 500
+
 # ==================== 错误处理 ====================
 
 @app.errorhandler(404)
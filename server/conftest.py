@@ -66,6 +66,32 @@ def clean_database(test_database):
     
     yield test_database
 
+@pytest.fixture
+def api_client(monkeypatch):
+    """使用独立临时数据库的测试客户端"""
+    import app as app_module
+    
+    db_fd, db_path = tempfile.mkstemp()
+    monkeypatch.setattr(app_module, 'DATABASE_PATH', db_path)
+    app.config['TESTING'] = True
+    init_database()
+    
+    with app.test_client() as client:
+        yield client
+    
+    os.close(db_fd)
+    # 关闭一致性检查的常驻连接；WAL模式会在数据库旁生成 -wal / -shm 文件
+    app_module.coherence.reset()
+    for path in (db_path, db_path + '-wal', db_path + '-shm'):
+        if os.path.exists(path):
+            os.unlink(path)
+
+@pytest.fixture
+def api_pass(api_client):
+    """在独立数据库中创建的Pass ID"""
+    response = api_client.post('/api/pass/create', json={})
+    return response.get_json()['pass_id']
+
 def pytest_configure(config):
     """pytest配置"""
     # 设置测试环境变量
@@ -20,6 +20,10 @@ def setup_environment():
     os.environ.setdefault('DATABASE_PATH', str(data_dir / 'database.db'))
     os.environ.setdefault('MAX_DATA_SIZE', '1048576')  # 1MB
     os.environ.setdefault('MAX_VERSIONS', '10')
+    os.environ.setdefault('LATEST_CACHE_SIZE', '67108864')  # 64MB
+    os.environ.setdefault('QUICK_CACHE_SIZE', '16777216')  # 16MB，快捷访问解密结果缓存
+    os.environ.setdefault('QUICK_CACHE_TTL', '300')
+    os.environ.setdefault('MAX_UPLOAD_SIZE', '16777216')  # 16MB，分块上传上限
     
     print(f"📊 数据库路径: {os.environ['DATABASE_PATH']}")
     print(f"💾 最大数据大小: {int(os.environ['MAX_DATA_SIZE']) / 1024 / 1024:.1f}MB")
@@ -69,8 +73,13 @@ def start_development_server(port=5000, debug=True):
         print(f"❌ 服务器启动失败: {e}")
         sys.exit(1)
 
-def start_production_server(port=5000, workers=4):
-    """启动生产服务器"""
+def start_production_server(port=5000, workers=4, threads=32, timeout=60):
+    """启动生产服务器
+    
+    SSE事件流（/api/pass/<pass_id>/events）是长连接，同步worker每个进程只能服务一个连接，
+    且超过timeout就会被杀掉。这里使用gthread worker：每个连接占用一个线程，timeout只检测
+    worker进程的心跳，不限制单个请求的时长。同时保持的事件流最多约 workers * threads 个。
+    """
     print("📦 检查Gunicorn...")
     try:
         subprocess.run([sys.executable, '-m', 'pip', 'install', 'gunicorn'], 
@@ -81,13 +90,16 @@ def start_production_server(port=5000, workers=4):
     
     os.environ['FLASK_ENV'] = 'production'
     
-    print(f"🚀 启动生产服务器 (端口: {port}, 工作进程: {workers})")
+    print(f"🚀 启动生产服务器 (端口: {port}, 工作进程: {workers}, 每进程线程: {threads})")
     print(f"🌐 访问地址: http://localhost:{port}")
     print("-" * 50)
     
     cmd = [
         'gunicorn',
         '-w', str(workers),
+        '-k', 'gthread',
+        '--threads', str(threads),
+        '--timeout', str(timeout),
         '-b', f'0.0.0.0:{port}',
         '--access-logfile', '-',
         '--error-logfile', '-',
@@ -107,6 +119,8 @@ def main():
     parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)), help='服务器端口 (默认: 5000)')
     parser.add_argument('--production', action='store_true', help='生产模式 (使用Gunicorn)')
     parser.add_argument('--workers', type=int, default=4, help='Gunicorn工作进程数 (默认: 4)')
+    parser.add_argument('--threads', type=int, default=32, help='每个工作进程的线程数，即可同时保持的长连接数 (默认: 32)')
+    parser.add_argument('--timeout', type=int, default=60, help='Gunicorn worker心跳超时秒数 (默认: 60)')
     parser.add_argument('--no-debug', action='store_true', help='禁用调试模式')
     parser.add_argument('--skip-install', action='store_true', help='跳过依赖安装')
     parser.add_argument('--skip-tests', action='store_true', help='跳过测试')
@@ -129,7 +143,7 @@ def main():
     
     # 启动服务器
     if args.production:
-        start_production_server(args.port, args.workers)
+        start_production_server(args.port, args.workers, args.threads, args.timeout)
     else:
         start_development_server(args.port, not args.no_debug)
 
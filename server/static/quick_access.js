@@ -0,0 +1,133 @@
+// 快捷访问加密页面的前端解密脚本（与客户端加密保持一致：JSON -> XOR -> UTF-8 -> Base64）
+// 密文只在页面的 #encrypted-data 中出现一次，密钥（如有）在 #decrypted-data 的 data-key 属性中
+(function () {
+    function safeBase64Decode(str) {
+        try {
+            return decodeURIComponent(escape(atob(str)));
+        } catch (error) {
+            console.error('Base64解码失败:', error);
+            return str;
+        }
+    }
+
+    function xorDecrypt(encryptedText, key) {
+        const chars = new Array(encryptedText.length);
+        for (let i = 0; i < encryptedText.length; i++) {
+            chars[i] = String.fromCharCode(encryptedText.charCodeAt(i) ^ key.charCodeAt(i % key.length));
+        }
+        return chars.join('');
+    }
+
+    function decrypt(encryptedData, key) {
+        try {
+            const encrypted = safeBase64Decode(encryptedData);
+            const jsonStr = xorDecrypt(encrypted, key);
+            return JSON.parse(jsonStr);
+        } catch (error) {
+            console.error('解密失败:', error);
+            return null;
+        }
+    }
+
+    function escapeHtml(text) {
+        const div = document.createElement('div');
+        div.textContent = text;
+        return div.innerHTML;
+    }
+
+    function encryptedData() {
+        return document.getElementById('encrypted-data').value;
+    }
+
+    function renderItems(title, items, truncate) {
+        const entries = Object.entries(items || {});
+        if (entries.length === 0) {
+            return '';
+        }
+        let html = '<h4>' + title + ' (' + entries.length + ' items):</h4>';
+        html += '<div style="background: white; padding: 10px; border-radius: 3px; margin: 5px 0; max-height: 200px; overflow-y: auto;">';
+        for (const [name, value] of entries) {
+            const displayValue = truncate && value.length > 100 ? value.substring(0, 100) + '... (' + value.length + ' chars)' : value;
+            html += '<div class="item"><span class="key">' + escapeHtml(name) + ':</span> <span class="value">' + escapeHtml(displayValue) + '</span></div>';
+        }
+        return html + '</div>';
+    }
+
+    function renderDecrypted(decrypted) {
+        let html = '<div style="background: #e8f5e8; padding: 15px; border-radius: 5px; border: 1px solid #28a745;">';
+        html += '<h4 style="color: #28a745; margin-top: 0;">✅ 解密成功!</h4>';
+        html += renderItems('🍪 Cookies', decrypted.cookies, false);
+        html += renderItems('💾 LocalStorage', decrypted.localStorage, true);
+        if (decrypted.timestamp) {
+            html += '<div style="color: #666; font-size: 12px; margin-top: 10px;">📅 Data Timestamp: ' + new Date(decrypted.timestamp).toLocaleString() + '</div>';
+        }
+        html += '</div>';
+        html += '<details style="margin-top: 15px;"><summary>📄 Raw JSON Data</summary>';
+        html += '<pre style="background: #f5f5f5; padding: 10px; border-radius: 3px; overflow-x: auto; max-height: 300px; overflow-y: auto;">' +
+                escapeHtml(JSON.stringify(decrypted, null, 2)) + '</pre></details>';
+        return html;
+    }
+
+    function showResult(targetId, key) {
+        const target = document.getElementById(targetId);
+        try {
+            const decrypted = decrypt(encryptedData(), key);
+            target.innerHTML = decrypted ? renderDecrypted(decrypted) :
+                '<div style="background: #f8d7da; padding: 15px; border-radius: 5px; border: 1px solid #f5c6cb;"><p style="color: #721c24; margin: 0;">❌ 解密失败: 密钥错误或数据损坏</p></div>';
+        } catch (e) {
+            target.innerHTML = '<p style="color: red;">❌ Decryption error: ' + escapeHtml(e.message) + '</p>';
+        }
+    }
+
+    window.decryptWithKey = function () {
+        const key = document.getElementById('decrypt-key-input').value;
+        if (!key) {
+            alert('请输入解密密钥');
+            return;
+        }
+        showResult('manual-decrypted-data', key);
+    };
+
+    window.copyDecryptionScript = function () {
+        const script = '// 解密脚本 - 可在其他地方使用\n' +
+            safeBase64Decode.toString() + '\n\n' +
+            xorDecrypt.toString() + '\n\n' +
+            decrypt.toString() + '\n\n' +
+            '// 使用示例:\n' +
+            'const encryptedData = ' + JSON.stringify(encryptedData()) + ';\n' +
+            "const key = 'YOUR_ENCRYPTION_KEY'; // 替换为你的密钥\n" +
+            'const decrypted = decrypt(encryptedData, key);\n' +
+            "console.log(decrypted ? decrypted : '解密失败');";
+
+        if (navigator.clipboard && window.isSecureContext) {
+            navigator.clipboard.writeText(script).then(function () {
+                alert('解密脚本已复制到剪贴板！');
+            }, function () {
+                alert('复制失败，请手动复制以下内容:\n\n' + script);
+            });
+            return;
+        }
+
+        // 非安全上下文时退回到临时文本区域复制
+        const textarea = document.createElement('textarea');
+        textarea.value = script;
+        textarea.style.position = 'fixed';
+        textarea.style.opacity = '0';
+        document.body.appendChild(textarea);
+        textarea.select();
+        try {
+            document.execCommand('copy');
+            alert('解密脚本已复制到剪贴板！');
+        } catch (err) {
+            alert('复制失败，请手动复制以下内容:\n\n' + script);
+        } finally {
+            document.body.removeChild(textarea);
+        }
+    };
+
+    // 如果有密钥，自动解密
+    const autoTarget = document.getElementById('decrypted-data');
+    if (autoTarget && autoTarget.dataset.key) {
+        showResult('decrypted-data', autoTarget.dataset.key);
+    }
+})();
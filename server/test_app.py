@@ -6,11 +6,15 @@ Cookie Manager 服务器测试用例
 
 import pytest
 import json
+import base64
+import gzip
+import hashlib
+import struct
 import os
 import tempfile
 import sqlite3
 from unittest.mock import patch
-from app import app, init_database, generate_pass, cleanup_old_versions
+from app import app, init_database, generate_pass, generate_passes, cleanup_old_versions, BloomFilter, ChangeHub, LatestEntryCache
 
 class TestCookieManagerServer:
     """Cookie Manager服务器测试类"""
@@ -451,6 +455,2101 @@ class TestCookieManagerServer:
         assert response.status_code == 200
 
 
+# ==================== 二进制传输测试 ====================
+
+class TestRawTransfer:
+    """原始二进制上传/下载测试类"""
+
+    def test_raw_roundtrip(self, api_client, api_pass):
+        """测试原始字节上传后原样下载"""
+        payload = bytes(range(256)) * 4
+        response = api_client.post(f'/api/data/{api_pass}/raw?domain=example.com',
+                                   data=payload,
+                                   content_type='application/octet-stream')
+        assert response.status_code == 201
+        # size 与JSON接口一致，为Base64文本长度
+        assert response.get_json()['size'] == len(base64.b64encode(payload))
+
+        response = api_client.get(f'/api/data/{api_pass}/raw?domain=example.com')
+        assert response.status_code == 200
+        assert response.mimetype == 'application/octet-stream'
+        assert response.data == payload
+        assert response.headers['X-Entry-Id'].startswith('data_')
+
+    def test_raw_upload_readable_as_json(self, api_client, api_pass):
+        """测试二进制上传的数据可通过JSON接口以Base64读取"""
+        payload = b'\x00\x01binary\xff'
+        api_client.post(f'/api/data/{api_pass}/raw?domain=example.com',
+                        data=payload,
+                        content_type='application/octet-stream')
+
+        response = api_client.get(f'/api/data/{api_pass}?domain=example.com')
+        assert response.status_code == 200
+        assert base64.b64decode(response.get_json()['data']) == payload
+
+    def test_json_upload_readable_as_raw(self, api_client, api_pass):
+        """测试JSON上传的Base64数据可通过二进制接口读取"""
+        encoded = base64.b64encode(b'{"test": "value"}').decode('ascii')
+        api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': encoded})
+
+        response = api_client.get(f'/api/data/{api_pass}/raw?domain=example.com')
+        assert response.status_code == 200
+        assert response.data == b'{"test": "value"}'
+
+    def test_raw_get_non_base64_entry(self, api_client, api_pass):
+        """测试非Base64文本无法以二进制返回"""
+        api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': 'not base64!'})
+
+        response = api_client.get(f'/api/data/{api_pass}/raw?domain=example.com')
+        assert response.status_code == 406
+
+        response = api_client.get(f'/api/data/{api_pass}?domain=example.com')
+        assert response.get_json()['data'] == 'not base64!'
+
+    def test_raw_upload_wrong_content_type(self, api_client, api_pass):
+        """测试二进制接口拒绝非octet-stream请求"""
+        response = api_client.post(f'/api/data/{api_pass}/raw?domain=example.com',
+                                   json={'data': 'abc'})
+        assert response.status_code == 415
+
+    def test_raw_upload_too_large(self, api_client, api_pass):
+        """测试二进制接口的大小限制"""
+        response = api_client.post(f'/api/data/{api_pass}/raw?domain=example.com',
+                                   data=b'x' * (1024 * 1024 + 1),
+                                   content_type='application/octet-stream')
+        assert response.status_code == 400
+        assert 'Data too large' in response.get_json()['error']
+
+    def test_size_limit_shared_with_json(self, api_client, api_pass):
+        """测试两个接口按同一口径（Base64长度）限制大小"""
+        with patch('app.MAX_DATA_SIZE', 400), patch('app.MAX_PAYLOAD_BYTES', 300):
+            raw = os.urandom(300)
+            response = api_client.post(f'/api/data/{api_pass}/raw?domain=example.com', data=raw,
+                                       content_type='application/octet-stream')
+            assert response.status_code == 201
+            assert response.get_json()['size'] == 400
+            response = api_client.post(f'/api/data/{api_pass}?domain=example.com',
+                                       json={'data': base64.b64encode(raw).decode('ascii')})
+            assert response.status_code == 201
+
+            raw = os.urandom(301)
+            response = api_client.post(f'/api/data/{api_pass}/raw?domain=example.com', data=raw,
+                                       content_type='application/octet-stream')
+            assert response.status_code == 400
+            response = api_client.post(f'/api/data/{api_pass}?domain=example.com',
+                                       json={'data': base64.b64encode(raw).decode('ascii')})
+            assert response.status_code == 400
+
+
+# ==================== 成员过滤器测试 ====================
+
+class TestMembershipFilter:
+    """布隆过滤器成员索引测试类"""
+
+    def test_bloom_filter_no_false_negatives(self):
+        """测试布隆过滤器不漏报且误报率接近目标"""
+        bloom = BloomFilter(10000, 0.01)
+        keys = [f'pass_{i}' for i in range(10000)]
+        for key in keys:
+            bloom.add(key)
+
+        assert all(key in bloom for key in keys)
+        false_positives = sum(f'other_{i}' in bloom for i in range(10000))
+        assert false_positives < 300
+        assert bloom.stats()['memory_bytes'] < 20000
+
+    def test_unknown_pass_rejected_without_database(self, api_client, api_pass):
+        """测试不存在的Pass不访问数据库直接拒绝"""
+        # 第一次未命中会同步其他连接的写入
+        api_client.post('/api/data/unknown_pass?domain=example.com', json={'data': 'abc'})
+
+        with patch('app.get_db') as mock_db:
+            response = api_client.post('/api/data/unknown_pass?domain=example.com', json={'data': 'abc'})
+            assert response.status_code == 404
+            response = api_client.get(f'/api/data/{api_pass}?domain=missing.com')
+            assert response.status_code == 404
+            mock_db.assert_not_called()
+
+    def test_saved_domain_is_member(self, api_client, api_pass):
+        """测试保存后的域名可正常读取"""
+        api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': 'abc'})
+
+        response = api_client.get(f'/api/quick/{api_pass}?domain=example.com')
+        assert response.status_code == 200
+
+    def test_external_writes_are_visible(self, api_client):
+        """测试其他进程写入的Pass不会被误判为不存在"""
+        import app as app_module
+        with sqlite3.connect(app_module.DATABASE_PATH) as conn:
+            conn.execute("INSERT INTO passes (pass_id) VALUES ('external_pass')")
+            conn.execute("INSERT INTO data_entries (pass_id, domain, data, size) VALUES ('external_pass', 'example.com', 'abc', 3)")
+            conn.commit()
+
+        response = api_client.post('/api/data/external_pass?domain=other.com', json={'data': 'abc'})
+        assert response.status_code == 201
+        response = api_client.get('/api/data/external_pass/versions?domain=example.com')
+        assert len(response.get_json()['versions']) == 1
+
+    def test_server_stats_report_filter(self, api_client, api_pass):
+        """测试服务器统计包含过滤器内存和误报率"""
+        response = api_client.get('/api/stats/server')
+        stats = response.get_json()['membership_filter']
+        assert stats['ready'] is True
+        assert stats['passes']['entries'] >= 1
+        assert 'memory_bytes' in stats['passes']
+        assert 'estimated_false_positive_rate' in stats['domains']
+
+    def test_expired_filter_rebuilds_once_in_background(self, api_client, api_pass):
+        """测试过滤器到期后并发查询只触发一次后台重建，重建期间仍使用旧过滤器"""
+        import threading
+        from app import membership
+
+        rebuilds = membership.stats()['rebuilds']
+        membership.built_at = 0
+        results = []
+
+        def lookup():
+            results.append(membership.might_have_pass(api_pass))
+            results.append(membership.might_have_pass('missing_pass'))
+
+        threads = [threading.Thread(target=lookup) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        membership.rebuild_thread.join(5)
+
+        assert membership.stats()['rebuilds'] == rebuilds + 1
+        assert results.count(True) == 16
+        assert membership.built_at > 0
+
+    def test_missing_filter_builds_once(self, api_client, api_pass):
+        """测试过滤器不可用时并发查询只有一个线程同步构建"""
+        import threading
+        from app import membership
+
+        rebuilds = membership.stats()['rebuilds']
+        membership.ready = False
+        results = []
+
+        threads = [threading.Thread(target=lambda: results.append(membership.might_have_pass(api_pass)))
+                   for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert membership.stats()['rebuilds'] == rebuilds + 1
+        assert results == [True] * 16
+
+
+# ==================== 批量Pass测试 ====================
+
+class TestBulkPasses:
+    """批量创建与校验Pass测试类"""
+
+    @pytest.fixture
+    def admin_client(self, api_client):
+        """已登录管理后台的测试客户端"""
+        api_client.post('/admin/login', json={'password': 'admin'})
+        return api_client
+
+    def test_generate_passes(self):
+        """测试批量生成的Pass长度、字符集和唯一性"""
+        import string
+        passes = generate_passes(1000)
+        valid_chars = set(string.ascii_letters + string.digits)
+
+        assert len(passes) == 1000
+        assert len(set(passes)) == 1000
+        assert all(len(p) == 50 for p in passes)
+        assert all(c in valid_chars for p in passes for c in p)
+
+    def test_bulk_create_and_validate(self, admin_client):
+        """测试批量创建后批量校验"""
+        response = admin_client.post('/api/admin/passes/bulk', json={'count': 200})
+        assert response.status_code == 201
+        created = response.get_json()['pass_ids']
+        assert len(created) == 200
+
+        response = admin_client.post('/api/admin/passes/validate',
+                                     json={'pass_ids': created[:3] + ['missing_pass']})
+        assert response.status_code == 200
+        result = response.get_json()
+        assert result['existing'] == created[:3]
+        assert result['missing'] == ['missing_pass']
+
+        # 批量创建的Pass可以直接保存数据
+        response = admin_client.post(f'/api/data/{created[-1]}?domain=example.com', json={'data': 'abc'})
+        assert response.status_code == 201
+
+    def test_bulk_create_invalid_count(self, admin_client):
+        """测试批量创建数量校验"""
+        for count in (0, -1, 'ten', 10 ** 9):
+            response = admin_client.post('/api/admin/passes/bulk', json={'count': count})
+            assert response.status_code == 400
+
+    def test_bulk_endpoints_require_auth(self, api_client):
+        """测试批量接口需要管理员认证"""
+        response = api_client.post('/api/admin/passes/bulk', json={'count': 1})
+        assert response.status_code == 401
+        response = api_client.post('/api/admin/passes/validate', json={'pass_ids': []})
+        assert response.status_code == 401
+
+
+# ==================== 条件请求测试 ====================
+
+class TestConditionalGet:
+    """ETag / If-None-Match 条件请求测试类"""
+
+    def test_get_data_not_modified(self, api_client, api_pass):
+        """测试最新数据未变化时返回304"""
+        api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': 'abc'})
+
+        response = api_client.get(f'/api/data/{api_pass}?domain=example.com')
+        etag = response.headers['ETag']
+        assert response.status_code == 200
+        assert response.get_json()['timestamp']
+
+        response = api_client.get(f'/api/data/{api_pass}?domain=example.com',
+                                  headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.data == b''
+
+        # 数据变化后ETag失效
+        api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': 'def'})
+        response = api_client.get(f'/api/data/{api_pass}?domain=example.com',
+                                  headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+        assert response.get_json()['data'] == 'def'
+
+    def test_versions_not_modified(self, api_client, api_pass):
+        """测试版本列表未变化时返回304"""
+        api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': 'abc'})
+        url = f'/api/data/{api_pass}/versions?domain=example.com'
+
+        etag = api_client.get(url).headers['ETag']
+        assert api_client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+        api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': 'def'})
+        assert api_client.get(url, headers={'If-None-Match': etag}).status_code == 200
+
+    def test_quick_access_not_modified(self, api_client, api_pass):
+        """测试快捷访问的ETag按格式区分"""
+        api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': 'abc'})
+
+        json_etag = api_client.get(f'/api/quick/{api_pass}?domain=example.com').headers['ETag']
+        html_etag = api_client.get(f'/api/quick/{api_pass}?domain=example.com&format=html').headers['ETag']
+        assert json_etag != html_etag
+
+        response = api_client.get(f'/api/quick/{api_pass}?domain=example.com&format=html',
+                                  headers={'If-None-Match': html_etag})
+        assert response.status_code == 304
+
+    def test_not_modified_skips_payload(self, api_client, api_pass):
+        """测试缓存未命中时304也只查询元数据，不读取data列"""
+        import app as app_module
+
+        api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': 'abc'})
+        urls = [f'/api/data/{api_pass}?domain=example.com',
+                f'/api/data/{api_pass}?domain=example.com&as_of=2999-01-01T00:00:00Z',
+                f'/api/quick/{api_pass}?domain=example.com',
+                f'/api/quick/{api_pass}?domain=example.com&format=html']
+        etags = [api_client.get(url).headers['ETag'] for url in urls]
+
+        statements = []
+        connect = sqlite3.connect
+        def traced_connect(*args, **kwargs):
+            conn = connect(*args, **kwargs)
+            conn.set_trace_callback(statements.append)
+            return conn
+
+        for url, etag in zip(urls, etags):
+            app_module.latest_cache.clear()
+            statements.clear()
+            with patch('app.sqlite3.connect', traced_connect):
+                assert api_client.get(url, headers={'If-None-Match': etag}).status_code == 304
+            assert statements
+            assert not any('SELECT data FROM' in sql for sql in statements)
+
+            # 200时才读取数据
+            statements.clear()
+            with patch('app.sqlite3.connect', traced_connect):
+                assert api_client.get(url).status_code == 200
+            assert any('SELECT data FROM' in sql for sql in statements)
+
+    def test_quick_access_errors(self, api_client, api_pass):
+        """测试快捷访问的错误状态码"""
+        assert api_client.get(f'/api/quick/{api_pass}').status_code == 400
+        assert api_client.get(f'/api/quick/{api_pass}?domain=missing.com').status_code == 404
+
+
+# ==================== 变更通知测试 ====================
+
+def read_sse(stream):
+    """读取下一条SSE消息，返回 (事件ID, 事件类型, 数据)"""
+    message = next(stream).decode('utf-8')
+    fields = dict(line.split(': ', 1) for line in message.strip().split('\n'))
+    return int(fields['id']), fields['event'], json.loads(fields['data'])
+
+class TestChangeEvents:
+    """SSE变更通知测试类"""
+
+    @pytest.fixture
+    def events(self, api_client, api_pass):
+        """打开事件流，返回已跳过retry前导的迭代器"""
+        response = api_client.get(f'/api/pass/{api_pass}/events', buffered=False)
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+
+        stream = iter(response.response)
+        assert next(stream) == b'retry: 3000\n\n'
+        yield stream
+        response.close()
+
+    def test_save_and_delete_push_events(self, api_client, api_pass, events):
+        """测试保存和删除提交后推送事件"""
+        response = api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': 'aGVsbG8='})
+        _, event_type, event = read_sse(events)
+        assert event_type == 'change'
+        assert event['action'] == 'save'
+        assert event['domain'] == 'example.com'
+        assert event['entry_id'] == response.get_json()['id']
+        assert event['size'] == len('aGVsbG8=')
+        assert event['timestamp']
+
+        api_client.delete(f'/api/data/{api_pass}?domain=example.com')
+        _, _, event = read_sse(events)
+        assert event['action'] == 'delete'
+        assert event['domain'] == 'example.com'
+
+    def test_heartbeat(self, events):
+        """测试空闲连接发送心跳注释"""
+        with patch('app.SSE_HEARTBEAT_INTERVAL', 0.01):
+            assert next(events) == b': heartbeat\n\n'
+
+    def test_reconnect_with_last_event_id(self, api_client, api_pass, events):
+        """测试携带Last-Event-ID重连时补发错过的事件"""
+        api_client.post(f'/api/data/{api_pass}?domain=a.com', json={'data': 'abc'})
+        last_event_id, _, _ = read_sse(events)
+
+        api_client.post(f'/api/data/{api_pass}?domain=b.com', json={'data': 'abc'})
+        api_client.post(f'/api/data/{api_pass}?domain=c.com', json={'data': 'abc'})
+
+        response = api_client.get(f'/api/pass/{api_pass}/events', buffered=False,
+                                  headers={'Last-Event-ID': str(last_event_id)})
+        stream = iter(response.response)
+        next(stream)
+        assert [read_sse(stream)[2]['domain'] for _ in range(2)] == ['b.com', 'c.com']
+        response.close()
+
+        # 从序号0重连时每个域名只补发最新状态
+        api_client.post(f'/api/data/{api_pass}?domain=a.com', json={'data': 'def'})
+        response = api_client.get(f'/api/pass/{api_pass}/events?last_event_id=0', buffered=False)
+        stream = iter(response.response)
+        next(stream)
+        assert [read_sse(stream)[2]['domain'] for _ in range(3)] == ['b.com', 'c.com', 'a.com']
+        response.close()
+
+    def test_unknown_pass(self, api_client):
+        """测试订阅不存在的Pass"""
+        assert api_client.get('/api/pass/unknown_pass_id/events').status_code == 404
+
+    def test_concurrent_streams_through_wsgi_server(self, api_client, api_pass):
+        """测试多线程WSGI服务器上同时保持多个事件流，新的请求不被阻塞"""
+        import http.client
+        import threading
+        from werkzeug.serving import make_server
+
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        connections = []
+        try:
+            # 多于同步worker数（4）的长连接
+            for _ in range(8):
+                connection = http.client.HTTPConnection('127.0.0.1', server.port, timeout=5)
+                connection.request('GET', f'/api/pass/{api_pass}/events')
+                response = connection.getresponse()
+                assert response.status == 200
+                assert response.readline() == b'retry: 3000\n'
+                assert response.readline() == b'\n'
+                connections.append((connection, response))
+
+            # 事件流保持打开时，普通请求仍能得到处理
+            connection = http.client.HTTPConnection('127.0.0.1', server.port, timeout=5)
+            connection.request('POST', f'/api/data/{api_pass}?domain=example.com', body=json.dumps({'data': 'abc'}),
+                               headers={'Content-Type': 'application/json'})
+            assert connection.getresponse().status == 201
+            connection.close()
+
+            for _, response in connections:
+                lines = [response.readline() for _ in range(4)]
+                assert lines[1] == b'event: change\n'
+                assert json.loads(lines[2][len(b'data: '):])['domain'] == 'example.com'
+        finally:
+            for connection, _ in connections:
+                connection.close()
+            server.shutdown()
+            thread.join()
+
+    def test_backlog_is_paged_in_order(self, api_client, api_pass, events):
+        """测试未读取的积压事件分页从数据库读取，全部按序号推送"""
+        with patch('app.MAX_CHANGES_PAGE', 2):
+            for i in range(5):
+                api_client.post(f'/api/data/{api_pass}?domain={i}.com', json={'data': 'abc'})
+
+            received = [read_sse(events) for _ in range(5)]
+        assert [event['domain'] for _, _, event in received] == [f'{i}.com' for i in range(5)]
+        assert [seq for seq, _, _ in received] == sorted(seq for seq, _, _ in received)
+
+    def test_thousands_of_idle_subscribers(self):
+        """测试大量空闲订阅者：唤醒只遍历目标Pass的订阅者
+
+        只测试ChangeHub本身的开销：部署时每个连接占用一个线程，
+        单机同时保持的事件流最多为 worker数 × --threads（默认 4 × 32 = 128）。
+        """
+        import threading
+        import time
+
+        hub = ChangeHub()
+        for i in range(5000):
+            hub.subscribe(f'idle-{i % 500}')
+
+        # 1000个阻塞等待的连接，模拟真实的SSE线程；先消耗订阅时预置的首次唤醒
+        waiting = [hub.subscribe('busy') for _ in range(1000)]
+        for subscriber in waiting:
+            subscriber.wait(0)
+        received = []
+
+        def wait_for_event(subscriber):
+            if subscriber.wait(5):
+                received.append(subscriber)
+
+        threads = [threading.Thread(target=wait_for_event, args=(subscriber,)) for subscriber in waiting]
+        for thread in threads:
+            thread.start()
+
+        start_time = time.time()
+        hub.notify('busy')
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - start_time
+
+        assert len(received) == 1000
+        assert elapsed < 2
+        assert hub.stats()['subscribers'] == 6000
+
+        # 唤醒没有订阅者的Pass，开销与订阅总数无关
+        start_time = time.time()
+        for _ in range(1000):
+            hub.notify('nobody')
+        assert time.time() - start_time < 1
+
+
+# ==================== 变更列表测试 ====================
+
+class TestChangesFeed:
+    """变更列表测试类"""
+
+    def save(self, client, pass_id, domain, data='abc'):
+        return client.post(f'/api/data/{pass_id}?domain={domain}', json={'data': data}).get_json()['id']
+
+    def test_changes_since_cursor(self, api_client, api_pass):
+        """测试按序号增量获取变化的域名"""
+        self.save(api_client, api_pass, 'a.com')
+        self.save(api_client, api_pass, 'b.com')
+        latest_id = self.save(api_client, api_pass, 'a.com', 'def')
+
+        result = api_client.get(f'/api/pass/{api_pass}/changes').get_json()
+        # 同一域名只保留最新一条变更
+        assert [change['domain'] for change in result['changes']] == ['b.com', 'a.com']
+        assert result['changes'][1]['entry_id'] == latest_id
+        assert result['changes'][1]['size'] == 3
+        assert result['has_more'] is False
+
+        since = result['next_since']
+        assert api_client.get(f'/api/pass/{api_pass}/changes?since={since}').get_json()['changes'] == []
+
+        self.save(api_client, api_pass, 'c.com')
+        result = api_client.get(f'/api/pass/{api_pass}/changes?since={since}').get_json()
+        assert [change['domain'] for change in result['changes']] == ['c.com']
+        assert result['next_since'] > since
+
+    def test_delete_recorded(self, api_client, api_pass):
+        """测试删除记录为变更，删除单个版本后指向剩余的最新版本"""
+        first_id = self.save(api_client, api_pass, 'example.com')
+        second_id = self.save(api_client, api_pass, 'example.com', 'def')
+
+        api_client.delete(f'/api/data/{api_pass}?domain=example.com&version_id={second_id}')
+        change = api_client.get(f'/api/pass/{api_pass}/changes').get_json()['changes'][-1]
+        assert change['action'] == 'delete'
+        assert change['entry_id'] == first_id
+
+        api_client.delete(f'/api/data/{api_pass}?domain=example.com')
+        change = api_client.get(f'/api/pass/{api_pass}/changes').get_json()['changes'][-1]
+        assert change['entry_id'] is None
+        assert change['size'] == 0
+
+    def test_pagination(self, api_client, api_pass):
+        """测试分页"""
+        for domain in ('a.com', 'b.com', 'c.com'):
+            self.save(api_client, api_pass, domain)
+
+        first = api_client.get(f'/api/pass/{api_pass}/changes?limit=2').get_json()
+        assert len(first['changes']) == 2
+        assert first['has_more'] is True
+
+        second = api_client.get(f'/api/pass/{api_pass}/changes?limit=2&since={first["next_since"]}').get_json()
+        assert [change['domain'] for change in second['changes']] == ['c.com']
+        assert second['has_more'] is False
+
+    def test_invalid_requests(self, api_client, api_pass):
+        """测试参数错误和不存在的Pass"""
+        assert api_client.get(f'/api/pass/{api_pass}/changes?since=abc').status_code == 400
+        assert api_client.get(f'/api/pass/{api_pass}/changes?limit=0').status_code == 400
+        assert api_client.get('/api/pass/unknown_pass_id/changes').status_code == 404
+
+    def test_existing_data_backfilled(self, api_client, api_pass):
+        """测试初始化时为已有数据补齐变更记录"""
+        import app as app_module
+
+        entry_id = self.save(api_client, api_pass, 'example.com')
+        with sqlite3.connect(app_module.DATABASE_PATH) as conn:
+            conn.execute('DELETE FROM changes')
+        init_database()
+
+        changes = api_client.get(f'/api/pass/{api_pass}/changes').get_json()['changes']
+        assert [(change['domain'], change['entry_id']) for change in changes] == [('example.com', entry_id)]
+
+
+# ==================== 批量读取测试 ====================
+
+class TestBatchData:
+    """多域名批量读取测试类"""
+
+    def test_batch_latest_entries(self, api_client, api_pass):
+        """测试批量返回每个域名的最新版本"""
+        for domain in ('a.com', 'b.com', 'c.com'):
+            api_client.post(f'/api/data/{api_pass}?domain={domain}', json={'data': 'aGVsbG8='})
+        latest_id = api_client.post(f'/api/data/{api_pass}?domain=a.com', json={'data': 'd29ybGQ='}).get_json()['id']
+
+        response = api_client.get(f'/api/data/{api_pass}/batch?domains=a.com,b.com,missing.com')
+        assert response.status_code == 200
+        result = response.get_json()
+
+        entries = {entry['domain']: entry for entry in result['entries']}
+        assert set(entries) == {'a.com', 'b.com'}
+        assert entries['a.com']['id'] == latest_id
+        assert entries['a.com']['data'] == 'd29ybGQ='
+        assert result['missing'] == ['missing.com']
+
+    def test_batch_all_domains(self, api_client, api_pass):
+        """测试 domains=all 返回全部域名，已删除的域名不返回"""
+        for domain in ('a.com', 'b.com', 'c.com'):
+            api_client.post(f'/api/data/{api_pass}?domain={domain}', json={'data': 'abc'})
+        api_client.delete(f'/api/data/{api_pass}?domain=b.com')
+
+        result = api_client.get(f'/api/data/{api_pass}/batch?domains=all').get_json()
+        assert [entry['domain'] for entry in result['entries']] == ['a.com', 'c.com']
+        assert result['missing'] == []
+
+    def test_batch_invalid_requests(self, api_client, api_pass):
+        """测试参数错误和不存在的Pass"""
+        assert api_client.get(f'/api/data/{api_pass}/batch').status_code == 400
+        assert api_client.get(f'/api/data/{api_pass}/batch?domains=,').status_code == 400
+        assert api_client.get('/api/data/unknown_pass_id/batch?domains=all').status_code == 404
+
+        with patch('app.MAX_BATCH_DOMAINS', 2):
+            assert api_client.get(f'/api/data/{api_pass}/batch?domains=a,b,c').status_code == 400
+
+
+# ==================== 最新版本缓存测试 ====================
+
+class TestLatestCache:
+    """最新版本LRU缓存测试类"""
+
+    def test_save_writes_through(self, api_client, api_pass):
+        """测试保存后读取直接命中缓存"""
+        from app import latest_cache
+
+        entry_id = api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': 'aGVsbG8='}).get_json()['id']
+        hits = latest_cache.stats()['hits']
+
+        with patch('app.get_db') as get_db:
+            response = api_client.get(f'/api/data/{api_pass}?domain=example.com')
+            raw = api_client.get(f'/api/data/{api_pass}/raw?domain=example.com')
+            get_db.assert_not_called()
+
+        assert response.get_json()['id'] == entry_id
+        assert response.get_json()['data'] == 'aGVsbG8='
+        assert response.get_json()['created_at']
+        assert raw.data == b'hello'
+        assert latest_cache.stats()['hits'] == hits + 2
+
+    def test_miss_fills_cache(self, api_client, api_pass):
+        """测试未命中时从数据库回填"""
+        from app import latest_cache
+
+        api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': 'abc'})
+        latest_cache.clear()
+        before = latest_cache.stats()
+
+        api_client.get(f'/api/data/{api_pass}?domain=example.com')
+        api_client.get(f'/api/quick/{api_pass}?domain=example.com')
+        after = latest_cache.stats()
+        assert after['misses'] - before['misses'] == 1
+        assert after['hits'] - before['hits'] == 1
+        assert after['entries'] == 1
+
+    def test_delete_invalidates(self, api_client, api_pass):
+        """测试删除后不再返回缓存中的版本"""
+        first_id = api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': 'abc'}).get_json()['id']
+        second_id = api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': 'def'}).get_json()['id']
+
+        api_client.delete(f'/api/data/{api_pass}?domain=example.com&version_id={second_id}')
+        assert api_client.get(f'/api/data/{api_pass}?domain=example.com').get_json()['id'] == first_id
+
+        api_client.delete(f'/api/data/{api_pass}?domain=example.com')
+        assert api_client.get(f'/api/data/{api_pass}?domain=example.com').status_code == 404
+
+    def test_byte_bounded_eviction(self):
+        """测试按字节数淘汰最久未使用的条目"""
+        cache = LatestEntryCache(3 * (100 + LatestEntryCache.ENTRY_OVERHEAD))
+        for domain in ('a', 'b', 'c'):
+            cache.put('pass', domain, {'id': 1, 'data': 'x' * 100, 'size': 100, 'created_at': ''})
+
+        cache.get('pass', 'a')
+        cache.put('pass', 'd', {'id': 1, 'data': 'x' * 100, 'size': 100, 'created_at': ''})
+
+        assert cache.get('pass', 'b') is None
+        assert cache.get('pass', 'a') is not None
+        assert cache.stats()['evictions'] == 1
+        assert cache.stats()['bytes'] <= cache.max_bytes
+
+        # 超过容量的单条数据不缓存
+        cache.put('pass', 'big', {'id': 1, 'data': 'x' * 10000, 'size': 10000, 'created_at': ''})
+        assert cache.get('pass', 'big') is None
+
+    def test_stale_fill_rejected(self):
+        """测试读取期间发生写入时放弃回填"""
+        cache = LatestEntryCache(1024 * 1024)
+        epoch = cache.epoch
+        cache.put('pass', 'example.com', {'id': 2, 'data': 'new', 'size': 3, 'created_at': ''})
+        cache.fill('pass', 'example.com', {'id': 1, 'data': 'old', 'size': 3, 'created_at': ''}, epoch)
+
+        assert cache.get('pass', 'example.com')['id'] == 2
+
+
+# ==================== 多进程一致性测试 ====================
+
+def coherence_worker(db_path, commands, results):
+    """模拟另一个worker进程：按命令保存、读取或删除数据"""
+    import app as app_module
+
+    app_module.DATABASE_PATH = db_path
+    client = app_module.app.test_client()
+
+    for command, pass_id, domain, data in iter(commands.get, None):
+        url = f'/api/data/{pass_id}?domain={domain}'
+        if command == 'save':
+            response = client.post(url, json={'data': data})
+        elif command == 'delete':
+            response = client.delete(url)
+        else:
+            response = client.get(url)
+        results.put((response.status_code, response.get_json()))
+
+class TestCoherence:
+    """多进程缓存一致性测试类"""
+
+    @pytest.fixture
+    def remote(self, api_client, api_pass):
+        """另一个进程中的worker，返回向其发送命令的函数"""
+        import multiprocessing
+        import app as app_module
+
+        context = multiprocessing.get_context('spawn')
+        commands, results = context.Queue(), context.Queue()
+        worker = context.Process(target=coherence_worker,
+                                 args=(app_module.DATABASE_PATH, commands, results))
+        worker.start()
+
+        def send(command, domain, data=None):
+            commands.put((command, api_pass, domain, data))
+            return results.get(timeout=30)
+
+        yield send
+
+        commands.put(None)
+        worker.join(30)
+
+    def test_no_stale_reads_across_processes(self, api_client, api_pass, remote):
+        """测试一个进程确认写入后，另一个进程不会读到旧版本"""
+        url = f'/api/data/{api_pass}?domain=example.com'
+
+        for i in range(10):
+            # 两边先读一次，让各自的缓存持有当前版本
+            api_client.get(url)
+            remote('get', 'example.com')
+
+            if i % 2:
+                status, _ = remote('save', 'example.com', f'remote-{i}')
+                assert status == 201
+                assert api_client.get(url).get_json()['data'] == f'remote-{i}'
+            else:
+                assert api_client.post(url, json={'data': f'local-{i}'}).status_code == 201
+                status, body = remote('get', 'example.com')
+                assert body['data'] == f'local-{i}'
+
+        status, _ = remote('delete', 'example.com')
+        assert status == 200
+        assert api_client.get(url).status_code == 404
+
+    def test_new_domain_from_other_process(self, api_client, api_pass, remote):
+        """测试其他进程新增的域名立即可读"""
+        assert api_client.get(f'/api/data/{api_pass}?domain=new.com').status_code == 404
+
+        remote('save', 'new.com', 'abc')
+        assert api_client.get(f'/api/data/{api_pass}?domain=new.com').get_json()['data'] == 'abc'
+
+    def test_events_from_other_process(self, api_client, api_pass, remote):
+        """测试在一个进程订阅、另一个进程写入时，事件流收到变更"""
+        response = api_client.get(f'/api/pass/{api_pass}/events', buffered=False)
+        stream = iter(response.response)
+        assert next(stream) == b'retry: 3000\n\n'
+
+        with patch('app.SSE_POLL_INTERVAL', 0.05):
+            status, saved = remote('save', 'example.com', 'abc')
+            assert status == 201
+            _, _, event = read_sse(stream)
+            assert event['domain'] == 'example.com'
+            assert event['entry_id'] == saved['id']
+
+            remote('delete', 'example.com')
+            _, _, event = read_sse(stream)
+            assert event['action'] == 'delete'
+        response.close()
+
+    def test_local_writes_stay_cached(self, api_client, api_pass):
+        """测试本进程写入后的检查不会失效刚写入的缓存"""
+        from app import coherence, latest_cache
+
+        api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': 'abc'})
+        remote_changes = coherence.stats()['remote_changes']
+        hits = latest_cache.stats()['hits']
+
+        api_client.get(f'/api/data/{api_pass}?domain=example.com')
+        assert coherence.stats()['remote_changes'] == remote_changes
+        assert latest_cache.stats()['hits'] == hits + 1
+
+    def test_only_data_endpoints_checked(self, api_client, api_pass):
+        """测试只有读取数据的接口在请求前检查，健康检查、统计等不检查"""
+        from app import coherence
+
+        with patch.object(coherence, 'check') as check:
+            api_client.get('/health')
+            api_client.get('/api/stats/server')
+            api_client.get(f'/api/pass/{api_pass}/check')
+            assert check.call_count == 0
+
+            api_client.get(f'/api/data/{api_pass}?domain=example.com')
+            api_client.get(f'/api/quick/{api_pass}?domain=example.com&format=json')
+            api_client.post(f'/api/pass/{api_pass}/manifest', json={})
+            assert check.call_count == 3
+
+    def test_unchanged_check_does_not_lock(self, api_client, api_pass):
+        """测试数据库未变化时检查不获取全局锁，其他线程持锁时不被阻塞"""
+        import threading
+        from app import coherence
+
+        def check_twice():
+            # 第一次建立本线程的连接并扫描，第二次data_version未变化
+            coherence.check()
+            connected.set()
+            locked.wait(5)
+            coherence.check()
+            done.set()
+
+        connected, locked, done = threading.Event(), threading.Event(), threading.Event()
+        thread = threading.Thread(target=check_twice)
+        thread.start()
+        assert connected.wait(5)
+        with coherence.lock:
+            locked.set()
+            assert done.wait(5)
+        thread.join()
+
+
+# ==================== 零拷贝响应测试 ====================
+
+class TestZeroCopyResponses:
+    """直接拼接JSON与BLOB流式读取测试类"""
+
+    def test_json_assembled_around_payload(self, api_client, api_pass):
+        """测试拼接的JSON与原有字段一致"""
+        encoded = base64.b64encode(os.urandom(1000)).decode('ascii')
+        entry_id = api_client.post(f'/api/data/{api_pass}?domain=exa"mple.com', json={'data': encoded}).get_json()['id']
+
+        response = api_client.get(f'/api/data/{api_pass}?domain=exa"mple.com')
+        assert response.content_length == len(response.data)
+        body = response.get_json()
+        assert list(body) == ['domain', 'data', 'size', 'created_at', 'timestamp', 'id']
+        assert body['domain'] == 'exa"mple.com'
+        assert body['data'] == encoded
+        assert body['size'] == len(encoded)
+        assert body['id'] == entry_id
+
+    def test_text_payload_escaped(self, api_client, api_pass):
+        """测试非Base64文本仍按JSON转义"""
+        text = 'line "one"\n\u5bc6\u6587 \\ end'
+        api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': text})
+
+        assert api_client.get(f'/api/data/{api_pass}?domain=example.com').get_json()['data'] == text
+        entries = api_client.get(f'/api/data/{api_pass}/batch?domains=all').get_json()['entries']
+        assert entries[0]['data'] == text
+
+    def test_large_entry_streamed_from_blob(self, api_client, api_pass):
+        """测试未缓存的大数据分块读取，结果与整体编码一致并回填缓存"""
+        from app import latest_cache, BLOB_CHUNK_SIZE
+
+        raw = os.urandom(2 * BLOB_CHUNK_SIZE + 1)
+        api_client.post(f'/api/data/{api_pass}/raw?domain=example.com', data=raw,
+                        content_type='application/octet-stream')
+        latest_cache.clear()
+
+        with patch('app.BLOB_STREAM_THRESHOLD', 1024):
+            response = api_client.get(f'/api/data/{api_pass}?domain=example.com')
+            assert response.is_streamed
+            assert response.content_length == len(response.data)
+            assert base64.b64decode(response.get_json()['data']) == raw
+            response.close()
+
+            # 读完并关闭响应后已回填缓存
+            hits = latest_cache.stats()['hits']
+            raw_response = api_client.get(f'/api/data/{api_pass}/raw?domain=example.com')
+            assert raw_response.data == raw
+            assert latest_cache.stats()['hits'] == hits + 1
+
+            latest_cache.clear()
+            raw_response = api_client.get(f'/api/data/{api_pass}/raw?domain=example.com')
+            assert raw_response.is_streamed
+            assert raw_response.data == raw
+            assert raw_response.headers['X-Entry-Id'].startswith('data_')
+
+
+# ==================== 响应压缩测试 ====================
+
+class TestCompression:
+    """协商压缩与存储压缩复用测试类"""
+
+    def test_json_gzip_negotiated(self, api_client, api_pass):
+        """测试声明gzip的客户端得到压缩后的JSON，未声明时原样返回"""
+        encoded = base64.b64encode(b'a' * 5000).decode('ascii')
+        api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': encoded})
+
+        plain = api_client.get(f'/api/data/{api_pass}?domain=example.com')
+        assert 'Content-Encoding' not in plain.headers
+        assert 'Accept-Encoding' in plain.headers['Vary']
+
+        response = api_client.get(f'/api/data/{api_pass}?domain=example.com',
+                                  headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert len(response.data) < len(plain.data)
+        assert json.loads(gzip.decompress(response.data)) == plain.get_json()
+
+        # 压缩后的弱ETag仍可用于条件请求
+        etag = response.headers['ETag']
+        assert etag.startswith('W/')
+        response = api_client.get(f'/api/data/{api_pass}?domain=example.com',
+                                  headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        assert response.status_code == 304
+
+    def test_small_and_streamed_responses(self, api_client, api_pass):
+        """测试小响应不压缩，流式JSON逐块压缩"""
+        response = api_client.get(f'/api/pass/{api_pass}/check', headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in response.headers
+
+        for i in range(50):
+            api_client.post(f'/api/data/{api_pass}?domain=site{i}.com', json={'data': 'x' * 100})
+        response = api_client.get(f'/api/data/{api_pass}/batch?domains=all',
+                                  headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Content-Length' not in response.headers
+        assert len(json.loads(gzip.decompress(response.data))['entries']) == 50
+
+    def test_raw_passthrough_of_stored_gzip(self, api_client, api_pass):
+        """测试可压缩数据按gzip存储，从数据库读取时原始下载直接透传存储字节"""
+        import app as app_module
+
+        raw = b'cookie=value; ' * 500
+        api_client.post(f'/api/data/{api_pass}/raw?domain=example.com', data=raw,
+                        content_type='application/octet-stream')
+        # 最新版本缓存保存的是解压后的载荷，清空后才会读到gzip存储字节
+        app_module.latest_cache.clear()
+
+        response = api_client.get(f'/api/data/{api_pass}/raw?domain=example.com',
+                                  headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert len(response.data) < len(raw)
+        assert gzip.decompress(response.data) == raw
+
+        assert api_client.get(f'/api/data/{api_pass}/raw?domain=example.com').data == raw
+        body = api_client.get(f'/api/data/{api_pass}?domain=example.com').get_json()
+        assert base64.b64decode(body['data']) == raw
+        assert body['size'] == len(body['data'])
+
+    def test_incompressible_payload_stored_plain(self, api_client, api_pass):
+        """测试压缩无收益的数据不压缩存储"""
+        import app as app_module
+
+        api_client.post(f'/api/data/{api_pass}/raw?domain=example.com', data=os.urandom(5000),
+                        content_type='application/octet-stream')
+        conn = sqlite3.connect(app_module.DATABASE_PATH)
+        codec, stored = conn.execute('SELECT codec, length(data) FROM data_entries').fetchone()
+        conn.close()
+        assert codec is None
+        assert stored == 5000
+
+    def test_streamable_payload_stored_plain(self, api_client, api_pass):
+        """测试超过流式阈值的可压缩数据不压缩存储，仍按BLOB流式读取"""
+        import app as app_module
+
+        raw = b'cookie=value; ' * 200
+        with patch('app.BLOB_STREAM_THRESHOLD', 1024):
+            api_client.post(f'/api/data/{api_pass}/raw?domain=example.com', data=raw,
+                            content_type='application/octet-stream')
+            app_module.latest_cache.clear()
+            response = api_client.get(f'/api/data/{api_pass}/raw?domain=example.com')
+            assert response.is_streamed
+            assert response.data == raw
+
+        conn = sqlite3.connect(app_module.DATABASE_PATH)
+        codec, stored = conn.execute('SELECT codec, length(data) FROM data_entries').fetchone()
+        conn.close()
+        assert codec is None
+        assert stored == len(raw)
+
+    def test_latest_cache_holds_decoded_payload(self, api_client, api_pass):
+        """测试压缩存储的版本在最新版本缓存中保存解压后的载荷，命中时不再解压"""
+        import app as app_module
+
+        raw = b'cookie=value; ' * 500
+        api_client.post(f'/api/data/{api_pass}/raw?domain=example.com', data=raw,
+                        content_type='application/octet-stream')
+        cached = app_module.latest_cache.get(api_pass, 'example.com')
+        assert cached['codec'] is None
+        assert cached['data'] == raw
+
+        # 从数据库回填时同样解压后缓存
+        app_module.latest_cache.clear()
+        entry = app_module.load_latest_entry(api_pass, 'example.com')
+        assert entry['codec'] == 'gzip'
+        cached = app_module.latest_cache.get(api_pass, 'example.com')
+        assert cached['codec'] is None
+        assert cached['data'] == raw
+
+        with patch('app.gzip.decompress', side_effect=AssertionError('decompressed on cache hit')):
+            assert api_client.get(f'/api/data/{api_pass}/raw?domain=example.com').data == raw
+
+    def test_codec_column_migrated(self, api_client):
+        """测试旧数据库升级时补充codec列，旧数据按未压缩读取"""
+        import app as app_module
+
+        conn = sqlite3.connect(app_module.DATABASE_PATH)
+        conn.execute('DROP TABLE data_entries')
+        conn.execute('''
+            CREATE TABLE data_entries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                pass_id TEXT NOT NULL,
+                domain TEXT NOT NULL,
+                data TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+        init_database()
+        conn = sqlite3.connect(app_module.DATABASE_PATH)
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(data_entries)')]
+        conn.close()
+        assert 'codec' in columns
+
+
+# ==================== 历史版本读取测试 ====================
+
+class TestVersionFetch:
+    """指定版本读取测试类"""
+
+    def test_fetch_historical_version(self, api_client, api_pass):
+        """测试按版本ID读取历史数据，响应可永久缓存"""
+        old = base64.b64encode(b'old version').decode('ascii')
+        old_id = api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': old}).get_json()['id']
+        api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': 'new version'})
+
+        response = api_client.get(f'/api/data/{api_pass}/versions/{old_id}')
+        assert response.status_code == 200
+        body = response.get_json()
+        assert body['data'] == old
+        assert body['domain'] == 'example.com'
+        assert body['id'] == old_id
+        assert 'immutable' in response.headers['Cache-Control']
+        assert response.headers['ETag'] == f'"{old_id}"'
+
+        # 也接受不带前缀的数字ID
+        assert api_client.get(f'/api/data/{api_pass}/versions/{old_id[5:]}').get_json()['data'] == old
+
+        response = api_client.get(f'/api/data/{api_pass}/versions/{old_id}',
+                                  headers={'If-None-Match': f'"{old_id}"'})
+        assert response.status_code == 304
+        assert 'immutable' in response.headers['Cache-Control']
+
+    def test_version_not_found(self, api_client, api_pass):
+        """测试不存在、格式错误或属于其他Pass的版本"""
+        other_pass = api_client.post('/api/pass/create', json={}).get_json()['pass_id']
+        entry_id = api_client.post(f'/api/data/{other_pass}?domain=example.com', json={'data': 'secret'}).get_json()['id']
+
+        assert api_client.get(f'/api/data/{api_pass}/versions/{entry_id}').status_code == 404
+        assert api_client.get(f'/api/data/{api_pass}/versions/data_999').status_code == 404
+        assert api_client.get(f'/api/data/{api_pass}/versions/latest').status_code == 404
+
+        # 条件请求同样校验版本归属，不会对其他Pass或已删除的版本返回304
+        response = api_client.get(f'/api/data/{api_pass}/versions/{entry_id}',
+                                  headers={'If-None-Match': f'"{entry_id}"'})
+        assert response.status_code == 404
+        api_client.delete(f'/api/data/{other_pass}?domain=example.com')
+        response = api_client.get(f'/api/data/{other_pass}/versions/{entry_id}',
+                                  headers={'If-None-Match': f'"{entry_id}"'})
+        assert response.status_code == 404
+
+    def test_large_version_streamed(self, api_client, api_pass):
+        """测试大版本分块读取，不写入最新版本缓存"""
+        from app import latest_cache
+
+        raw = os.urandom(5000)
+        api_client.post(f'/api/data/{api_pass}/raw?domain=example.com', data=raw,
+                        content_type='application/octet-stream')
+        entry_id = api_client.get(f'/api/data/{api_pass}/raw?domain=example.com').headers['X-Entry-Id']
+        latest_cache.clear()
+
+        with patch('app.BLOB_STREAM_THRESHOLD', 1024):
+            response = api_client.get(f'/api/data/{api_pass}/versions/{entry_id}')
+            assert response.is_streamed
+            assert base64.b64decode(response.get_json()['data']) == raw
+            response.close()
+        assert latest_cache.stats()['entries'] == 0
+
+
+# ==================== 版本恢复测试 ====================
+
+class TestRestoreVersion:
+    """服务器端版本恢复测试类"""
+
+    def test_restore_creates_new_latest(self, api_client, api_pass):
+        """测试恢复后最新版本为旧数据，并产生变更记录"""
+        old = base64.b64encode(b'old version').decode('ascii')
+        old_id = api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': old}).get_json()['id']
+        api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': 'new version'})
+        # 读取一次，使最新版本进入缓存
+        assert api_client.get(f'/api/data/{api_pass}?domain=example.com').get_json()['data'] == 'new version'
+        since = api_client.get(f'/api/pass/{api_pass}/changes').get_json()['next_since']
+
+        response = api_client.post(f'/api/data/{api_pass}/restore?domain=example.com&version_id={old_id}')
+        assert response.status_code == 201
+        body = response.get_json()
+        assert body['restored_from'] == old_id
+        assert body['id'] != old_id
+
+        latest = api_client.get(f'/api/data/{api_pass}?domain=example.com').get_json()
+        assert latest['data'] == old
+        assert latest['id'] == body['id']
+
+        changes = api_client.get(f'/api/pass/{api_pass}/changes?since={since}').get_json()['changes']
+        assert [(c['action'], c['entry_id']) for c in changes] == [('save', body['id'])]
+
+        versions = api_client.get(f'/api/data/{api_pass}/versions?domain=example.com').get_json()['versions']
+        assert len(versions) == 3
+
+    def test_restore_compressed_payload(self, api_client, api_pass):
+        """测试按gzip存储的数据原样复制"""
+        raw = b'cookie=value; ' * 500
+        api_client.post(f'/api/data/{api_pass}/raw?domain=example.com', data=raw,
+                        content_type='application/octet-stream')
+        old_id = api_client.get(f'/api/data/{api_pass}/raw?domain=example.com').headers['X-Entry-Id']
+        api_client.post(f'/api/data/{api_pass}/raw?domain=example.com', data=b'other',
+                        content_type='application/octet-stream')
+
+        api_client.post(f'/api/data/{api_pass}/restore?domain=example.com&version_id={old_id}')
+        assert api_client.get(f'/api/data/{api_pass}/raw?domain=example.com').data == raw
+
+    def test_restore_respects_retention(self, api_client, api_pass):
+        """测试恢复后仍只保留MAX_VERSIONS个版本"""
+        with patch('app.MAX_VERSIONS', 3):
+            ids = [api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': f'v{i}'}).get_json()['id']
+                   for i in range(3)]
+            api_client.post(f'/api/data/{api_pass}/restore?domain=example.com&version_id={ids[0]}')
+
+            versions = api_client.get(f'/api/data/{api_pass}/versions?domain=example.com').get_json()['versions']
+            assert len(versions) == 3
+            assert ids[0] not in [v['id'] for v in versions]
+            assert api_client.get(f'/api/data/{api_pass}?domain=example.com').get_json()['data'] == 'v0'
+
+    def test_restore_errors(self, api_client, api_pass):
+        """测试参数缺失和版本不存在"""
+        entry_id = api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': 'v1'}).get_json()['id']
+
+        assert api_client.post(f'/api/data/{api_pass}/restore?domain=example.com').status_code == 400
+        assert api_client.post(f'/api/data/{api_pass}/restore?version_id={entry_id}').status_code == 400
+        assert api_client.post(f'/api/data/{api_pass}/restore?domain=other.com&version_id={entry_id}').status_code == 404
+        assert api_client.post(f'/api/data/{api_pass}/restore?domain=example.com&version_id=data_999').status_code == 404
+        assert api_client.post(f'/api/data/{api_pass}/restore?domain=example.com&version_id=abc').status_code == 404
+
+
+# ==================== 内容哈希测试 ====================
+
+class TestContentHash:
+    """内容哈希与元数据接口测试类"""
+
+    def test_meta_and_head_expose_hash(self, api_client, api_pass):
+        """测试元数据接口与HEAD返回内容哈希，且与数据一致"""
+        encoded = base64.b64encode(os.urandom(500)).decode('ascii')
+        entry_id = api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': encoded}).get_json()['id']
+        expected = hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+        meta = api_client.get(f'/api/data/{api_pass}/meta?domain=example.com').get_json()
+        assert meta == {
+            'domain': 'example.com',
+            'id': entry_id,
+            'size': len(encoded),
+            'content_hash': expected,
+            'created_at': meta['created_at'],
+            'timestamp': meta['created_at']
+        }
+
+        response = api_client.head(f'/api/data/{api_pass}?domain=example.com')
+        assert response.status_code == 200
+        assert response.data == b''
+        assert response.headers['X-Content-Hash'] == expected
+        assert response.headers['X-Entry-Id'] == entry_id
+        assert response.headers['X-Data-Size'] == str(len(encoded))
+
+        # GET 同样带有哈希头
+        assert api_client.get(f'/api/data/{api_pass}?domain=example.com').headers['X-Content-Hash'] == expected
+
+    def test_head_content_length_matches_get(self, api_client, api_pass):
+        """测试HEAD的Content-Length与GET的响应体长度一致，无法确定或GET会被压缩时不声明"""
+        from app import latest_cache
+
+        api_client.post(f'/api/data/{api_pass}?domain=blob.com',
+                        json={'data': base64.b64encode(os.urandom(3000)).decode('ascii')})
+        api_client.post(f'/api/data/{api_pass}?domain=text.com', json={'data': 'line "one"\n' * 200})
+
+        for cached in (True, False):
+            if not cached:
+                latest_cache.clear()
+            url = f'/api/data/{api_pass}?domain=blob.com'
+            assert api_client.head(url).headers['Content-Length'] == str(len(api_client.get(url).data))
+            assert 'Content-Length' not in api_client.head(url, headers={'Accept-Encoding': 'gzip'}).headers
+
+        # 文本数据需要转义，只有缓存中有数据时才能得知长度
+        url = f'/api/data/{api_pass}?domain=text.com'
+        assert 'Content-Length' not in api_client.head(url).headers
+        length = len(api_client.get(url).data)
+        assert api_client.head(url).headers['Content-Length'] == str(length)
+
+    def test_raw_and_json_uploads_hash_equal(self, api_client, api_pass):
+        """测试同一密文通过原始接口和JSON接口上传得到相同的哈希"""
+        raw = os.urandom(300)
+        api_client.post(f'/api/data/{api_pass}/raw?domain=raw.com', data=raw,
+                        content_type='application/octet-stream')
+        api_client.post(f'/api/data/{api_pass}?domain=json.com', json={'data': base64.b64encode(raw).decode('ascii')})
+
+        raw_hash = api_client.get(f'/api/data/{api_pass}/meta?domain=raw.com').get_json()['content_hash']
+        json_hash = api_client.get(f'/api/data/{api_pass}/meta?domain=json.com').get_json()['content_hash']
+        assert raw_hash == json_hash
+
+    def test_meta_does_not_read_data(self, api_client, api_pass):
+        """测试元数据接口不加载数据，也不写入缓存"""
+        from app import latest_cache
+
+        api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': 'v1'})
+        latest_cache.clear()
+
+        assert api_client.get(f'/api/data/{api_pass}/meta?domain=example.com').status_code == 200
+        assert api_client.head(f'/api/data/{api_pass}?domain=example.com').status_code == 200
+        assert latest_cache.stats()['entries'] == 0
+
+    def test_meta_errors(self, api_client, api_pass):
+        """测试参数缺失和数据不存在"""
+        assert api_client.get(f'/api/data/{api_pass}/meta').status_code == 400
+        assert api_client.get(f'/api/data/{api_pass}/meta?domain=missing.com').status_code == 404
+        assert api_client.head(f'/api/data/{api_pass}?domain=missing.com').status_code == 404
+
+    def test_existing_entries_backfilled(self, api_client, api_pass):
+        """测试升级前写入的数据在初始化时补算哈希"""
+        import app as app_module
+
+        conn = sqlite3.connect(app_module.DATABASE_PATH)
+        conn.execute(
+            "INSERT INTO data_entries (pass_id, domain, data, size) VALUES (?, 'old.com', 'legacy', 6)",
+            (api_pass,)
+        )
+        conn.commit()
+        conn.close()
+
+        init_database()
+        meta = api_client.get(f'/api/data/{api_pass}/meta?domain=old.com').get_json()
+        assert meta['content_hash'] == hashlib.sha256(b'legacy').hexdigest()
+
+    def test_backfill_in_batches(self, api_client, api_pass):
+        """测试补算哈希按批次进行，所有旧数据都被处理"""
+        import app as app_module
+
+        conn = sqlite3.connect(app_module.DATABASE_PATH)
+        conn.executemany(
+            "INSERT INTO data_entries (pass_id, domain, data, size) VALUES (?, ?, ?, 6)",
+            [(api_pass, f'old{i}.com', f'legacy{i}') for i in range(7)]
+        )
+        conn.commit()
+        conn.close()
+
+        statements = []
+        connect = sqlite3.connect
+
+        def traced_connect(*args, **kwargs):
+            traced = connect(*args, **kwargs)
+            traced.set_trace_callback(statements.append)
+            return traced
+
+        with patch('app.HASH_BACKFILL_BATCH', 3), patch('app.sqlite3.connect', traced_connect):
+            init_database()
+        batches = [sql for sql in statements if 'content_hash IS NULL' in sql]
+        assert len(batches) == 4
+
+        conn = sqlite3.connect(app_module.DATABASE_PATH)
+        rows = conn.execute("SELECT data, content_hash FROM data_entries WHERE domain LIKE 'old%'").fetchall()
+        conn.close()
+        assert len(rows) == 7
+        assert all(digest == hashlib.sha256(data.encode('utf-8')).hexdigest() for data, digest in rows)
+
+
+# ==================== 同步清单测试 ====================
+
+class TestSyncManifest:
+    """同步清单测试类"""
+
+    def test_manifest_actions(self, api_client, api_pass):
+        """测试按哈希和上次同步时间决定各域名的同步方向"""
+        for domain in ('same.com', 'changed.com', 'first.com', 'local-only-server.com'):
+            api_client.post(f'/api/data/{api_pass}?domain={domain}', json={'data': f'{domain}-v1'})
+        meta = api_client.get(f'/api/data/{api_pass}/meta?domain=same.com').get_json()
+
+        response = api_client.post(f'/api/pass/{api_pass}/manifest', json={
+            'same.com': {'hash': meta['content_hash'], 'last_sync': '2000-01-01T00:00:00Z'},
+            'changed.com': {'hash': 'local', 'last_sync': '2000-01-01T00:00:00.000Z'},
+            'first.com': {'hash': 'local'},
+            'local-only-server.com': None,
+            'new.com': {'hash': 'local', 'last_sync': '2000-01-01T00:00:00Z'},
+            'empty.com': {}
+        })
+        assert response.status_code == 200
+        domains = response.get_json()['domains']
+        assert {domain: item['action'] for domain, item in domains.items()} == {
+            'same.com': 'none',
+            'changed.com': 'download',
+            'first.com': 'download',
+            'local-only-server.com': 'download',
+            'new.com': 'upload',
+            'empty.com': 'none'
+        }
+        assert domains['same.com']['server'] == meta
+        assert domains['new.com']['server'] is None
+
+    def test_local_newer_uploads(self, api_client, api_pass):
+        """测试本地同步时间晚于服务器版本时上传"""
+        api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': 'v1'})
+
+        response = api_client.post(f'/api/pass/{api_pass}/manifest', json={
+            'example.com': {'hash': 'local', 'last_sync': '2999-01-01T00:00:00+08:00'}
+        })
+        assert response.get_json()['domains']['example.com']['action'] == 'upload'
+
+    def test_first_sync_downloads_before_hash_check(self, api_client, api_pass):
+        """测试与扩展的 decideSyncDirection 顺序一致：没有上次同步时间时先下载，不比较哈希"""
+        api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': 'v1'})
+        meta = api_client.get(f'/api/data/{api_pass}/meta?domain=example.com').get_json()
+
+        response = api_client.post(f'/api/pass/{api_pass}/manifest', json={
+            'example.com': {'hash': meta['content_hash']}
+        })
+        assert response.get_json()['domains']['example.com']['action'] == 'download'
+
+        response = api_client.post(f'/api/pass/{api_pass}/manifest', json={
+            'example.com': {'hash': meta['content_hash'], 'last_sync': '2999-01-01T00:00:00Z'}
+        })
+        assert response.get_json()['domains']['example.com']['action'] == 'none'
+
+    def test_manifest_errors(self, api_client, api_pass):
+        """测试无效请求"""
+        assert api_client.post(f'/api/pass/{api_pass}/manifest', json=[]).status_code == 400
+        assert api_client.post(f'/api/pass/{api_pass}/manifest', json={}).status_code == 400
+        assert api_client.post(f'/api/pass/{api_pass}/manifest', json={'a.com': 'hash'}).status_code == 400
+        assert api_client.post(f'/api/pass/{api_pass}/manifest',
+                               json={'a.com': {'last_sync': 'yesterday'}}).status_code == 400
+        assert api_client.post('/api/pass/NOPE/manifest', json={'a.com': {}}).status_code == 404
+
+        with patch('app.MAX_BATCH_DOMAINS', 2):
+            response = api_client.post(f'/api/pass/{api_pass}/manifest',
+                                       json={'a.com': {}, 'b.com': {}, 'c.com': {}})
+            assert response.status_code == 400
+
+
+# ==================== 增量上传测试 ====================
+
+def delta_copy(offset, length):
+    return b'\x01' + struct.pack('>II', offset, length)
+
+def delta_insert(data):
+    return b'\x02' + struct.pack('>I', len(data)) + data
+
+def text_hash(raw):
+    return hashlib.sha256(base64.b64encode(raw)).hexdigest()
+
+class TestDeltaUpload:
+    """基于基础版本的二进制增量上传测试类"""
+
+    @pytest.fixture
+    def base(self, api_client, api_pass):
+        """上传一个基础版本，返回 (原始字节, 版本ID)"""
+        raw = os.urandom(4096)
+        api_client.post(f'/api/data/{api_pass}/raw?domain=example.com', data=raw,
+                        content_type='application/octet-stream')
+        entry_id = api_client.get(f'/api/data/{api_pass}/meta?domain=example.com').get_json()['id']
+        return raw, entry_id
+
+    def post_delta(self, api_client, api_pass, base_id, delta, digest):
+        return api_client.post(
+            f'/api/data/{api_pass}/delta?domain=example.com&base_version_id={base_id}&hash={digest}',
+            data=delta, content_type='application/octet-stream'
+        )
+
+    def test_delta_rebuilds_payload(self, api_client, api_pass, base):
+        """测试增量重建后的数据与完整数据一致"""
+        raw, base_id = base
+        target = raw[:1000] + b'new cookie value' + raw[1200:]
+        delta = delta_copy(0, 1000) + delta_insert(b'new cookie value') + delta_copy(1200, len(raw) - 1200)
+
+        response = self.post_delta(api_client, api_pass, base_id, delta, text_hash(target))
+        assert response.status_code == 201
+        body = response.get_json()
+        assert body['size'] == len(base64.b64encode(target))
+        assert body['id'] != base_id
+
+        assert api_client.get(f'/api/data/{api_pass}/raw?domain=example.com').data == target
+        meta = api_client.get(f'/api/data/{api_pass}/meta?domain=example.com').get_json()
+        assert meta['content_hash'] == text_hash(target)
+
+    def test_delta_from_uncached_historical_base(self, api_client, api_pass, base):
+        """测试基础版本不是最新版本、也不在缓存中"""
+        from app import latest_cache
+
+        raw, base_id = base
+        api_client.post(f'/api/data/{api_pass}/raw?domain=example.com', data=b'other',
+                        content_type='application/octet-stream')
+        latest_cache.clear()
+
+        target = raw[2048:] + raw[:2048]
+        delta = delta_copy(2048, 2048) + delta_copy(0, 2048)
+        assert self.post_delta(api_client, api_pass, base_id, delta, text_hash(target)).status_code == 201
+        assert api_client.get(f'/api/data/{api_pass}/raw?domain=example.com').data == target
+
+    def test_fallback_when_base_missing_or_hash_mismatch(self, api_client, api_pass, base):
+        """测试基础版本不存在或哈希不一致时要求完整上传"""
+        raw, base_id = base
+        delta = delta_copy(0, 10)
+
+        response = self.post_delta(api_client, api_pass, 'data_999', delta, text_hash(raw[:10]))
+        assert response.status_code == 409
+        assert response.get_json()['full_upload_required'] is True
+
+        response = self.post_delta(api_client, api_pass, base_id, delta, text_hash(b'something else'))
+        assert response.status_code == 409
+        assert response.get_json()['full_upload_required'] is True
+
+        # 其他域名的版本不能作为基础版本
+        response = api_client.post(
+            f'/api/data/{api_pass}/delta?domain=other.com&base_version_id={base_id}&hash={text_hash(raw[:10])}',
+            data=delta, content_type='application/octet-stream'
+        )
+        assert response.status_code == 409
+
+    def test_invalid_delta(self, api_client, api_pass, base):
+        """测试格式错误的增量和无效请求"""
+        raw, base_id = base
+        digest = text_hash(raw)
+
+        assert self.post_delta(api_client, api_pass, base_id, b'\x03', digest).status_code == 400
+        assert self.post_delta(api_client, api_pass, base_id, b'\x01\x00', digest).status_code == 400
+        assert self.post_delta(api_client, api_pass, base_id, delta_copy(4000, 200), digest).status_code == 400
+        assert self.post_delta(api_client, api_pass, base_id, b'\x02' + struct.pack('>I', 10) + b'abc',
+                               digest).status_code == 400
+
+        with patch('app.MAX_PAYLOAD_BYTES', 8192):
+            delta = delta_copy(0, 4096) * 3
+            assert self.post_delta(api_client, api_pass, base_id, delta, digest).status_code == 400
+
+        response = api_client.post(
+            f'/api/data/{api_pass}/delta?domain=example.com&base_version_id={base_id}&hash={digest}',
+            data=delta_copy(0, 10), content_type='text/plain'
+        )
+        assert response.status_code == 415
+        assert api_client.post(f'/api/data/{api_pass}/delta?domain=example.com', data=b'x',
+                               content_type='application/octet-stream').status_code == 400
+
+
+# ==================== 分块上传测试 ====================
+
+class TestChunkedUpload:
+    """分块可续传上传测试类"""
+
+    @pytest.fixture(autouse=True)
+    def upload_dir(self, tmp_path):
+        with patch('app.UPLOAD_DIR', str(tmp_path)):
+            yield tmp_path
+
+    def create(self, api_client, api_pass, size):
+        response = api_client.post(f'/api/data/{api_pass}/uploads?domain=example.com&size={size}')
+        assert response.status_code == 201
+        return response.get_json()['upload_id']
+
+    def put(self, api_client, api_pass, upload_id, offset, chunk):
+        return api_client.put(f'/api/data/{api_pass}/uploads/{upload_id}?offset={offset}', data=chunk,
+                              content_type='application/octet-stream')
+
+    def test_upload_larger_than_single_request_limit(self, api_client, api_pass, upload_dir):
+        """测试分块上传超过单次请求上限的数据并原子提交"""
+        raw = os.urandom(10000)
+        with patch('app.MAX_DATA_SIZE', 4096):
+            upload_id = self.create(api_client, api_pass, len(raw))
+            for offset in range(0, len(raw), 4096):
+                response = self.put(api_client, api_pass, upload_id, offset, raw[offset:offset + 4096])
+                assert response.status_code == 200
+                assert response.get_json()['received'] == min(offset + 4096, len(raw))
+
+            # 提交前数据不可见
+            assert api_client.get(f'/api/data/{api_pass}/raw?domain=example.com').status_code == 404
+
+            digest = hashlib.sha256(base64.b64encode(raw)).hexdigest()
+            response = api_client.post(f'/api/data/{api_pass}/uploads/{upload_id}/commit?hash={digest}')
+            assert response.status_code == 201
+            entry_id = response.get_json()['id']
+
+        assert api_client.get(f'/api/data/{api_pass}/raw?domain=example.com').data == raw
+        meta = api_client.get(f'/api/data/{api_pass}/meta?domain=example.com').get_json()
+        assert meta['id'] == entry_id
+        assert meta['content_hash'] == digest
+        assert meta['size'] == len(base64.b64encode(raw))
+        assert list(upload_dir.iterdir()) == []
+        assert api_client.get(f'/api/data/{api_pass}/uploads/{upload_id}').status_code == 404
+
+    def test_resume_after_interruption(self, api_client, api_pass):
+        """测试按已收到的字节数续传，重叠重传不影响结果"""
+        raw = os.urandom(3000)
+        upload_id = self.create(api_client, api_pass, len(raw))
+        self.put(api_client, api_pass, upload_id, 0, raw[:1000])
+
+        response = self.put(api_client, api_pass, upload_id, 2000, raw[2000:])
+        assert response.status_code == 409
+        assert response.get_json()['received'] == 1000
+
+        response = api_client.post(f'/api/data/{api_pass}/uploads/{upload_id}/commit')
+        assert response.status_code == 409
+
+        received = api_client.get(f'/api/data/{api_pass}/uploads/{upload_id}').get_json()['received']
+        self.put(api_client, api_pass, upload_id, received - 500, raw[received - 500:2000])
+        self.put(api_client, api_pass, upload_id, 2000, raw[2000:])
+        assert api_client.post(f'/api/data/{api_pass}/uploads/{upload_id}/commit').status_code == 201
+        assert api_client.get(f'/api/data/{api_pass}/raw?domain=example.com').data == raw
+
+    def test_hash_mismatch_keeps_session(self, api_client, api_pass):
+        """测试哈希不一致时不创建版本，会话保留"""
+        upload_id = self.create(api_client, api_pass, 100)
+        self.put(api_client, api_pass, upload_id, 0, os.urandom(100))
+
+        response = api_client.post(f'/api/data/{api_pass}/uploads/{upload_id}/commit?hash=bad')
+        assert response.status_code == 409
+        assert api_client.get(f'/api/data/{api_pass}/versions?domain=example.com').get_json()['versions'] == []
+        assert api_client.get(f'/api/data/{api_pass}/uploads/{upload_id}').get_json()['received'] == 100
+
+    def test_expired_and_aborted_sessions(self, api_client, api_pass, upload_dir):
+        """测试过期会话不可用并被清理，取消后删除暂存文件"""
+        with patch('app.UPLOAD_SESSION_TTL', -1):
+            expired_id = self.create(api_client, api_pass, 100)
+        assert api_client.get(f'/api/data/{api_pass}/uploads/{expired_id}').status_code == 404
+        assert self.put(api_client, api_pass, expired_id, 0, b'x').status_code == 404
+
+        upload_id = self.create(api_client, api_pass, 100)
+        assert [path.name for path in upload_dir.iterdir()] == [f'{upload_id}.part']
+
+        assert api_client.delete(f'/api/data/{api_pass}/uploads/{upload_id}').status_code == 200
+        assert list(upload_dir.iterdir()) == []
+        assert api_client.post(f'/api/data/{api_pass}/uploads/{upload_id}/commit').status_code == 404
+
+    def test_disconnect_keeps_received_bytes(self, api_client, api_pass):
+        """测试读取请求体时连接中断，已写入的字节计入received后异常继续抛出"""
+        import app as app_module
+        from werkzeug.exceptions import ClientDisconnected
+
+        raw = os.urandom(3000)
+        upload_id = self.create(api_client, api_pass, len(raw))
+
+        class DroppedStream:
+            """读出前1000字节后断开"""
+            def __init__(self):
+                self.sent = False
+
+            def read(self, size):
+                if self.sent:
+                    raise ClientDisconnected()
+                self.sent = True
+                return raw[:1000]
+
+        with app_module.get_db() as conn:
+            session = app_module.load_upload_session(conn, api_pass, upload_id)
+            with pytest.raises(ClientDisconnected):
+                app_module.write_upload_chunk(conn, session, 0, DroppedStream(), len(raw))
+
+        assert api_client.get(f'/api/data/{api_pass}/uploads/{upload_id}').get_json()['received'] == 1000
+        self.put(api_client, api_pass, upload_id, 1000, raw[1000:])
+        assert api_client.post(f'/api/data/{api_pass}/uploads/{upload_id}/commit').status_code == 201
+        assert api_client.get(f'/api/data/{api_pass}/raw?domain=example.com').data == raw
+
+    def test_expired_sessions_purged_on_chunk_and_commit(self, api_client, api_pass, upload_dir):
+        """测试写入分块和提交时同样清理过期会话"""
+        upload_id = self.create(api_client, api_pass, 10)
+        for request_upload in (lambda: self.put(api_client, api_pass, upload_id, 0, b'x' * 10),
+                               lambda: api_client.post(f'/api/data/{api_pass}/uploads/{upload_id}/commit')):
+            with patch('app.UPLOAD_SESSION_TTL', -1):
+                expired_id = self.create(api_client, api_pass, 100)
+            assert (upload_dir / f'{expired_id}.part').exists()
+
+            assert request_upload().status_code in (200, 201)
+            assert not (upload_dir / f'{expired_id}.part').exists()
+
+    def test_invalid_requests(self, api_client, api_pass):
+        """测试无效请求"""
+        assert api_client.post(f'/api/data/{api_pass}/uploads?domain=example.com').status_code == 400
+        assert api_client.post(f'/api/data/{api_pass}/uploads?size=10').status_code == 400
+        assert api_client.post('/api/data/NOPE/uploads?domain=example.com&size=10').status_code == 404
+        with patch('app.MAX_UPLOAD_SIZE', 100):
+            assert api_client.post(f'/api/data/{api_pass}/uploads?domain=example.com&size=101').status_code == 400
+
+        upload_id = self.create(api_client, api_pass, 10)
+        assert self.put(api_client, api_pass, upload_id, 0, b'x' * 11).status_code == 400
+        assert api_client.put(f'/api/data/{api_pass}/uploads/{upload_id}?offset=0', data=b'x',
+                              content_type='text/plain').status_code == 415
+        assert api_client.put(f'/api/data/{api_pass}/uploads/{upload_id}', data=b'x',
+                              content_type='application/octet-stream').status_code == 400
+        # 会话属于其他Pass时不可见
+        other_pass = api_client.post('/api/pass/create', json={}).get_json()['pass_id']
+        assert api_client.get(f'/api/data/{other_pass}/uploads/{upload_id}').status_code == 404
+
+
+# ==================== 时间点读取测试 ====================
+
+class TestAsOfReads:
+    """按时间点读取历史状态测试类"""
+
+    @pytest.fixture
+    def timeline(self, api_client, api_pass):
+        """example.com 在10点、11点、12点各有一个版本，other.com 只在12点有版本"""
+        import app as app_module
+
+        times = {}
+        for domain, hour in (('example.com', 10), ('example.com', 11), ('example.com', 12), ('other.com', 12)):
+            entry_id = api_client.post(f'/api/data/{api_pass}?domain={domain}',
+                                       json={'data': f'{domain}-{hour}'}).get_json()['id']
+            times[entry_id] = f'2024-01-01 {hour}:00:00'
+
+        conn = sqlite3.connect(app_module.DATABASE_PATH)
+        for entry_id, created_at in times.items():
+            conn.execute('UPDATE data_entries SET created_at = ? WHERE id = ?', (created_at, int(entry_id[5:])))
+        conn.commit()
+        conn.close()
+        app_module.latest_cache.clear()
+
+    def test_get_as_of(self, api_client, api_pass, timeline):
+        """测试返回该时刻的当前版本"""
+        def data_as_of(as_of):
+            response = api_client.get(f'/api/data/{api_pass}?domain=example.com&as_of={as_of}')
+            return response.get_json()['data'] if response.status_code == 200 else response.status_code
+
+        assert data_as_of('2024-01-01T10:30:00Z') == 'example.com-10'
+        assert data_as_of('2024-01-01T11:00:00Z') == 'example.com-11'
+        assert data_as_of('2024-01-01T20:00:00%2B08:00') == 'example.com-12'
+        assert data_as_of('2030-01-01T00:00:00') == 'example.com-12'
+        assert data_as_of('2024-01-01T09:59:59Z') == 404
+        assert data_as_of('yesterday') == 400
+
+        # 不带as_of仍返回最新版本
+        assert api_client.get(f'/api/data/{api_pass}?domain=example.com').get_json()['data'] == 'example.com-12'
+
+    def test_batch_as_of(self, api_client, api_pass, timeline):
+        """测试批量读取支持as_of，该时刻没有版本的域名列为missing"""
+        body = api_client.get(
+            f'/api/data/{api_pass}/batch?domains=example.com,other.com&as_of=2024-01-01T11:30:00Z'
+        ).get_json()
+        assert [(e['domain'], e['data']) for e in body['entries']] == [('example.com', 'example.com-11')]
+        assert body['missing'] == ['other.com']
+
+        body = api_client.get(f'/api/data/{api_pass}/batch?domains=all&as_of=2024-01-01T12:00:00Z').get_json()
+        assert [e['data'] for e in body['entries']] == ['example.com-12', 'other.com-12']
+
+        assert api_client.get(f'/api/data/{api_pass}/batch?domains=all&as_of=bad').status_code == 400
+
+    def test_as_of_uses_index(self, api_client):
+        """测试时间点查询为一次索引查找"""
+        import app as app_module
+
+        conn = sqlite3.connect(app_module.DATABASE_PATH)
+        plan = conn.execute('''
+            EXPLAIN QUERY PLAN
+            SELECT id FROM data_entries
+            WHERE pass_id = ? AND domain = ? AND created_at <= ?
+            ORDER BY created_at DESC, id DESC
+            LIMIT 1
+        ''', ('p', 'd', '2024-01-01 00:00:00')).fetchall()
+        conn.close()
+        details = ' '.join(row[-1] for row in plan)
+        assert 'idx_pass_domain_created' in details
+        assert 'TEMP B-TREE' not in details
+
+
+# ==================== JSON序列化测试 ====================
+
+class TestFastJSON:
+    """orjson序列化与标准库回退测试类"""
+
+    def test_responses_match_stdlib(self, api_client, api_pass):
+        """测试RESTX资源和旧接口在两种实现下返回相同的JSON"""
+        api_client.post(f'/api/data/{api_pass}?domain=\u5bc6\u6587.com', json={'data': 'v1'})
+        urls = [
+            '/health',
+            f'/api/pass/{api_pass}/check',
+            f'/api/stats/{api_pass}',
+            f'/api/data/{api_pass}/versions?domain=\u5bc6\u6587.com',
+            f'/api/pass/{api_pass}/changes'
+        ]
+
+        fast = [api_client.get(url) for url in urls]
+        with patch('app.JSON_BACKEND', 'stdlib'):
+            slow = [api_client.get(url) for url in urls]
+
+        for fast_response, slow_response in zip(fast, slow):
+            assert fast_response.status_code == slow_response.status_code
+            fast_body, slow_body = fast_response.get_json(), slow_response.get_json()
+            for body in (fast_body, slow_body):
+                body.pop('timestamp', None)
+            assert fast_body == slow_body
+
+    def test_orjson_used_when_installed(self, api_client, api_pass):
+        """测试已安装orjson时输出紧凑的UTF-8 JSON"""
+        pytest.importorskip('orjson')
+        response = api_client.get(f'/api/pass/{api_pass}/check')
+        assert b', ' not in response.data
+        assert response.data.endswith(b'\n')
+
+        with patch('app.JSON_BACKEND', 'stdlib'):
+            assert b', ' in api_client.get(f'/api/pass/{api_pass}/check').data
+
+    def test_unsupported_values_fall_back(self):
+        """测试orjson无法处理的值回退到标准库，结果与Flask默认实现一致"""
+        from datetime import datetime
+        from flask.json.provider import DefaultJSONProvider
+        from app import fast_json_dumps
+
+        assert fast_json_dumps({'n': 2 ** 70}) is None
+        assert fast_json_dumps({'o': object()}) is None
+
+        default = DefaultJSONProvider(app)
+        value = {'big': 2 ** 70, 'when': datetime(2024, 1, 1, 12, 0)}
+        assert app.json.dumps({'when': value['when']}) == default.dumps({'when': value['when']}, separators=(',', ':'))
+        assert json.loads(app.json.dumps(value)) == json.loads(default.dumps(value))
+        assert app.json.loads('{"a": NaN}')['a'] != app.json.loads('{"a": NaN}')['a']
+
+
+# ==================== 服务端解密测试 ====================
+
+def reference_xor_decrypt(encrypted_text, key):
+    """原先逐字符的XOR实现，作为对照"""
+    result = ''
+    for i in range(len(encrypted_text)):
+        result += chr(ord(encrypted_text[i]) ^ ord(key[i % len(key)]))
+    return result
+
+def client_encrypt(data, key):
+    """与扩展相同的加密：JSON -> 逐字符XOR -> UTF-8 -> Base64"""
+    return base64.b64encode(reference_xor_decrypt(json.dumps(data), key).encode('utf-8')).decode('ascii')
+
+class TestServerDecrypt:
+    """批量XOR解密测试类"""
+
+    @pytest.mark.parametrize('text, key', [
+        ('{"cookies": {"a": "1"}}', 'secret'),
+        ('\u5bc6\u6587 cookie=\u503c', 'k\u00e9y'),
+        ('plain ascii', '\u5bc6\u94a5'),
+        ('', 'key'),
+        ('x' * 1000, 'a'),
+    ])
+    def test_matches_reference(self, text, key):
+        """测试结果与逐字符实现完全相同"""
+        from app import XorDecryptor
+
+        expected = reference_xor_decrypt(text, key)
+        for block_chars in (1, 7, 64, 65536):
+            assert XorDecryptor(key, block_chars).decrypt(text) == expected
+
+    def test_random_inputs_match_reference(self):
+        """测试随机文本和密钥（含非法UTF-8被忽略后的文本）"""
+        import random
+        from app import XorDecryptor
+
+        rng = random.Random(0)
+        for _ in range(200):
+            text = os.urandom(rng.randrange(0, 600)).decode('utf-8', errors='ignore')
+            key = ''.join(chr(rng.choice([rng.randrange(32, 127), rng.randrange(0x100, 0x3000)]))
+                          for _ in range(rng.randrange(1, 40)))
+            assert XorDecryptor(key, rng.randrange(1, 128)).decrypt(text) == reference_xor_decrypt(text, key)
+
+    def test_out_of_range_code_point_raises(self):
+        """测试异或结果超出Unicode范围时与原实现一样抛出ValueError"""
+        from app import XorDecryptor
+
+        with pytest.raises(ValueError):
+            reference_xor_decrypt('\U0010ffff', '\U000f0000')
+        with pytest.raises(ValueError):
+            XorDecryptor('\U000f0000').decrypt('\U0010ffff')
+
+    def test_server_decrypt_text_and_bytes(self):
+        """测试Base64文本和已解码的密文字节得到相同结果"""
+        from app import server_decrypt
+
+        data = {'cookies': {'session': 'abc'}, 'localStorage': {'\u540d': '\u503c'}}
+        encrypted = client_encrypt(data, 'key')
+        assert server_decrypt(encrypted, 'key') == data
+        assert server_decrypt(base64.b64decode(encrypted), 'key') == data
+
+    def test_quick_access_decrypts(self, api_client, api_pass):
+        """测试快捷访问使用服务端解密"""
+        data = {'cookies': {'session': 'abc'}, 'localStorage': {}}
+        api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': client_encrypt(data, 'key')})
+
+        body = api_client.get(f'/api/quick/{api_pass}?domain=example.com&format=json&key=key').get_json()
+        assert body['decrypted'] is True
+        assert body['data'] == data
+
+
+# ==================== 解密结果缓存测试 ====================
+
+class TestQuickAccessCache:
+    """快捷访问解密结果缓存测试类"""
+
+    def save(self, client, pass_id, data, key='key', domain='example.com'):
+        client.post(f'/api/data/{pass_id}?domain={domain}', json={'data': client_encrypt(data, key)})
+
+    def test_repeated_access_hits_cache(self, api_client, api_pass):
+        """测试同一版本、同一密钥的重复访问直接返回缓存的响应"""
+        from app import quick_cache
+
+        self.save(api_client, api_pass, {'cookies': {'session': 'abc'}})
+        for format_type in ('json', 'html'):
+            url = f'/api/quick/{api_pass}?domain=example.com&format={format_type}&key=key'
+            first = api_client.get(url)
+            hits = quick_cache.hits
+            with patch('app.server_decrypt') as decrypt:
+                second = api_client.get(url)
+            decrypt.assert_not_called()
+            assert quick_cache.hits == hits + 1
+            assert second.status_code == 200
+            assert second.data == first.data
+            assert second.mimetype == first.mimetype
+            assert second.headers['ETag'] == first.headers['ETag']
+
+    def test_new_version_invalidates(self, api_client, api_pass):
+        """测试保存、删除后该域名的缓存立即失效"""
+        from app import quick_cache
+
+        url = f'/api/quick/{api_pass}?domain=example.com&format=json&key=key'
+        self.save(api_client, api_pass, {'cookies': {'v': '1'}})
+        api_client.get(url)
+        assert quick_cache.stats()['entries'] == 2  # 响应和解密后的对象
+
+        self.save(api_client, api_pass, {'cookies': {'v': '2'}})
+        assert quick_cache.stats()['entries'] == 0
+        assert api_client.get(url).get_json()['data'] == {'cookies': {'v': '2'}}
+
+        api_client.delete(f'/api/data/{api_pass}?domain=example.com')
+        assert quick_cache.stats()['entries'] == 0
+        assert api_client.get(url).status_code == 404
+
+    def test_never_stores_raw_key(self, api_client, api_pass):
+        """测试缓存键只含密钥指纹，解密失败（页面带有密钥）的结果不缓存"""
+        from app import quick_cache
+
+        self.save(api_client, api_pass, {'cookies': {'session': 'abc'}}, key='right-key')
+        api_client.get(f'/api/quick/{api_pass}?domain=example.com&format=html&key=right-key')
+        api_client.get(f'/api/quick/{api_pass}?domain=example.com&format=html&key=wrong-key')
+
+        assert [key[2] for key in quick_cache.entries] == ['object', 'html']
+        for key, entry in quick_cache.entries.items():
+            assert 'right-key' not in repr(key)
+            assert 'right-key' not in repr(entry['value'])
+            assert 'wrong-key' not in repr(entry['value'])
+        # 盐随实例生成，指纹不是密钥的普通哈希
+        fingerprint = quick_cache.make_key(1, 'right-key', 'html')[1]
+        assert fingerprint != hashlib.sha256(b'right-key').digest()
+
+    def test_ttl_and_lru_eviction(self):
+        """测试条目过期和按字节数淘汰最久未使用的条目"""
+        from app import DecryptedResponseCache
+
+        cache = DecryptedResponseCache(3 * (100 + DecryptedResponseCache.ENTRY_OVERHEAD), 60)
+        keys = [cache.make_key(i, 'key', 'json') for i in range(4)]
+        with patch('app.time.monotonic', return_value=1000):
+            for i, key in enumerate(keys[:3]):
+                cache.put(key, 'pass', f'site{i}.com', (b'x' * 100, 'application/json'), 100)
+            assert cache.get(keys[0]) is not None
+            cache.put(keys[3], 'pass', 'site3.com', (b'x' * 100, 'application/json'), 100)
+            assert cache.get(keys[1]) is None
+            assert cache.stats()['evictions'] == 1
+            assert cache.stats()['entries'] == 3
+
+        with patch('app.time.monotonic', return_value=1061):
+            assert cache.get(keys[0]) is None
+        assert cache.stats()['expirations'] == 1
+
+        cache.invalidate('pass', 'site3.com')
+        assert cache.get(keys[3]) is None
+        assert 'site3.com' not in {domain for _, domain in cache.domains}
+
+    def test_disabled(self, api_client, api_pass):
+        """测试容量为0时不缓存"""
+        from app import quick_cache
+
+        self.save(api_client, api_pass, {'cookies': {'session': 'abc'}})
+        with patch.object(quick_cache, 'max_bytes', 0):
+            body = api_client.get(f'/api/quick/{api_pass}?domain=example.com&key=key').get_json()
+            assert body['decrypted'] is True
+            assert quick_cache.stats()['entries'] == 0
+
+    def test_server_stats(self, api_client):
+        """测试服务器统计包含缓存信息"""
+        stats = api_client.get('/api/stats/server').get_json()['quick_cache']
+        assert stats['enabled'] is True
+        assert 'hit_rate' in stats
+
+
+# ==================== 模板缓存测试 ====================
+
+class TestTemplateCache:
+    """快捷访问模板编译缓存测试类"""
+
+    def test_templates_compiled_once(self, api_client, api_pass):
+        """测试模板在启动时编译，请求渲染时不再编译"""
+        data = {'cookies': {'session': 'abc'}, 'localStorage': {'k': 'v'}}
+        api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': client_encrypt(data, 'key')})
+
+        with patch.object(app.jinja_env, 'compile', wraps=app.jinja_env.compile) as compile_template:
+            decrypted = api_client.get(f'/api/quick/{api_pass}?domain=example.com&format=html&key=key')
+            encrypted = api_client.get(f'/api/quick/{api_pass}?domain=example.com&format=html')
+        compile_template.assert_not_called()
+        assert b'Cookie Data for example.com (Decrypted)' in decrypted.data
+        assert b'Cookie Data for example.com (Encrypted)' in encrypted.data
+
+    def test_bytecode_cache_enabled(self):
+        """测试启用了字节码缓存"""
+        from jinja2 import FileSystemBytecodeCache
+
+        assert isinstance(app.jinja_env.bytecode_cache, FileSystemBytecodeCache)
+
+    def test_rendered_values_escaped(self):
+        """测试模板文件仍对数据做HTML转义"""
+        from app import render_decrypted_html, render_encrypted_html
+
+        with app.test_request_context('/api/quick/pass?domain=example.com&format=html'):
+            html = render_decrypted_html('example.com', 'pass', 'now', {'cookies': {'a': '<script>'}, 'localStorage': {}})
+            assert '&lt;script&gt;' in html
+            html = render_encrypted_html('example.com', 'pass', 'now', 'abc"<def', '')
+            assert 'abc&#34;&lt;def' in html
+
+
+# ==================== 流式HTML测试 ====================
+
+class TestStreamingHTML:
+    """快捷访问解密页面流式输出测试类"""
+
+    data = {
+        'cookies': {f'c{i}': f'\u503c{i}' for i in range(50)},
+        'localStorage': {f'k{i}': 'v<&>' * 50 for i in range(500)}
+    }
+
+    def test_streamed_page_matches_rendered(self, api_client, api_pass):
+        """测试大数据流式输出的页面与整体渲染完全相同，输出完成后写入缓存"""
+        from app import quick_cache
+
+        api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': client_encrypt(self.data, 'key')})
+        url = f'/api/quick/{api_pass}?domain=example.com&format=html&key=key'
+
+        rendered = api_client.get(url).data
+        quick_cache.clear()
+        with patch('app.QUICK_STREAM_THRESHOLD', 0):
+            response = api_client.get(url)
+            assert response.is_streamed
+            assert response.data == rendered
+            assert quick_cache.stats()['entries'] == 2
+            assert api_client.get(url).data == rendered
+
+    def test_first_chunk_before_full_render(self):
+        """测试原始JSON逐段编码，页面开头先于其余内容产出"""
+        from markupsafe import escape
+        from app import stream_decrypted_html, render_decrypted_html
+
+        with app.test_request_context('/api/quick/pass?domain=example.com&format=html'):
+            chunks = stream_decrypted_html('example.com', 'pass', 'now', self.data)
+            first = next(chunks)
+            assert first.startswith(b'<!DOCTYPE html>')
+            body = first + b''.join(chunks)
+            assert body == render_decrypted_html('example.com', 'pass', 'now', self.data).encode('utf-8')
+            raw_json = str(escape(json.dumps(self.data, indent=2, ensure_ascii=False)))
+            assert raw_json.encode('utf-8') in body
+
+    def test_buffered_text(self):
+        """测试细碎片段按大小合并"""
+        from app import buffered_text
+
+        pieces = list(buffered_text(('ab' for _ in range(10)), 5))
+        assert pieces == ['ababab', 'ababab', 'ababab', 'ab']
+        assert list(buffered_text([], 5)) == []
+
+
+# ==================== 精简加密页面测试 ====================
+
+class TestCompactEncryptedPage:
+    """快捷访问精简加密页面测试类"""
+
+    def test_payload_embedded_once(self, api_client, api_pass):
+        """测试精简页面只嵌入一次密文，页面大小接近密文大小"""
+        encrypted = client_encrypt({'cookies': {f'c{i}': 'x' * 100 for i in range(500)}}, 'key')
+        api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': encrypted})
+
+        url = f'/api/quick/{api_pass}?domain=example.com&format=html'
+        full = api_client.get(url)
+        compact = api_client.get(url + '&compact=1')
+        assert full.data.count(encrypted.encode()) >= 3
+        assert compact.data.count(encrypted.encode()) == 1
+        assert len(compact.data) < len(encrypted) + 8 * 1024
+        assert compact.headers['ETag'] != full.headers['ETag']
+        assert b'decryptWithKey()' in compact.data
+
+    def test_static_script_cacheable(self, api_client, api_pass):
+        """测试解密脚本通过带内容哈希的URL加载并可长期缓存"""
+        import re
+        from app import static_version
+
+        api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': client_encrypt({'cookies': {}}, 'key')})
+        page = api_client.get(f'/api/quick/{api_pass}?domain=example.com&format=html&compact=true').data.decode()
+        script_url = re.search(r'<script src="([^"]+)"', page).group(1)
+        assert script_url == f'/static/quick_access.js?v={static_version("quick_access.js")}'
+
+        response = api_client.get(script_url)
+        assert response.status_code == 200
+        assert b'function decrypt(' in response.data
+        assert response.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+        response.close()
+
+        # 版本不匹配时按默认方式缓存
+        response = api_client.get('/static/quick_access.js?v=old')
+        assert 'immutable' not in response.headers.get('Cache-Control', '')
+        response.close()
+
+    def test_failed_key_passed_as_attribute(self, api_client, api_pass):
+        """测试服务端解密失败时密钥以转义后的属性交给脚本"""
+        api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': client_encrypt({'cookies': {}}, 'key')})
+        page = api_client.get(f'/api/quick/{api_pass}?domain=example.com&format=html&compact=1&key=wr"ong').data
+        assert b'data-key="wr&#34;ong"' in page
+
+
+# ==================== 字段投影测试 ====================
+
+class TestQuickAccessProjection:
+    """快捷访问JSON字段投影测试类"""
+
+    data = {
+        'cookies': {'session': 'abc', 'csrf': 'def', 'theme': 'dark'},
+        'localStorage': {'token': 'xyz', 'a,b': 'comma', 'big': 'x' * 10000},
+        'timestamp': 1700000000000,
+        'url': 'https://example.com/'
+    }
+
+    def quick(self, client, pass_id, query):
+        return client.get(f'/api/quick/{pass_id}?domain=example.com&format=json&key=key&{query}').get_json()
+
+    def test_cookie_and_storage_key(self, api_client, api_pass):
+        """测试只返回指定的cookie和localStorage键，不存在的键忽略"""
+        api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': client_encrypt(self.data, 'key')})
+
+        body = self.quick(api_client, api_pass, 'cookie=session&cookie=missing')
+        assert body['decrypted'] is True
+        assert body['data'] == {'cookies': {'session': 'abc'}}
+
+        body = self.quick(api_client, api_pass, 'storage_key=a,b&storage_key=token')
+        assert body['data'] == {'localStorage': {'a,b': 'comma', 'token': 'xyz'}}
+
+        body = self.quick(api_client, api_pass, 'fields=timestamp,url&cookie=csrf')
+        assert body['data'] == {'timestamp': 1700000000000, 'url': 'https://example.com/', 'cookies': {'csrf': 'def'}}
+
+        # 未指定投影时返回完整数据
+        assert self.quick(api_client, api_pass, '')['data'] == self.data
+
+    def test_projection_reuses_decrypted_object(self, api_client, api_pass):
+        """测试不同投影共享缓存的解密对象，相同投影直接命中响应缓存"""
+        from app import quick_cache
+
+        api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': client_encrypt(self.data, 'key')})
+        self.quick(api_client, api_pass, 'cookie=session')
+
+        with patch('app.server_decrypt') as decrypt:
+            assert self.quick(api_client, api_pass, 'cookie=csrf')['data'] == {'cookies': {'csrf': 'def'}}
+            hits = quick_cache.hits
+            assert self.quick(api_client, api_pass, 'cookie=csrf')['data'] == {'cookies': {'csrf': 'def'}}
+            assert quick_cache.hits == hits + 1
+        decrypt.assert_not_called()
+        # 投影不修改缓存的对象
+        assert self.quick(api_client, api_pass, '')['data'] == self.data
+
+    def test_projection_without_key(self, api_client, api_pass):
+        """测试未解密时投影参数不影响返回的密文"""
+        encrypted = client_encrypt(self.data, 'key')
+        api_client.post(f'/api/data/{api_pass}?domain=example.com', json={'data': encrypted})
+
+        body = api_client.get(f'/api/quick/{api_pass}?domain=example.com&cookie=session').get_json()
+        assert body['decrypted'] is False
+        assert body['encrypted_data'] == encrypted
+
+    def test_project_decrypted(self):
+        """测试投影函数"""
+        from werkzeug.datastructures import MultiDict
+        from app import parse_projection, project_decrypted
+
+        assert parse_projection(MultiDict()) is None
+        assert parse_projection(MultiDict([('fields', 'a, b'), ('fields', 'c')])) == (('a', 'b', 'c'), (), ())
+        projection = parse_projection(MultiDict([('cookie', 'x'), ('storage_key', 'y')]))
+        assert project_decrypted({'cookies': 'invalid'}, projection) == {'cookies': {}, 'localStorage': {}}
+
+
 # ==================== 性能测试 ====================
 
 class TestPerformance: